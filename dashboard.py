@@ -1,24 +1,27 @@
 import streamlit as st
 import pandas as pd
 import xgboost as xgb
-from upstash_redis import Redis
-import os
 from dotenv import load_dotenv
 import time
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import joblib 
 import plotly.graph_objects as go
-import numpy as np
-from utils import ui
+from utils import aggregates, redis_client, rollup_cube, telemetry, timeseries, ui
+from utils.calendar_dim import CALENDAR_FILE, CalendarDimension
+from utils.forecast_cube import CUBE_FILE, DEFAULT_OIL, DEFAULT_TRANSACTIONS, ForecastCube
+from utils.hierarchy import FORECAST_FILE, HierarchyForecast
+from utils.prophet_numpy import PARAMS_FILE, NumpyProphet
 
 # 1. Load Config & Connect
 load_dotenv()
+# System Health refresh interval
+TELEMETRY_TTL_S = 30
 
 # --- APPLY PREMIUM THEME ---
 ui.setup_page(page_title="Retail AI Dashboard", page_icon="🛒")
 
 try:
-    redis = Redis(url=os.getenv("UPSTASH_REDIS_REST_URL"), token=os.getenv("UPSTASH_REDIS_REST_TOKEN"))
+    redis = redis_client.connect()
     redis.ping()
 except Exception as e:
     st.error(f"Failed to connect to Redis. Check .env variables.\n{e}")
@@ -27,12 +30,10 @@ except Exception as e:
 # 2. Load ALL Models & Encoders
 @st.cache_resource
 def load_assets():
-    """Loads all models (XGBoost, Prophet) and encoders."""
+    """Loads the Prophet parameters and encoders (XGBoost is loaded on demand by load_xgb)."""
     try:
-        model_xgb = xgb.XGBRegressor()
-        model_xgb.load_model("best_model_v2.json")
-        
-        model_prophet = joblib.load("long_term_forecast.pkl")
+        # Exported Prophet parameters, evaluated in NumPy (Prophet itself is not imported)
+        model_prophet = NumpyProphet.load(PARAMS_FILE)
         
         encoders = {
             "family": joblib.load("family_encoder.joblib"),
@@ -40,12 +41,54 @@ def load_assets():
             "state": joblib.load("state_encoder.joblib"),
             "type": joblib.load("type_encoder.joblib")
         }
-        return model_xgb, model_prophet, encoders
+        return model_prophet, encoders
     except Exception as e:
         st.error(f"Failed to load model assets. Did you run the nightly training?\n{e}")
         st.stop()
+
+@st.cache_resource
+def load_xgb():
+    """Loads the XGBoost model, only needed for inputs outside the forecast cube."""
+    model_xgb = xgb.XGBRegressor()
+    model_xgb.load_model("best_model_v2.json")
+    return model_xgb
+
+@st.cache_resource
+def load_forecast_cube():
+    """Loads the nightly store × family × day × promo predictions (None if not built yet)."""
+    try:
+        return ForecastCube.load(CUBE_FILE)
+    except Exception:
+        return None
+
+@st.cache_resource
+def load_calendar():
+    """Loads the store-resolved holiday table written by train.py (None if not built yet)."""
+    try:
+        return CalendarDimension.load(CALENDAR_FILE)
+    except Exception:
+        return None
         
-model_xgb, model_prophet, encoders = load_assets()
+@st.cache_resource
+def load_hierarchy():
+    """Loads the reconciled per-store/per-family forecasts (None if scripts/train_hierarchy.py has not run)."""
+    try:
+        return HierarchyForecast.load(FORECAST_FILE)
+    except Exception:
+        return None
+
+@st.cache_data(ttl=TELEMETRY_TTL_S)
+def load_telemetry():
+    """Producer / processor / stream metrics in one pipelined read (None if unavailable)."""
+    try:
+        return telemetry.read(redis)
+    except Exception:
+        return None
+
+model_prophet, encoders = load_assets()
+calendar = load_calendar()
+forecast_cube = load_forecast_cube()
+hierarchy_fc = load_hierarchy()
 
 # --- COMPLETE STORE DATABASE ---
 STORE_DB = {
@@ -105,13 +148,16 @@ STORE_DB = {
     54: {'city': 'El Carmen', 'state': 'Manabi', 'type': 'C'}
 }
 
+# Days of daily history drawn under the live sales metric
+SPARKLINE_DAYS = 90
+
 # --- HEADER ---
 col_header_1, col_header_2 = st.columns([0.8, 0.2])
 with col_header_1:
     st.title("🛒 Retail Demand Forecast")
     st.markdown("*Enterprise-Grade MLOps Pipeline powered by XGBoost & Prophet*")
 with col_header_2:
-    st.caption(f"Last Updated: {datetime.now().strftime('%H:%M:%S')}")
+    st.caption(f"Last Updated: {datetime.now(timezone.utc).strftime('%H:%M:%S')} UTC")
     st.button("🔄 Refresh System", use_container_width=True)
 
 st.divider()
@@ -142,42 +188,94 @@ with col1:
             family = st.selectbox("Item Family", ITEM_FAMILIES)
         
         # Logic
-        today = datetime.now()
+        today = datetime.now(timezone.utc)
         if time_window == "Today":
-            date_key = today.strftime('%Y-%m-%d')
-            redis_key = f"feature:sales_daily:{family}:{date_key}"
+            period = "daily"
             label = "Sales Today"
             delta_label = "vs Yesterday"
         elif time_window == "This Week":
-            date_key = today.strftime('%Y-W%U')
-            redis_key = f"feature:sales_weekly:{family}:{date_key}"
+            period = "weekly"
             label = "Sales This Week"
             delta_label = "vs Last Week"
         else:
-            date_key = today.strftime('%Y-%m')
-            redis_key = f"feature:sales_monthly:{family}:{date_key}"
+            period = "monthly"
             label = "Sales This Month"
             delta_label = "vs Last Month"
         
-        # Fetch Data
-        val = redis.get(redis_key)
-        current_volume = float(val) if val else 0.0
+        # Fetch Data (every family for the window in one HGETALL)
+        window_sales = aggregates.read_window(redis, period, today.date())
+        current_volume = window_sales.get(family, 0.0)
+        
+        # History: 90-day sparkline + this period vs the same stretch of the last one (one EVAL)
+        current_span, previous_span = timeseries.period_windows(period, today)
+        spark_start = datetime(today.year, today.month, today.day) - timedelta(days=SPARKLINE_DAYS - 1)
+        sparkline, current, previous = timeseries.range_query(redis, family, [
+            (spark_start, spark_start + timedelta(days=SPARKLINE_DAYS), "daily"),
+            (*current_span, None),
+            (*previous_span, None),
+        ])
+        change = timeseries.pct_change(current[0][1], previous[0][1])
         
-        # Display Metric with "Mock" Delta for visual effect (in real app, fetch previous period)
         st.metric(
             label=f"{label} ({family})", 
             value=f"${current_volume:,.2f}",
-            delta=f"+{np.random.randint(2, 15)}% {delta_label}" # Mock delta for premium feel
+            delta=f"{change:+.1f}% {delta_label}" if change is not None else None
         )
         
+        spark_fig = go.Figure(go.Scatter(
+            x=[bucket for bucket, _ in sparkline], y=[total for _, total in sparkline],
+            mode='lines', line=dict(color='#58A6FF', width=2),
+            fill='tozeroy', fillcolor='rgba(88, 166, 255, 0.1)',
+            hovertemplate='%{x|%b %d}: $%{y:,.2f}<extra></extra>'
+        ))
+        spark_fig.update_layout(
+            template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
+            height=110, margin=dict(l=0, r=0, t=0, b=0), showlegend=False,
+            xaxis=dict(visible=False), yaxis=dict(visible=False)
+        )
+        st.plotly_chart(spark_fig, use_container_width=True, config={'displayModeBar': False})
+        st.caption(f"Daily sales, last {SPARKLINE_DAYS} days")
+        
+        # Promo vs regular split from the rollup cube (one HMGET)
+        split = rollup_cube.query(redis, period, today.date(), family=family, promo=[1, 0])
+        promo_stats = split.get((rollup_cube.ALL, family, "1"))
+        regular_stats = split.get((rollup_cube.ALL, family, "0"))
+        if promo_stats or regular_stats:
+            st.caption(" · ".join(
+                f"{name}: ${stats['sum']:,.2f} ({stats['count']:,.0f} events)"
+                for name, stats in (("🔥 Promo", promo_stats), ("Regular", regular_stats)) if stats
+            ))
+        
         st.markdown("---")
         
         st.markdown("### 🛠 System Health")
-        # Mock System Stats for "Premium" feel
-        h1, h2, h3 = st.columns(3)
-        h1.metric("API Latency", "45ms", "-12ms", delta_color="inverse")
-        h2.metric("Model Drift", "0.02", "Stable")
-        h3.metric("Redis Memory", "128MB", "Normal")
+        # Published by the producer and the feature processor (utils/telemetry.py)
+        health = load_telemetry()
+        if health is None:
+            st.caption("Telemetry unavailable")
+        else:
+            proc, pipe_state = health["processor"], health["pipeline"]
+            lags = [s["group_lag"] for s in health["history"][:2] if s.get("group_lag") is not None]
+            h1, h2, h3 = st.columns(3)
+            h1.metric("Ingest Rate", f"{proc['events_per_s']:,.0f}/s" if "events_per_s" in proc else "—")
+            h2.metric("Batch Latency p95", f"{proc['batch_ms_p95']:,.0f}ms" if "batch_ms_p95" in proc else "—")
+            h3.metric("Consumer Lag", f"{lags[0]:,.0f}" if lags else "—",
+                      f"{lags[0] - lags[1]:+,.0f}" if len(lags) == 2 else None, delta_color="inverse")
+            h4, h5, h6 = st.columns(3)
+            h4.metric("Stream Length", f"{pipe_state['stream_length']:,.0f}" if "stream_length" in pipe_state else "—")
+            h5.metric("Pending", f"{pipe_state['pending']:,.0f}" if "pending" in pipe_state else "—")
+            h6.metric("Redis Memory", f"{pipe_state['redis_used_bytes'] / 2**20:,.1f}MB"
+                      if "redis_used_bytes" in pipe_state else "—")
+            notes = []
+            if "lag_ms_p95" in proc:
+                notes.append(f"ingest → visible p95 {proc['lag_ms_p95'] / 1000:,.1f}s")
+            for role in ("producer", "processor"):
+                if "updated_at" in health[role]:
+                    notes.append(f"{role} {(time.time() - health[role]['updated_at']) / 60:,.0f} min ago")
+            if notes:
+                st.caption(" · ".join(notes))
+            for warning in telemetry.warnings(health):
+                st.warning(f"⚠️ {warning}")
 
     st.markdown("### 🏗 Architecture View")
     with st.expander("View Pipeline Diagram", expanded=False):
@@ -245,33 +343,41 @@ with col2:
                     )
                     
                     # 3. Simulate other features
-                    default_oil = 45.0
-                    default_transactions = 1500
-                    default_holiday = 0
+                    default_oil = DEFAULT_OIL
+                    default_transactions = DEFAULT_TRANSACTIONS
+                    default_holiday = int(calendar.is_holiday(prediction_date, selected_store_id)[0]) if calendar else 0
                     
                     try:
-                        # 4. Encode
-                        family_encoded = encoders['family'].transform([family_key])[0]
-                        city_encoded = encoders['city'].transform([store_meta['city']])[0]
-                        state_encoded = encoders['state'].transform([store_meta['state']])[0]
-                        type_encoded = encoders['type'].transform([store_meta['type']])[0]
+                        # 4. Nightly precomputed grid (same defaults), live inference only off-grid
+                        cached = forecast_cube.lookup(prediction_date, selected_store_id, family_key, is_promo) if forecast_cube else None
+                        if cached is not None:
+                            pred = float(cached[0])
+                            source = "⚡ Served from the nightly forecast cube"
+                        else:
+                            # 5. Encode
+                            family_encoded = encoders['family'].transform([family_key])[0]
+                            city_encoded = encoders['city'].transform([store_meta['city']])[0]
+                            state_encoded = encoders['state'].transform([store_meta['state']])[0]
+                            type_encoded = encoders['type'].transform([store_meta['type']])[0]
 
-                        # 5. Build vector
-                        input_data = pd.DataFrame([{
-                            'store_nbr': selected_store_id, 'family_encoded': family_encoded,
-                            'onpromotion': 1 if is_promo else 0, 'transactions': default_transactions,
-                            'dcoilwtico': default_oil, 'is_holiday': default_holiday,
-                            'city_encoded': city_encoded, 'state_encoded': state_encoded,
-                            'type_encoded': type_encoded, 'day_of_week': day_of_week,
-                            'month': month, 'year': year, 'day_of_month': day_of_month
-                        }])
-                        
-                        # 6. Predict
-                        pred = model_xgb.predict(input_data)[0]
-                        pred = max(0, pred)
+                            # 6. Build vector
+                            input_data = pd.DataFrame([{
+                                'store_nbr': selected_store_id, 'family_encoded': family_encoded,
+                                'onpromotion': 1 if is_promo else 0, 'transactions': default_transactions,
+                                'dcoilwtico': default_oil, 'is_holiday': default_holiday,
+                                'city_encoded': city_encoded, 'state_encoded': state_encoded,
+                                'type_encoded': type_encoded, 'day_of_week': day_of_week,
+                                'month': month, 'year': year, 'day_of_month': day_of_month
+                            }])
+                            
+                            # 7. Predict
+                            pred = load_xgb().predict(input_data)[0]
+                            pred = max(0, pred)
+                            source = "🧠 Live XGBoost inference (outside the forecast cube)"
                         
                         st.success("Prediction Complete")
                         st.metric(f"Predicted Sales: {family_key}", f"{pred:.2f} units")
+                        st.caption(source)
                         
                         # Visualization of Feature Importance (Mock for now, or real if model supports)
                         st.caption("Key Drivers: Promotion Status, Day of Week, Oil Price")
@@ -282,15 +388,29 @@ with col2:
     # --- TAB 2: PROPHET ---
     with tab2:
         with st.container():
+            if hierarchy_fc is not None:
+                # Any node of the reconciled total / family / store (/ store×family) hierarchy
+                level_options = {hierarchy_fc.LABELS[level]: level for level in hierarchy_fc.available_levels()}
+                c_level, c_node = st.columns(2)
+                level = level_options[c_level.selectbox("Hierarchy Level", list(level_options))]
+                node = c_node.selectbox(
+                    "Series", hierarchy_fc.keys(level), disabled=(level == "total"),
+                    format_func=lambda n: n.replace("|family:", " · ").replace("store:", "Store ").replace("family:", "")
+                )
             days = st.slider("Forecast Horizon", 7, 90, 30, format="%d days")
             
             if st.button("📊 Generate Trend Analysis", use_container_width=True):
                 with st.spinner("Computing confidence intervals..."):
-                    future_df = model_prophet.make_future_dataframe(periods=days)
-                    future_df['dcoilwtico'] = 45.0
-                    future_df['is_holiday'] = 0
-                    
-                    forecast = model_prophet.predict(future_df)
+                    if hierarchy_fc is not None:
+                        forecast = hierarchy_fc.forecast(node, days)
+                        history = hierarchy_fc.recent(node)
+                    else:
+                        future_dates = model_prophet.future_dates(periods=days)
+                        forecast = model_prophet.predict(future_dates, {
+                            'dcoilwtico': 45.0,
+                            'is_holiday': calendar.any_store(future_dates) if calendar else 0,
+                        })
+                        history = model_prophet.history()
                     
                     # Custom Plotly Theme
                     fig = go.Figure()
@@ -317,8 +437,8 @@ with col2:
                     
                     # History
                     fig.add_trace(go.Scatter(
-                        x=model_prophet.history['ds'].iloc[-60:], 
-                        y=model_prophet.history['y'].iloc[-60:],
+                        x=history['ds'], 
+                        y=history['y'],
                         mode='lines', line=dict(color='#8B949E', width=1),
                         name='Historical Data'
                     ))
@@ -1,101 +1,141 @@
-from upstash_redis import Redis
 import os
-from dotenv import load_dotenv
+import argparse
+import multiprocessing as mp
+import queue
+import signal
 import time
-from datetime import datetime
-import json
+from dotenv import load_dotenv
+from utils import redis_client, telemetry, training_buffer
+from utils.stream_batch import (GROUP_NAME, RECLAIM_IDLE_MS, STREAM_KEY, BatchStats, consumer_name, ensure_group, process_batch,
+                                reclaim_pending, retire_consumer)
 
 # --- CONFIG ---
 load_dotenv()
-STREAM_KEY = "store_sales_stream"
-GROUP_NAME = "ml_feature_group"
-CONSUMER_NAME = "feature_processor_batch_1"
-TRAINING_BUFFER_KEY = "training_data_buffer" # <-- NEW KEY FOR CONTINUOUS TRAINING
-
-# 1. Connect to Redis
-print("🔌 Connecting to Redis...")
-try:
-    redis = Redis(url=os.getenv("UPSTASH_REDIS_REST_URL"), token=os.getenv("UPSTASH_REDIS_REST_TOKEN"))
-    redis.ping()
-except Exception as e:
-    print(f"❌ Failed to connect to Redis: {e}")
-    exit()
-
-# 2. Create Consumer Group
-print(f"ℹ️ Ensuring Consumer Group '{GROUP_NAME}' exists...")
-try:
-    redis.execute(["XGROUP", "CREATE", STREAM_KEY, GROUP_NAME, "0", "MKSTREAM"])
-    print("  ✅ Consumer Group Created!")
-except Exception as e:
-    if "BUSYGROUP" in str(e):
-        print("  ℹ️ Consumer Group already exists.")
-    else:
+BATCH_COUNT = int(os.getenv("STREAM_BATCH_COUNT", "100"))
+# Consumers in the group; each is its own process with its own Redis connection
+CONSUMERS = int(os.getenv("STREAM_CONSUMERS", "1"))
+
+
+def connect():
+    return redis_client.connect()
+
+
+def run_consumer(index, count, min_idle_ms, stop, results=None):
+    """
+    One consumer: reclaim stale pending entries, drain new messages, reclaim again, leave the group.
+
+    Args:
+        index: Slot number (part of the unique consumer name)
+        count: Messages per XREADGROUP / XAUTOCLAIM page
+        min_idle_ms: Idle time after which another consumer's pending entry is taken over
+        stop: Event set on SIGINT / SIGTERM; the current batch is finished first
+        results: Queue for the counters (None when running in-process)
+    """
+    if results is not None:
+        # The parent owns Ctrl+C / SIGTERM (both reach the whole process group) and forwards them through `stop`
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, signal.SIG_IGN)
+    redis = connect()
+    name = consumer_name(index)
+    stats = BatchStats(name)
+    print(f"🚀 Starting consumer '{name}'...")
+
+    try:
+        # Entries delivered to a consumer that crashed before acking
+        reclaim_pending(redis, name, count, stats, min_idle_ms)
+        while not stop.is_set():
+            if not process_batch(redis, name, count, stats):
+                # Drained: one last sweep for entries that went stale meanwhile
+                if not reclaim_pending(redis, name, count, stats, min_idle_ms):
+                    break
+    except Exception as e:
+        print(f"❌ [{name}] Error during processing: {e}")
+
+    try:
+        if retire_consumer(redis, name):
+            print(f"  👋 [{name}] Left the group ({stats.messages} messages)")
+        else:
+            print(f"  ⚠️ [{name}] Still owns pending entries; left in the group for reclaim")
+    except Exception as e:
+        print(f"  ⚠️ [{name}] Could not leave the group: {e}")
+
+    if results is not None:
+        results.put(stats.as_dict())
+    return stats.as_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain the sales stream into the feature store.")
+    parser.add_argument("--consumers", type=int, default=CONSUMERS, help="consumer processes in the group")
+    parser.add_argument("--count", type=int, default=BATCH_COUNT, help="messages per read")
+    parser.add_argument("--reclaim-idle-ms", type=int, default=RECLAIM_IDLE_MS,
+                        help="reclaim pending entries idle at least this long")
+    args = parser.parse_args()
+
+    # 1. Connect to Redis
+    print("🔌 Connecting to Redis...")
+    try:
+        redis = connect()
+        redis.ping()
+    except Exception as e:
+        print(f"❌ Failed to connect to Redis: {e}")
+        exit()
+
+    # 2. Create Consumer Group
+    print(f"ℹ️ Ensuring Consumer Group '{GROUP_NAME}' exists...")
+    try:
+        if ensure_group(redis):
+            print("  ✅ Consumer Group Created!")
+        else:
+            print("  ℹ️ Consumer Group already exists.")
+    except Exception as e:
         print(f"  ❌ Error creating group: {e}")
         exit()
 
-print(f"🚀 Starting Batch Processor for consumer '{CONSUMER_NAME}'...")
+    # 3. Consumer Pool
+    # Each read is folded in memory and written back as one transaction:
+    # merged INCRBYFLOATs, one compressed training-buffer chunk (SET + manifest HSET) and one multi-ID XACK
+    ctx = mp.get_context("spawn")
+    stop = ctx.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
 
-# 3. Batch Processing Loop
-processed_count = 0
-while True:
-    try:
-        response = redis.execute([
-            "XREADGROUP", "GROUP", GROUP_NAME, CONSUMER_NAME, 
-            "COUNT", "100",
-            "STREAMS", STREAM_KEY, ">" 
-        ])
-        
-        if not response:
-            print("No new data to process. Shutting down.")
-            break 
-
-        stream_data = response[0][1] 
-
-        for message in stream_data:
-            msg_id = message[0]
-            fields_raw = message[1]
-            data_dict = {fields_raw[i]: fields_raw[i+1] for i in range(0, len(fields_raw), 2)}
-            
-            item_family = data_dict.get('family')
-            store_nbr = data_dict.get('store_nbr', '?')
-            event_date_str = data_dict.get('date', None)
-            sales = float(data_dict.get('sales', 0.0))
-            
-            if not item_family or not event_date_str:
-                redis.execute(["XACK", STREAM_KEY, GROUP_NAME, msg_id]) 
-                continue 
-            
-            # --- TASK 1: UPDATE DASHBOARD AGGREGATES ---
+    stats = BatchStats()
+    start = time.perf_counter()
+    if args.consumers <= 1:
+        stats.merge(run_consumer(0, args.count, args.reclaim_idle_ms, stop))
+    else:
+        print(f"🧵 Starting {args.consumers} consumers...")
+        results = ctx.Queue()
+        workers = [ctx.Process(target=run_consumer, args=(i, args.count, args.reclaim_idle_ms, stop, results))
+                   for i in range(args.consumers)]
+        for worker in workers:
+            worker.start()
+        # Collect before joining so no worker blocks on a full queue
+        collected = 0
+        while collected < len(workers):
             try:
-                event_date = datetime.strptime(event_date_str, "%Y-%m-%d")
-                key_daily = f"feature:sales_daily:{item_family}:{event_date.strftime('%Y-%m-%d')}"
-                key_weekly = f"feature:sales_weekly:{item_family}:{event_date.strftime('%Y-W%U')}"
-                key_monthly = f"feature:sales_monthly:{item_family}:{event_date.strftime('%Y-%m')}"
-                
-                redis.incrbyfloat(key_daily, sales)
-                redis.incrbyfloat(key_weekly, sales)
-                redis.incrbyfloat(key_monthly, sales)
-
-            except ValueError:
-                print(f"  SKIPPED: Invalid date format {event_date_str}")
-                redis.execute(["XACK", STREAM_KEY, GROUP_NAME, msg_id]) 
-                continue
-
-            # --- TASK 2 (NEW): SAVE RAW DATA FOR TRAINING ---
-            # We save the original dictionary (as a JSON string) to our training buffer list
-            redis.lpush(TRAINING_BUFFER_KEY, json.dumps(data_dict))
-            
-            # --- TASK 3: ACKNOWLEDGE MESSAGE ---
-            redis.execute(["XACK", STREAM_KEY, GROUP_NAME, msg_id])
-            processed_count += 1
-            
-            print(f"  🔄 Processed & Saved: {event_date_str} | Store {store_nbr} | {item_family} | +${sales}")
+                stats.merge(results.get(timeout=1))
+                collected += 1
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    print(f"  ⚠️ {len(workers) - collected} consumer(s) exited without reporting")
+                    break
+        for worker in workers:
+            worker.join()
+    wall_seconds = time.perf_counter() - start
+    if stop.is_set():
+        print("🛑 Shutdown requested; in-flight batches were finished.")
+
+    # After processing, we'll trim the buffer to ~100k records to save memory
+    # This keeps the last ~2 days of data for training (100 * 288 runs/day)
+    dropped = training_buffer.trim(redis)
+    print(f"\nBatch complete. {stats.summary(wall_seconds)}. Training buffer trimmed ({dropped:,} old rows dropped).")
+
+    # Throughput / latency of this run plus the stream state it left behind, for the dashboard
+    telemetry.publish(redis, "processor", telemetry.processor_fields(stats.as_dict(), wall_seconds, args.consumers),
+                      telemetry.sample_stream(redis, STREAM_KEY, GROUP_NAME))
 
-    except Exception as e:
-        print(f"❌ Error during processing: {e}")
-        break 
 
-# After processing, we'll trim the buffer to ~100k records to save memory
-# This keeps the last ~2 days of data for training (100 * 288 runs/day)
-redis.ltrim(TRAINING_BUFFER_KEY, 0, 100000)
-print(f"\nBatch complete. Processed {processed_count} messages. Training buffer trimmed.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import argparse
+import signal
+import time
+from dotenv import load_dotenv
+import redis as redis_py
+from utils import redis_client, telemetry, training_buffer
+from utils.stream_batch import (GROUP_NAME, RECLAIM_IDLE_MS, STREAM_KEY, BatchFold, BatchStats, apply, consumer_name,
+                                ensure_group, fold, reclaim_pending, retire_consumer, still_pending,
+                                stream_lag_ms)
+
+# --- CONFIG ---
+load_dotenv()
+# Flush when this many messages are folded...
+BATCH_SIZE = int(os.getenv("STREAM_BATCH_COUNT", "100"))
+# ...or when the oldest folded message has waited this long
+MAX_LATENCY_MS = int(os.getenv("STREAM_MAX_LATENCY_MS", "200"))
+# Blocking read timeout while idle (bounds how long SIGTERM waits)
+IDLE_BLOCK_MS = int(os.getenv("STREAM_IDLE_BLOCK_MS", "1000"))
+# Failed flushes are retried with exponential backoff up to this many seconds
+MAX_BACKOFF_S = float(os.getenv("STREAM_MAX_BACKOFF_S", "30"))
+# Pending-entry sweep (XAUTOCLAIM) and training-buffer trim interval
+RECLAIM_EVERY_S = float(os.getenv("STREAM_RECLAIM_EVERY_S", "60"))
+
+
+class StreamDaemon:
+    """
+    Long-running consumer: blocking XREADGROUP over one persistent TCP connection,
+    flushing folded batches by size or by age.
+
+    Backpressure: at most `batch_size` messages are held unacknowledged. Reads ask
+    only for the remaining capacity, and while a flush is failing nothing new is
+    read, so a slow or unavailable Redis leaves the backlog in the stream instead
+    of in this process.
+    """
+
+    def __init__(self, redis, batch_size=BATCH_SIZE, max_latency_ms=MAX_LATENCY_MS,
+                 idle_block_ms=IDLE_BLOCK_MS, reclaim_idle_ms=RECLAIM_IDLE_MS):
+        self.redis = redis
+        self.batch_size = batch_size
+        self.max_latency_ms = max_latency_ms
+        self.idle_block_ms = idle_block_ms
+        self.reclaim_idle_ms = reclaim_idle_ms
+        self.name = consumer_name()
+        self.stats = BatchStats(self.name)
+        self.stopping = False
+        self.batch = BatchFold()
+        self.first_read_at = None
+        self.reads = 0
+        self.window_start = time.monotonic()
+
+    def stop(self, *_):
+        """Signal handler: finish the in-flight batch, then exit."""
+        if not self.stopping:
+            print("🛑 Shutdown requested; flushing the in-flight batch...")
+        self.stopping = True
+
+    def _age_ms(self) -> float:
+        return (time.perf_counter() - self.first_read_at) * 1000 if self.first_read_at else 0.0
+
+    def _recreate_group(self, error: redis_py.ResponseError) -> bool:
+        """Recreate the consumer group if `error` is NOGROUP (Redis restarted without its data, or flushed)."""
+        if "NOGROUP" not in str(error):
+            return False
+        print("  ⚠️ Consumer group is gone (Redis restarted or flushed); recreating it")
+        ensure_group(self.redis)
+        return True
+
+    def _read(self):
+        """Block for new messages, never longer than the oldest folded message may still wait."""
+        if self.batch.ack_ids:
+            block_ms = int(self.max_latency_ms - self._age_ms())
+            if block_ms <= 0:
+                return
+        else:
+            block_ms = self.idle_block_ms
+        if self.batch.ack_ids:
+            self.reads += 1
+        try:
+            response = self.redis.execute([
+                "XREADGROUP", "GROUP", GROUP_NAME, self.name,
+                "COUNT", str(self.batch_size - len(self.batch.ack_ids)),
+                "BLOCK", str(max(block_ms, 1)),
+                "STREAMS", STREAM_KEY, ">"
+            ])
+        except redis_py.ResponseError as e:
+            if not self._recreate_group(e):
+                raise
+            return
+        if response:
+            if self.first_read_at is None:
+                self.first_read_at = time.perf_counter()
+                self.reads += 1
+            fold(response[0][1], self.batch)
+
+    def _due(self) -> bool:
+        return bool(self.batch.ack_ids) and (
+            len(self.batch.ack_ids) >= self.batch_size or self._age_ms() >= self.max_latency_ms or self.stopping
+        )
+
+    def _flush(self):
+        """
+        Apply the folded batch, retrying with backoff until it lands or shutdown gives up on it.
+
+        A connection error or timeout may come after EXEC reached the server, so
+        before resending the batch is checked against the pending list: if it is
+        no longer pending the transaction landed (or was reclaimed) and a resend
+        would double-count it. Command errors are never retried.
+        """
+        backoff = 0.1
+        failed = False
+        while True:
+            start = time.perf_counter()
+            try:
+                if failed and not still_pending(self.redis, self.name, self.batch.ack_ids):
+                    print(f"  ℹ️ Earlier flush landed; {len(self.batch.ack_ids)} messages already acknowledged")
+                    break
+                apply(self.redis, self.batch)
+                self.stats.record(self.batch, self.reads + 1, time.perf_counter() - start,
+                                  lag_ms=stream_lag_ms(self.batch.ack_ids))
+                break
+            except redis_py.ResponseError as e:
+                # EXEC ran (other commands may have applied); a resend would double-count or fail the same way
+                print(f"  ⚠️ Flush rejected ({e}); {len(self.batch.ack_ids)} messages left to XAUTOCLAIM")
+                break
+            except redis_py.RedisError as e:
+                if self.stopping:
+                    # Entries still pending (if the flush did not land) are left for XAUTOCLAIM
+                    print(f"  ⚠️ Flush failed during shutdown ({e}); {len(self.batch.ack_ids)} messages left pending")
+                    break
+                print(f"  ⚠️ Flush failed ({e}); retrying in {backoff:.1f}s")
+                failed = True
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_S)
+        self.batch = BatchFold()
+        self.first_read_at = None
+        self.reads = 0
+
+    def _publish(self):
+        """Telemetry for the batches since the last publish, plus the current stream state."""
+        now = time.monotonic()
+        fields = telemetry.processor_fields(self.stats.take_window(), now - self.window_start)
+        telemetry.publish(self.redis, "processor", fields, telemetry.sample_stream(self.redis, STREAM_KEY, GROUP_NAME))
+        self.window_start = now
+
+    def _sweep(self):
+        """Periodic housekeeping: take over stale pending entries and trim the training buffer."""
+        try:
+            try:
+                reclaim_pending(self.redis, self.name, self.batch_size, self.stats, self.reclaim_idle_ms)
+            except redis_py.ResponseError as e:
+                # Nothing is pending in a recreated group; go on to the trim
+                if not self._recreate_group(e):
+                    raise
+            training_buffer.trim(self.redis)
+        except redis_py.RedisError as e:
+            # Unapplied entries stay pending; the next sweep retries them
+            print(f"  ⚠️ Sweep failed ({e}); retrying in {RECLAIM_EVERY_S:.0f}s")
+
+    def run(self):
+        """Reclaim, then read / flush until SIGTERM."""
+        reclaim_pending(self.redis, self.name, self.batch_size, self.stats, self.reclaim_idle_ms)
+        last_reclaim = time.monotonic()
+        print(f"🚀 Streaming as '{self.name}' (batch {self.batch_size}, max latency {self.max_latency_ms}ms)")
+
+        while not self.stopping:
+            try:
+                self._read()
+            except redis_py.RedisError as e:
+                # redis-py reconnects on the next command; the unacked fold is still ours
+                print(f"  ⚠️ Read failed ({e}); retrying")
+                time.sleep(1)
+            if self._due():
+                self._flush()
+            if not self.batch.ack_ids and time.monotonic() - last_reclaim >= RECLAIM_EVERY_S:
+                self._sweep()
+                last_reclaim = time.monotonic()
+            if time.monotonic() - self.window_start >= telemetry.PUBLISH_EVERY_S:
+                self._publish()
+
+        if self.batch.ack_ids:
+            self._flush()
+        self._publish()
+        try:
+            if retire_consumer(self.redis, self.name):
+                print(f"  👋 [{self.name}] Left the group")
+            else:
+                print(f"  ⚠️ [{self.name}] Still owns pending entries; left in the group for reclaim")
+        except redis_py.RedisError as e:
+            print(f"  ⚠️ [{self.name}] Could not leave the group: {e}")
+        print(f"\nDaemon stopped. {self.stats.summary()}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running feature processor over a TCP Redis connection.")
+    parser.add_argument("--redis-url", default=redis_client.redis_url(), help="redis:// URL (default: REDIS_URL or localhost)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="flush after this many messages")
+    parser.add_argument("--max-latency-ms", type=int, default=MAX_LATENCY_MS,
+                        help="flush once the oldest folded message is this old")
+    args = parser.parse_args()
+
+    # 1. Connect to Redis (one persistent connection for the daemon's lifetime)
+    print(f"🔌 Connecting to {args.redis_url}...")
+    try:
+        redis = redis_client.connect("tcp", args.redis_url, health_check_interval=30)
+        redis.ping()
+    except Exception as e:
+        print(f"❌ Failed to connect to Redis: {e}")
+        exit()
+
+    # 2. Create Consumer Group
+    print(f"ℹ️ Ensuring Consumer Group '{GROUP_NAME}' exists...")
+    if ensure_group(redis):
+        print("  ✅ Consumer Group Created!")
+
+    daemon = StreamDaemon(redis, args.batch_size, args.max_latency_ms)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, daemon.stop)
+    daemon.run()
+    redis.close()
+
+
+if __name__ == "__main__":
+    main()
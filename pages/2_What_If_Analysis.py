@@ -6,6 +6,8 @@ import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime
 from utils import ui
+from utils.calendar_dim import CALENDAR_FILE, CalendarDimension
+from utils.forecast_cube import CUBE_FILE, DEFAULT_OIL, DEFAULT_TRANSACTIONS, ForecastCube
 
 # --- UI SETUP ---
 ui.setup_page(page_title="What-If Analysis", page_icon="🧪")
@@ -18,7 +20,6 @@ def load_model():
     return model
 
 try:
-    model_xgb = load_model()
     encoders = {
         "family": joblib.load("family_encoder.joblib"),
         "city": joblib.load("city_encoder.joblib"),
@@ -29,6 +30,23 @@ except Exception as e:
     st.error(f"Model assets missing. Please run training first.\n{e}")
     st.stop()
 
+@st.cache_resource
+def load_calendar():
+    try:
+        return CalendarDimension.load(CALENDAR_FILE)
+    except Exception:
+        return None
+
+@st.cache_resource
+def load_forecast_cube():
+    try:
+        return ForecastCube.load(CUBE_FILE)
+    except Exception:
+        return None
+
+calendar = load_calendar()
+forecast_cube = load_forecast_cube()
+
 # --- HEADER ---
 col_header_1, col_header_2 = st.columns([0.8, 0.2])
 with col_header_1:
@@ -55,8 +73,8 @@ with col_controls:
         st.markdown("---")
         
         # Variables
-        oil_price = st.slider("🛢️ Oil Price ($)", 20.0, 120.0, 45.0)
-        transactions = st.slider("💳 Daily Transactions", 500, 5000, 1500)
+        oil_price = st.slider("🛢️ Oil Price ($)", 20.0, 120.0, DEFAULT_OIL)
+        transactions = st.slider("💳 Daily Transactions", 500, 5000, DEFAULT_TRANSACTIONS)
         
         c_promo, c_holiday = st.columns(2)
         is_promo = c_promo.toggle("🔥 Active Promotion", value=False)
@@ -75,38 +93,45 @@ with col_viz:
         # Prepare Data
         dates = pd.date_range(start=datetime.now(), periods=7)
         
-        # Mock Store Metadata (Simplified)
-        city_enc = 0 
-        state_enc = 0
-        type_enc = 0
+        # Store metadata from the forecast cube (mock codes if it has not been built yet)
+        if forecast_cube is not None and store_id < len(forecast_cube.codes['city']):
+            city_enc, state_enc, type_enc = (int(forecast_cube.codes[c][store_id]) for c in ['city', 'state', 'type'])
+        else:
+            city_enc = 0 
+            state_enc = 0
+            type_enc = 0
         
         fam_enc = encoders['family'].transform([family])[0]
         
-        preds = []
-        baseline_preds = []
+        # Holidays that actually apply to this store on each target date
+        calendar_holidays = calendar.is_holiday(dates, store_id) if calendar else np.zeros(len(dates), dtype=int)
         
-        for d in dates:
-            # Scenario Input
-            row = pd.DataFrame([{
+        def predict_live(promo, oil, trans, holidays):
+            # One batched predict for the whole week
+            rows = pd.DataFrame({
                 'store_nbr': store_id, 'family_encoded': fam_enc,
-                'onpromotion': 1 if is_promo else 0, 'transactions': transactions,
-                'dcoilwtico': oil_price, 'is_holiday': 1 if is_holiday else 0,
+                'onpromotion': promo, 'transactions': trans,
+                'dcoilwtico': oil, 'is_holiday': holidays,
                 'city_encoded': city_enc, 'state_encoded': state_enc,
-                'type_encoded': type_enc, 'day_of_week': d.weekday(),
-                'month': d.month, 'year': d.year, 'day_of_month': d.day
-            }])
-            
-            # Baseline Input (Standard values)
-            row_base = row.copy()
-            row_base['dcoilwtico'] = 45.0 # Average
-            row_base['transactions'] = 1500 # Average
-            row_base['onpromotion'] = 0
-            
-            p_scenario = max(0, model_xgb.predict(row)[0])
-            p_base = max(0, model_xgb.predict(row_base)[0])
-            
-            preds.append(p_scenario)
-            baseline_preds.append(p_base)
+                'type_encoded': type_enc, 'day_of_week': dates.weekday,
+                'month': dates.month, 'year': dates.year, 'day_of_month': dates.day
+            })
+            return np.maximum(load_model().predict(rows), 0)
+        
+        # Baseline (standard values, calendar holiday) is always on the nightly grid
+        baseline_preds = forecast_cube.lookup(dates, store_id, family, 0) if forecast_cube else None
+        if baseline_preds is None:
+            baseline_preds = predict_live(0, DEFAULT_OIL, DEFAULT_TRANSACTIONS, calendar_holidays)
+        
+        # The scenario is on the grid too unless oil / transactions / holidays were changed
+        scenario_holidays = np.ones(len(dates), dtype=int) if is_holiday else calendar_holidays
+        preds = None
+        if (forecast_cube is not None and oil_price == DEFAULT_OIL and transactions == DEFAULT_TRANSACTIONS
+                and (scenario_holidays == calendar_holidays).all()):
+            preds = forecast_cube.lookup(dates, store_id, family, int(is_promo))
+        if preds is None:
+            preds = predict_live(int(is_promo), oil_price, transactions, scenario_holidays)
+        baseline_preds, preds = baseline_preds.tolist(), preds.tolist()
             
         # Calculate Impact
         total_base = sum(baseline_preds)
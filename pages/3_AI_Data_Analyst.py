@@ -4,10 +4,11 @@ import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import plotly.express as px
-from upstash_redis import Redis
 import json
-from datetime import datetime, timedelta
+import re
+from datetime import datetime, timedelta, timezone
 from utils import ui # Import shared UI
+from utils import redis_client, rollup_cube
 
 # --- UI SETUP ---
 ui.setup_page(page_title="AI Data Analyst", page_icon="🤖")
@@ -138,6 +139,57 @@ def load_vector_db():
 # Live data is now handled by GitHub Actions (incremental_build.py)
 # Removed unused functions: load_live_data() and add_live_data_to_vector_db()
 
+# --- LIVE FEATURE STORE ---
+LIVE_WINDOWS = {"today": "daily", "this week": "weekly", "this month": "monthly"}
+
+@st.cache_resource
+def get_redis():
+    """Redis connection for live rollup-cube lookups (None if not configured)."""
+    # The REST client only fails at the first command, so check for a URL up front
+    if redis_client.configured_backend() != "tcp" and not os.getenv("UPSTASH_REDIS_REST_URL"):
+        return None
+    try:
+        return redis_client.connect()
+    except Exception:
+        return None
+
+def live_cube_context(prompt):
+    """Pre-aggregated live numbers for "today / this week / this month" questions ("" if not applicable).
+
+    One HMGET against the rollup cube answers e.g. "store 5 promo sales this week".
+    """
+    lower = prompt.lower()
+    period = next((p for phrase, p in LIVE_WINDOWS.items() if phrase in lower), None)
+    redis = get_redis()
+    if period is None or redis is None:
+        return ""
+    
+    store_match = re.search(r'store\s+(\d+)', lower)
+    store = store_match.group(1) if store_match else None
+    # Negated forms ("non-promo", "not on promo", "without promotion") also contain "promo"
+    if re.search(r'\b(?:non|not|no|without)[\s-]+(?:on\s+|a\s+)?promo', lower):
+        promo = 0
+    else:
+        promo = 1 if "promo" in lower else None
+    try:
+        families = [f for f in rollup_cube.members(redis, "family") if f.lower() in lower]
+        cells = rollup_cube.query(redis, period, datetime.now(timezone.utc).date(), store=store, family=families or None, promo=promo)
+    except Exception as e:
+        print(f"Live cube lookup error: {e}")
+        return ""
+    if not cells:
+        return ""
+    
+    window = next(phrase for phrase, p in LIVE_WINDOWS.items() if p == period)
+    context = f"# LIVE FEATURE STORE ({window}, streamed events)\n\n"
+    for (c_store, c_family, c_promo), stats in cells.items():
+        who = "All stores" if c_store == rollup_cube.ALL else f"Store {c_store}"
+        what = "all families" if c_family == rollup_cube.ALL else c_family
+        promo_txt = {"1": "on promotion", "0": "not on promotion"}.get(c_promo, "promo + regular")
+        context += (f"- {who}, {what}, {promo_txt}: sales ${stats['sum']:,.2f} over {stats['count']:,.0f} events "
+                    f"(min ${stats['min']:,.2f}, max ${stats['max']:,.2f}, mean ${stats['mean']:,.2f})\n")
+    return context + "\n"
+
 # --- RAG LOGIC ---
 def parse_query_filters(prompt):
     """Extract metadata filters from user query with error handling.
@@ -146,7 +198,6 @@ def parse_query_filters(prompt):
     Product families are handled by semantic search since they have variations
     (e.g., GROCERY I, GROCERY II, etc.)
     """
-    import re
     filters = {}
     
     try:
@@ -197,8 +248,9 @@ def get_ai_response_rag(prompt, pinecone_client):
         
         # 2. Retrieve relevant records from Pinecone (with filters if available)
         relevant_records = pinecone_client.query(prompt, top_k=30, filter=filters)
+        live_context = live_cube_context(prompt)
         
-        if not relevant_records:
+        if not relevant_records and not live_context:
             filter_msg = f" with filters {filters}" if filters else ""
             
             # DEBUG: Try without filters to see what's available
@@ -230,7 +282,7 @@ def get_ai_response_rag(prompt, pinecone_client):
             return f"I couldn't find any relevant records for your question{filter_msg}. Try rephrasing or asking about a different topic."
         
         # 3. Format retrieved records as context
-        context = "# RETRIEVED SALES RECORDS\n\n"
+        context = live_context + "# RETRIEVED SALES RECORDS\n\n"
         if filters:
             context += f"Filters applied: {filters}\n\n"
         context += f"Found {len(relevant_records)} relevant records:\n\n"
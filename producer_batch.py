@@ -1,79 +1,146 @@
-import pandas as pd
-from upstash_redis import Redis
 import os
+import argparse
+import asyncio
+import json
 from dotenv import load_dotenv
-import random
 import datetime
+import time
+import numpy as np
+from utils import event_codec, event_pool, load_generator, redis_client, telemetry
+from utils.stream_batch import GROUP_NAME
 
 # --- CONFIG ---
 load_dotenv()
 STREAM_KEY = "store_sales_stream"
-BATCH_SIZE = 50 
-
-# 1. Connect to Redis
-print("🔌 Connecting to Redis...")
-try:
-    redis = Redis(url=os.getenv("UPSTASH_REDIS_REST_URL"), token=os.getenv("UPSTASH_REDIS_REST_TOKEN"))
-    redis.ping()
-except Exception as e:
-    print(f"❌ Failed to connect to Redis: {e}")
-    exit()
-
-# 2. Load SIMULATION Data (from test.csv to prevent data duplication)
-print("📂 Loading 'data/test.csv' for simulation...")
-try:
-    # --- THIS IS THE FIX ---
-    # We now read from test.csv. This file has NO sales data,
-    # so we are truly simulating new, unseen events.
-    df = pd.read_csv("data/test.csv", encoding='latin1', low_memory=False)
-    
-    # Optimization: Only keep columns we need
-    df = df[['store_nbr', 'family', 'onpromotion']]
-    
-    print(f"  ✅ Loaded {len(df):,} future events to simulate.")
-
-except Exception as e:
-    print(f"❌ CRITICAL: Failed to load data: {e}")
-    exit()
-
-print(f"🚀 Starting Batch Producer... Sending {BATCH_SIZE} simulated sales.")
-
-# 3. The Batch Loop
-for i in range(BATCH_SIZE):
-    # Randomly sample 1 event from the "future" (test.csv)
-    row = df.sample(1).iloc[0]
-    
-    # --- SYNTHETIC DATA GENERATION ---
-    # 1. Use today's date to make it "live"
+BATCH_SIZE = 50
+
+
+def load_pool():
+    """Load the prebuilt event pool (built from the lake on first use or when the CSVs change)."""
+    print("📂 Loading event pool for simulation...")
+    try:
+        # test.csv events (NO sales data, so we are truly simulating new, unseen events)
+        # with per store × family sales distributions fitted on train.csv, memory-mapped
+        pool = event_pool.load_or_build()
+        print(f"  ✅ {len(pool.events):,} future events to simulate, sales fitted up to {pool.meta['fit_end']}.")
+        return pool
+
+    except Exception as e:
+        print(f"❌ CRITICAL: Failed to load data: {e}")
+        exit()
+
+
+def run_batch(pool, seed=None):
+    """The original scheduled producer: BATCH_SIZE events, their XADDs pipelined in one request."""
+    # 1. Connect to Redis
+    print("🔌 Connecting to Redis...")
+    try:
+        redis = redis_client.connect()
+        redis.ping()
+    except Exception as e:
+        print(f"❌ Failed to connect to Redis: {e}")
+        exit()
+
+    print(f"🚀 Starting Batch Producer... Sending {BATCH_SIZE} simulated sales.")
+
+    # 2. Draw the whole batch at once: random "future" events (test.csv) with
+    # sales from their store × family × promo distribution, dated today to make it "live"
     current_time = datetime.datetime.now().strftime("%Y-%m-%d")
-    
-    # 2. Invent a realistic sales number
-    # We invent a base sale. If it's on promo, we boost it.
-    base_sales = random.uniform(5.0, 500.0)
-    if row['onpromotion'] == 1:
-        base_sales *= 1.5 # 50% sales boost for promo
-        
-    simulated_sales = round(base_sales, 2)
-    # ---------------------------------
-    
-    event = {
-        "date": current_time,
-        "store_nbr": int(row['store_nbr']),
-        "family": row['family'],
-        "sales": simulated_sales, # Use the new simulated sales
-        "onpromotion": int(row['onpromotion']),
-        "batch_id": i
-    }
-    
-    flat_args = []
-    for k, v in event.items():
-        flat_args.extend([str(k), str(v)])
-        
+    batch = pool.sample(BATCH_SIZE, np.random.default_rng(seed))
+    entries = event_codec.xadd_fields(batch, current_time, batch_id=np.arange(BATCH_SIZE))
+
+    # 3. Send the batch: all XADDs pipelined in one request
+    pipe = redis.pipeline()
+    for fields in entries:
+        pipe.xadd(STREAM_KEY, fields)
+    start = time.perf_counter()
     try:
-        redis.execute(["XADD", STREAM_KEY, "*"] + flat_args)
-        # Short log to save space
-        print(f"  ✅ {event['date']} | Store {event['store_nbr']} | {event['family'][:10]}.. | ${event['sales']}")
+        pipe.exec()
+        sent = len(entries)
+        for i in range(sent):
+            # Short log to save space
+            print(f"  ✅ {current_time} | Store {batch['store_nbr'][i]} | {batch['family'][i][:10]}.. | "
+                  f"${batch['sales'][i]:.2f}")
     except Exception as e:
+        sent = 0
         print(f"  ❌ Error sending to stream: {e}")
+    request_ms = (time.perf_counter() - start) * 1000
+
+    # 4. Telemetry: this run's rate and request latency, plus the stream state (lag, memory)
+    fields = telemetry.producer_fields(sent, len(entries) - sent, request_ms / 1000, [request_ms] if sent else [], "batch")
+    telemetry.publish(redis, "producer", fields, telemetry.sample_stream(redis, STREAM_KEY, GROUP_NAME))
+
+    print(f"\nBatch complete. Sent {sent} events. Producer shutting down.")
+
+
+async def run_load(pool, args):
+    """Load-generator mode: a target events/s with concurrent pipelined XADDs."""
+    if args.fake_server:
+        url = load_generator.start_fake_server(args.fake_server)
+        print(f"🧪 In-memory fakeredis serving {url} (point the processor at it with --redis-url)")
+    else:
+        url = args.redis_url or (redis_client.redis_url() if redis_client.configured_backend() == "tcp" else None)
+    if url:
+        target = load_generator.AsyncTarget.tcp(url, max_connections=args.concurrency)
+    else:
+        target = load_generator.AsyncTarget.upstash(os.getenv("UPSTASH_REDIS_REST_URL"),
+                                                    os.getenv("UPSTASH_REDIS_REST_TOKEN"))
+
+    print(f"🚀 Load test: {args.profile} profile, mean {args.rate:,.0f} events/s for {args.duration:.0f}s "
+          f"({args.batch} XADDs per request, {args.concurrency} in flight)")
+    try:
+        summary = await load_generator.run(target, pool, args.rate, args.duration, profile=args.profile,
+                                           batch_size=args.batch, concurrency=args.concurrency,
+                                           report_every=args.report_every, maxlen=args.maxlen, seed=args.seed)
+        fields = telemetry.producer_fields(summary['sent_events'], summary['failed_events'], summary['seconds'], [],
+                                           f"load:{args.profile}")
+        fields.update({name: value for name, value in summary.items() if name.startswith("request_ms_")})
+        try:
+            await target.pipeline(telemetry.commands("producer", fields))
+        except Exception as e:
+            print(f"  ⚠️ Telemetry not published: {e}")
+    finally:
+        await target.close()
+
+    print(f"\n📊 Sent {summary['sent_events']:,} of {summary['target_events']:,} events "
+          f"({summary['failed_events']:,} failed) at {summary['achieved_rate']:,.0f}/s achieved")
+    if summary['requests']:
+        print(f"  Request latency  p50 {summary['request_ms_p50']:.1f}ms  p95 {summary['request_ms_p95']:.1f}ms  "
+              f"p99 {summary['request_ms_p99']:.1f}ms  max {summary['request_ms_max']:.1f}ms")
+        print(f"  Event latency    p50 {summary['event_ms_p50']:.1f}ms  p95 {summary['event_ms_p95']:.1f}ms  "
+              f"p99 {summary['event_ms_p99']:.1f}ms  (scheduled → acknowledged)")
+    if summary['group_lag'] is not None:
+        print(f"  Consumer group lag at the end: {summary['group_lag']:,} entries")
+    if summary.get('first_error'):
+        print(f"  ⚠️ First error: {summary['first_error']}")
+    if args.json:
+        print(json.dumps(summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated sales producer for the Redis stream.")
+    parser.add_argument("--load", action="store_true", help="load-generator mode instead of one 50-event batch")
+    parser.add_argument("--rate", type=float, default=1000.0, help="load: mean events per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="load: seconds to generate for")
+    parser.add_argument("--profile", choices=load_generator.PROFILES, default="constant",
+                        help="load: arrival profile")
+    parser.add_argument("--batch", type=int, default=100, help="load: XADDs per pipelined request")
+    parser.add_argument("--concurrency", type=int, default=16, help="load: requests in flight")
+    parser.add_argument("--report-every", type=float, default=5.0, help="load: seconds between progress lines")
+    parser.add_argument("--maxlen", type=int, default=0, help="load: approximate stream cap (0 = untrimmed)")
+    parser.add_argument("--redis-url", help="load: redis:// target instead of Upstash REST (e.g. a local server)")
+    parser.add_argument("--fake-server", type=int, metavar="PORT",
+                        help="load: serve an in-memory fakeredis on this port and target it")
+    parser.add_argument("--seed", type=int, help="sampling seed")
+    parser.add_argument("--json", action="store_true", help="load: also print the summary as one JSON line")
+    args = parser.parse_args()
+
+    pool = load_pool()
+    if args.load:
+        asyncio.run(run_load(pool, args))
+    else:
+        run_batch(pool, args.seed)
+
 
-print(f"\nBatch complete. Sent {BATCH_SIZE} events. Producer shutting down.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
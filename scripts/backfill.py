@@ -0,0 +1,268 @@
+"""
+Backfill and Replay
+Rebuilds the live Redis features from train.csv without going through the stream.
+
+    backfill  Computes the per-family period hashes (utils/aggregates.py), the
+              rollup cube (utils/rollup_cube.py) and the hourly time series
+              (utils/timeseries.py) with vectorized groupbys and writes them
+              with pipelined HSETs, split so no request exceeds the REST
+              payload limit. Values are set, not added, so re-running is
+              idempotent.
+    replay    Pushes historical events through the stream at a fixed rate to
+              load-test the live path. Replayed events carry the replay flag
+              (utils/event_codec.py) and are kept out of the training buffer (they are already in train.csv).
+
+Periods already past retention are skipped, as on the live path;
+--shift-to-today moves the selected dates so the newest one is today.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from itertools import product
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import aggregates, event_codec, redis_client, rollup_cube, timeseries
+from utils.data_lake import load_table
+from utils.stream_batch import STREAM_KEY
+
+SALES_COLUMNS = ['date', 'store_nbr', 'family', 'sales', 'onpromotion']
+# Upstash rejects request bodies over its plan's max request size (1 MB on the free tier)
+MAX_REQUEST_BYTES = int(os.getenv("BACKFILL_MAX_REQUEST_BYTES", str(512 * 1024)))
+# Replay pacing: one pipelined XADD batch per tick
+REPLAY_TICK_S = 0.1
+
+
+class BulkWriter:
+    """Pipelines commands and sends them whenever the next one would push the request past `max_bytes`."""
+
+    def __init__(self, redis, max_bytes: int = MAX_REQUEST_BYTES):
+        self.redis = redis
+        self.max_bytes = max_bytes
+        self.commands: List[List[str]] = []
+        self.size = 0
+        self.requests = 0
+        self.fields = 0
+
+    @staticmethod
+    def _cost(args: Iterable[str]) -> int:
+        # JSON array of strings: quotes + comma per argument
+        return sum(len(arg) + 3 for arg in args)
+
+    def add(self, command: List[str]):
+        cost = self._cost(command)
+        if self.commands and self.size + cost > self.max_bytes:
+            self.flush()
+        self.commands.append(command)
+        self.size += cost
+
+    def hset(self, key: str, fields: List[str], values: List[str], expiry: int):
+        """HSET a whole hash, split into as many commands as the payload limit needs, then EXPIREAT it."""
+        budget = self.max_bytes - self._cost(["HSET", key])
+        start, size = 0, 0
+        for i, (field, value) in enumerate(zip(fields, values)):
+            cost = self._cost((field, value))
+            if i > start and size + cost > budget:
+                self.add(["HSET", key] + [v for pair in zip(fields[start:i], values[start:i]) for v in pair])
+                start, size = i, 0
+            size += cost
+        if start < len(fields):
+            self.add(["HSET", key] + [v for pair in zip(fields[start:], values[start:]) for v in pair])
+        self.add(["EXPIREAT", key, str(expiry)])
+        self.fields += len(fields)
+
+    def flush(self):
+        if not self.commands:
+            return
+        pipe = self.redis.pipeline()
+        for command in self.commands:
+            pipe.execute(command)
+        pipe.exec()
+        self.requests += 1
+        self.commands, self.size = [], 0
+
+
+def connect(redis_url: Optional[str]):
+    """The configured client (REDIS_BACKEND), or a TCP client for --redis-url."""
+    return redis_client.connect(url=redis_url)
+
+
+def load_events(start: Optional[str], end: Optional[str], shift_to_today: bool) -> pd.DataFrame:
+    """train.csv rows in [start, end], optionally moved so the newest date is today."""
+    df = load_table("train", columns=SALES_COLUMNS, start=start, end=end)
+    if shift_to_today and len(df):
+        df['date'] = df['date'] + (pd.Timestamp(date.today()) - df['date'].max())
+    df['family'] = df['family'].astype(str)
+    return df
+
+
+def daily_cells(df: pd.DataFrame) -> pd.DataFrame:
+    """Sum / count / min / max of sales per (date, store, family, promo flag)."""
+    df = df.assign(promo=np.where(df['onpromotion'] > 0, "1", "0"), store=df['store_nbr'].astype(str))
+    return (df.groupby(['date', 'store', 'family', 'promo'], observed=True)['sales']
+              .agg(['sum', 'count', 'min', 'max']).reset_index())
+
+
+def _period_columns(cells: pd.DataFrame, period: str, now: float) -> pd.DataFrame:
+    """Add the period id and expiry (mapped from the few unique dates) and drop expired rows."""
+    days = pd.DatetimeIndex(cells['date'].unique())
+    pids = {day: aggregates.period_id(period, day.date()) for day in days}
+    expiry = {day: aggregates.expire_at(period, day.date()) for day in days}
+    cells = cells.assign(pid=cells['date'].map(pids), expiry=cells['date'].map(expiry))
+    return cells[cells['expiry'] > now]
+
+
+def _numbers(values: pd.Series) -> List[str]:
+    return [repr(float(v)) for v in values]
+
+
+def write_period(writer: BulkWriter, cells: pd.DataFrame, period: str) -> Tuple[int, int]:
+    """
+    Family totals and every cube roll-up for one period type.
+
+    Returns:
+        (family hashes, cube hashes) written
+    """
+    families = cells.groupby(['pid', 'family'], observed=True).agg(total=('sum', 'sum'), expiry=('expiry', 'first'))
+    for pid, group in families.groupby(level='pid'):
+        writer.hset(aggregates.hash_key(period, pid), group.index.get_level_values('family').tolist(),
+                    _numbers(group['total']), int(group['expiry'].iloc[0]))
+
+    rolled = []
+    for mask in product((True, False), repeat=3):
+        kept = [dim for dim, keep in zip(('store', 'family', 'promo'), mask) if keep]
+        g = cells.groupby(['pid'] + kept, observed=True).agg(
+            sum=('sum', 'sum'), count=('count', 'sum'), min=('min', 'min'), max=('max', 'max'),
+            expiry=('expiry', 'first')).reset_index()
+        for dim, keep in zip(('store', 'family', 'promo'), mask):
+            if not keep:
+                g[dim] = rollup_cube.ALL
+        rolled.append(g)
+    cube = pd.concat(rolled, ignore_index=True)
+    cube['cell'] = cube['store'] + "|" + cube['family'] + "|" + cube['promo']
+
+    for pid, group in cube.groupby('pid'):
+        fields, values = [], []
+        for stat in rollup_cube.STATS:
+            fields += (group['cell'] + f"|{stat}").tolist()
+            values += group[stat].astype(np.int64).astype(str).tolist() if stat == "count" else _numbers(group[stat])
+        writer.hset(rollup_cube.cube_key(period, pid), fields, values, int(group['expiry'].iloc[0]))
+    return len(families.index.unique('pid')), cube['pid'].nunique()
+
+
+def write_series(writer: BulkWriter, cells: pd.DataFrame, now: float) -> int:
+    """Daily family totals into the hourly series (history has no time of day, so midnight buckets)."""
+    daily = cells.groupby(['date', 'family'], observed=True)['sum'].sum().reset_index()
+    expiry = {day: timeseries.expire_at(pd.Timestamp(day).to_pydatetime()) for day in daily['date'].unique()}
+    daily['month'] = daily['date'].dt.strftime('%Y-%m')
+    daily['hour'] = ((daily['date'] - pd.Timestamp(timeseries.EPOCH)) // pd.Timedelta(hours=1)).astype(str)
+    daily['expiry'] = daily['date'].map(expiry)
+    daily = daily[daily['expiry'] > now]
+    for (family, month), group in daily.groupby(['family', 'month']):
+        writer.hset(timeseries.series_key(family, month), group['hour'].tolist(), _numbers(group['sum']),
+                    int(group['expiry'].iloc[0]))
+    return daily.groupby(['family', 'month']).ngroups
+
+
+def backfill(redis, df: pd.DataFrame):
+    """Compute and write every live layout for the selected rows."""
+    now = time.time()
+    writer = BulkWriter(redis)
+
+    compute_start = time.perf_counter()
+    cells = daily_cells(df)
+    print(f"  ✅ {len(df):,} rows → {len(cells):,} daily cells in {time.perf_counter() - compute_start:.1f}s")
+
+    for period in aggregates.PERIODS:
+        live = _period_columns(cells, period, now)
+        if live.empty:
+            print(f"  ⏭️ {period}: every period is past retention")
+            continue
+        family_hashes, cube_hashes = write_period(writer, live, period)
+        print(f"  📦 {period}: {family_hashes} family hashes, {cube_hashes} cube hashes "
+              f"({len(cells) - len(live):,} cells past retention skipped)")
+
+    series = write_series(writer, cells, now)
+    print(f"  📈 time series: {series} family-month hashes")
+
+    for dimension, values in (("store", cells['store']), ("family", cells['family']), ("promo", cells['promo'])):
+        writer.add(["SADD", rollup_cube.members_key(dimension)] + sorted(values.unique()))
+    writer.flush()
+    print(f"  ✅ {writer.fields:,} fields in {writer.requests} pipelined requests "
+          f"(≤ {writer.max_bytes / 1024:,.0f} KiB each)")
+
+
+def replay(redis, df: pd.DataFrame, rate: float, limit: int):
+    """XADD events in date order at `rate` events/s, one pipeline per tick."""
+    df = df.sort_values(['date', 'store_nbr', 'family'], kind='stable').head(limit)
+    entries = event_codec.xadd_fields({name: df[name].to_numpy() for name in SALES_COLUMNS}, replay=True)
+    per_tick = max(1, int(round(rate * REPLAY_TICK_S)))
+    print(f"🚀 Replaying {len(df):,} events at {rate:,.0f}/s ({per_tick} per pipelined request)...")
+
+    start = time.perf_counter()
+    for i in range(0, len(df), per_tick):
+        pipe = redis.pipeline()
+        for fields in entries[i:i + per_tick]:
+            pipe.execute(["XADD", STREAM_KEY, "*"] + fields)
+        pipe.exec()
+        # Pace against the schedule, not the previous tick, so slow requests are caught up
+        delay = start + (i + per_tick) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if (i // per_tick) % 50 == 0:
+            sent = min(i + per_tick, len(df))
+            print(f"  ↪️ {sent:,} sent, {sent / (time.perf_counter() - start):,.0f}/s")
+
+    elapsed = time.perf_counter() - start
+    print(f"  ✅ {len(df):,} events in {elapsed:.1f}s ({len(df) / elapsed if elapsed else 0:,.0f}/s achieved)")
+
+
+def main():
+    """Main execution function."""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("mode", choices=("backfill", "replay"))
+    parser.add_argument("--start", help="First date (YYYY-MM-DD, inclusive)")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD, inclusive)")
+    parser.add_argument("--shift-to-today", action="store_true",
+                        help="Move the selected dates so the newest one is today (keeps them inside retention)")
+    parser.add_argument("--redis-url", help="redis:// URL (default: Upstash REST from the environment)")
+    parser.add_argument("--rate", type=float, default=100.0, help="replay: events per second")
+    parser.add_argument("--limit", type=int, default=10000, help="replay: events to send")
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+
+    print("=" * 60)
+    print(f"⏪ {'Backfilling live aggregates' if args.mode == 'backfill' else 'Replaying history'} from train.csv")
+    print("=" * 60)
+    start_time = time.perf_counter()
+
+    df = load_events(args.start, args.end, args.shift_to_today)
+    if df.empty:
+        print("  ⚠️ No rows in the selected range")
+        return
+    print(f"  ✅ Loaded {len(df):,} rows, {df['date'].min():%Y-%m-%d} → {df['date'].max():%Y-%m-%d}")
+
+    redis = connect(args.redis_url)
+    if args.mode == "backfill":
+        backfill(redis, df)
+    else:
+        replay(redis, df, args.rate, args.limit)
+
+    print(f"\n⏱️  Completed in {time.perf_counter() - start_time:.1f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark Event Codec
+Compares the text stream format (one field/value pair per event attribute)
+with the binary codec (utils/event_codec.py) on the same sampled events:
+
+    bytes/event    stream field bytes and XADD REST request bytes, plus
+                   Redis MEMORY USAGE of a stream of each format with --redis-url
+    decode         consumer-side parse throughput (fields → typed values) and
+                   full stream_batch.fold throughput, in XREADGROUP-sized reads
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import event_codec, event_pool, redis_client, stream_batch
+
+FORMATS = ("text", "binary")
+
+
+def best_of(repeat: int, func: Callable[[], None]) -> float:
+    """Fastest of `repeat` timed calls, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def parse_text(reads: List[List]):
+    """What the text path does per message before folding: dict + typed values."""
+    for read in reads:
+        for _, fields_raw in read:
+            data = stream_batch.parse_fields(fields_raw)
+            datetime.strptime(data['date'], "%Y-%m-%d")
+            float(data['sales'])
+            int(data['store_nbr'])
+            float(data['onpromotion'])
+
+
+def parse_binary(reads: List[List]):
+    for read in reads:
+        list(event_codec.rows(event_codec.decode([fields_raw[1] for _, fields_raw in read])))
+
+
+def stream_memory(redis, entries: List[List[str]], key: str) -> Optional[int]:
+    """MEMORY USAGE of a stream holding `entries` (None if the server lacks MEMORY; the key is deleted)."""
+    redis.execute(["DEL", key])
+    try:
+        for i in range(0, len(entries), 1000):
+            pipe = redis.pipeline()
+            for fields in entries[i:i + 1000]:
+                pipe.execute(["XADD", key, "*"] + fields)
+            pipe.exec()
+        return int(redis.execute(["MEMORY", "USAGE", key, "SAMPLES", "0"]))
+    except Exception as e:
+        print(f"  ⚠️ MEMORY USAGE unavailable: {e}")
+        return None
+    finally:
+        redis.execute(["DEL", key])
+
+
+def main():
+    """Main execution function."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000, help="events to encode")
+    parser.add_argument("--batch", type=int, default=100, help="messages per simulated XREADGROUP")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per measurement (best is kept)")
+    parser.add_argument("--redis-url", help="redis:// server to measure stream MEMORY USAGE on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="also print the results as one JSON line")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📦 Stream Event Codec Benchmark")
+    print("=" * 60)
+
+    pool = event_pool.load_or_build()
+    events = pool.sample(args.events, np.random.default_rng(args.seed))
+    today = datetime.now().strftime("%Y-%m-%d")
+    entries = {fmt: event_codec.xadd_fields(events, today, fmt=fmt) for fmt in FORMATS}
+    # XADD-style IDs from the current time, so the time-series bucketing matches the live path
+    base_ms = int(time.time() * 1000)
+    ids = [f"{base_ms + i // 10}-{i % 10}" for i in range(args.events)]
+    reads = {fmt: [[[ids[j], entries[fmt][j]] for j in range(i, min(i + args.batch, args.events))]
+                   for i in range(0, args.events, args.batch)]
+             for fmt in FORMATS}
+    print(f"  {args.events:,} events sampled from the event pool, {len(reads['text']):,} reads of {args.batch}")
+
+    results: Dict[str, Dict] = {}
+    for fmt in FORMATS:
+        field_bytes = sum(len(value) for fields in entries[fmt] for value in fields)
+        rest_bytes = sum(len(json.dumps(["XADD", stream_batch.STREAM_KEY, "*"] + fields)) for fields in entries[fmt])
+        parse_s = best_of(args.repeat, lambda: (parse_text if fmt == "text" else parse_binary)(reads[fmt]))
+        fold_s = best_of(args.repeat, lambda: [stream_batch.fold(read) for read in reads[fmt]])
+        results[fmt] = {
+            "field_bytes_per_event": round(field_bytes / args.events, 1),
+            "rest_bytes_per_event": round(rest_bytes / args.events, 1),
+            "parse_events_per_s": round(args.events / parse_s),
+            "fold_events_per_s": round(args.events / fold_s),
+        }
+    if args.redis_url:
+        redis = redis_client.connect("tcp", args.redis_url)
+        used = {fmt: stream_memory(redis, entries[fmt], f"{stream_batch.STREAM_KEY}:codec_benchmark:{fmt}")
+                for fmt in FORMATS}
+        redis.close()
+        if None not in used.values():
+            for fmt in FORMATS:
+                results[fmt]["redis_bytes_per_event"] = round(used[fmt] / args.events, 1)
+
+    # Both formats must fold to the same features
+    folded = {fmt: stream_batch.BatchFold() for fmt in FORMATS}
+    for fmt in FORMATS:
+        for read in reads[fmt]:
+            stream_batch.fold(read, folded[fmt])
+    text, binary = folded["text"].increments, folded["binary"].increments
+    same = text.keys() == binary.keys() and all(abs(text[k] - binary[k]) < 1e-6 * max(1.0, abs(text[k])) for k in text)
+
+    print(f"\n  {'':24}{'text':>12}{'binary':>12}{'ratio':>9}")
+    for metric in results["text"]:
+        t, b = results["text"][metric], results["binary"][metric]
+        print(f"  {metric:24}{t:>12,}{b:>12,}{(t / b if 'bytes' in metric else b / t):>8.1f}x")
+    print(f"\n  {'✅' if same else '❌'} Folded increments {'match' if same else 'DIFFER'} "
+          f"({len(text):,} fields)")
+    print("=" * 60)
+    if args.json:
+        print(json.dumps({"events": args.events, "batch": args.batch, "folds_match": same, **results}))
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
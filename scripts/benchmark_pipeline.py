@@ -0,0 +1,370 @@
+"""
+Benchmark Pipeline
+End-to-end run of the live path against a local Redis stand-in, with no
+Upstash credentials needed:
+
+    producer     the asyncio load generator (producer_batch.py --load) XADDs
+                 pool events at --rate for --duration seconds
+    processor    --consumers processes run the feature_store_batch.py loop
+                 (XREADGROUP → fold → one MULTI/EXEC) until the stream is drained
+    dashboard    the reads behind one dashboard refresh per period (family
+                 hash, time-series EVAL, rollup-cube HMGET, telemetry), timed
+
+The target is a throwaway redis-server when one is on PATH, otherwise a
+fakeredis server in its own process (--server), or an existing empty database (--redis-url).
+Results (throughput, XADD-to-visible latency percentiles, round trips per
+event, Redis memory and key growth) are printed and written as JSON; with
+--baseline, metrics that regressed past --tolerance fail the run.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import aggregates, event_codec, event_pool, load_generator, redis_client, rollup_cube, telemetry, timeseries
+from utils.stream_batch import STREAM_KEY, BatchStats, consumer_name, ensure_group, process_batch, retire_consumer
+
+SERVERS = ("auto", "redis", "fake")
+# Consumer poll interval while the stream is empty but the producer is still running
+IDLE_S = 0.005
+# Same window as the dashboard's sparkline
+SPARKLINE_DAYS = 90
+# (section, metric, True if higher is better) compared against --baseline
+CHECKS = (
+    ("processor", "events_per_s", True),
+    ("end_to_end", "lag_ms_p95", False),
+    ("processor", "round_trips_per_event", False),
+    ("memory", "bytes_per_event", False),
+    ("dashboard", "refresh_ms_p95", False),
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_fake(port: int):
+    """Process target: fakeredis on `port` until terminated (its own process, so it does not share the GIL)."""
+    load_generator.start_fake_server(port)
+    while True:
+        time.sleep(3600)
+
+
+def start_server(kind: str):
+    """
+    Start a throwaway Redis.
+
+    Args:
+        kind: redis (redis-server binary), fake (fakeredis) or auto (redis if on PATH)
+
+    Returns:
+        (url, server name, server process to terminate afterwards)
+    """
+    port = free_port()
+    url = f"redis://127.0.0.1:{port}/0"
+    if kind == "redis" or (kind == "auto" and shutil.which("redis-server")):
+        name = "redis-server"
+        process = subprocess.Popen(["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        name = "fakeredis"
+        process = mp.get_context("spawn").Process(target=serve_fake, args=(port,), daemon=True)
+        process.start()
+    client = redis_client.connect("tcp", url)
+    for _ in range(200):
+        try:
+            client.ping()
+            break
+        except Exception:
+            time.sleep(0.05)
+    else:
+        process.kill()
+        raise SystemExit(f"❌ {name} did not start")
+    client.close()
+    return url, name, process
+
+
+def server_memory(url: str) -> Dict[str, int]:
+    """INFO memory on a throwaway connection ({} when the server has no INFO, e.g. fakeredis)."""
+    redis = redis_client.connect("tcp", url, max_connections=1)
+    try:
+        return telemetry.memory_info(redis.execute(["INFO", "memory"]))
+    except Exception:
+        return {}
+    finally:
+        redis.close()
+
+
+def consume(url: str, index: int, count: int, ready, producing, results, verbose: bool):
+    """
+    One processor consumer: the feature_store_batch.py loop, polling while the producer runs.
+
+    Exits once the producer is done and a read comes back empty, then leaves the group.
+    """
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    redis = redis_client.connect("tcp", url)
+    name = consumer_name(index)
+    stats = BatchStats(name)
+    ready.wait()
+    while True:
+        if process_batch(redis, name, count, stats):
+            continue
+        if not producing.is_set():
+            break
+        time.sleep(IDLE_S)
+    retire_consumer(redis, name)
+    out = stats.as_dict()
+    out["requests"] = redis.requests
+    results.put(out)
+
+
+def dashboard_refreshes(redis, family: str, repeat: int) -> Dict:
+    """Time the dashboard's Redis reads: `repeat` refreshes of every period's view."""
+    refresh_ms = []
+    requests = redis.requests
+    for _ in range(repeat):
+        for period in aggregates.PERIODS:
+            start = time.perf_counter()
+            today = datetime.now(timezone.utc)
+            aggregates.read_window(redis, period, today.date())
+            current_span, previous_span = timeseries.period_windows(period, today)
+            spark_start = datetime(today.year, today.month, today.day) - timedelta(days=SPARKLINE_DAYS - 1)
+            timeseries.range_query(redis, family, [
+                (spark_start, spark_start + timedelta(days=SPARKLINE_DAYS), "daily"),
+                (*current_span, None),
+                (*previous_span, None),
+            ])
+            rollup_cube.query(redis, period, today.date(), family=family, promo=[1, 0])
+            telemetry.read(redis)
+            refresh_ms.append((time.perf_counter() - start) * 1000)
+    out = {"refreshes": len(refresh_ms),
+           "round_trips_per_refresh": round((redis.requests - requests) / len(refresh_ms), 2)}
+    out.update(telemetry.percentiles("refresh_ms", refresh_ms))
+    return out
+
+
+async def produce(url: str, pool, args) -> Dict:
+    """The load generator at the configured rate; returns its summary."""
+    target = load_generator.AsyncTarget.tcp(url, max_connections=args.concurrency)
+    try:
+        return await load_generator.run(target, pool, args.rate, args.duration, profile=args.profile,
+                                        batch_size=args.batch, concurrency=args.concurrency,
+                                        report_every=args.report_every, seed=args.seed)
+    finally:
+        await target.close()
+
+
+def run(url: str, pool, args) -> Dict:
+    """Produce, process and read back once; returns the result sections (see CHECKS)."""
+    redis = redis_client.connect("tcp", url)
+    ensure_group(redis)
+    keys_before = int(redis.execute(["DBSIZE"]))
+    memory_before = server_memory(url)
+
+    ctx = mp.get_context("spawn")
+    ready = ctx.Barrier(args.consumers + 1)
+    producing = ctx.Event()
+    producing.set()
+    results = ctx.Queue()
+    workers = [ctx.Process(target=consume, args=(url, i, args.count, ready, producing, results, args.verbose))
+               for i in range(args.consumers)]
+    for worker in workers:
+        worker.start()
+    # Consumers are connected and imported before the first event is sent
+    ready.wait()
+
+    start = time.perf_counter()
+    try:
+        produced = asyncio.run(produce(url, pool, args))
+    finally:
+        # Consumers drain what is left and exit
+        producing.clear()
+    produced_at = time.perf_counter()
+
+    stats = BatchStats()
+    consumer_requests = 0
+    collected = 0
+    while collected < len(workers):
+        try:
+            counters = results.get(timeout=1)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                print(f"  ⚠️ {len(workers) - collected} consumer(s) exited without reporting")
+                break
+            continue
+        consumer_requests += counters.pop("requests")
+        stats.merge(counters)
+        collected += 1
+    for worker in workers:
+        worker.join()
+    wall_seconds = time.perf_counter() - start
+    print(f"  ✅ Processed {stats.summary(wall_seconds)}")
+
+    memory_after = server_memory(url)
+    keys_after = int(redis.execute(["DBSIZE"]))
+    sent = produced["sent_events"]
+    memory = {"keys_before": keys_before, "keys_after": keys_after,
+              "stream_length": int(redis.execute(["XLEN", STREAM_KEY]))}
+    if "redis_used_bytes" in memory_before and "redis_used_bytes" in memory_after:
+        growth = memory_after["redis_used_bytes"] - memory_before["redis_used_bytes"]
+        memory.update(used_bytes_before=memory_before["redis_used_bytes"],
+                      used_bytes_after=memory_after["redis_used_bytes"],
+                      bytes_per_event=round(growth / sent, 1) if sent else None)
+
+    print(f"📊 Timing {args.refreshes} dashboard refreshes per period...")
+    dashboard = dashboard_refreshes(redis, args.family, args.refreshes)
+    redis.close()
+
+    producer = {key: value for key, value in produced.items() if key != "group_lag"}
+    producer["round_trips_per_event"] = round(produced["requests"] / sent, 4) if sent else None
+    processor = telemetry.processor_fields(stats.as_dict(), wall_seconds, args.consumers)
+    processor.update(round_trips=stats.round_trips, requests=consumer_requests,
+                     round_trips_per_event=round(stats.round_trips / stats.messages, 4) if stats.messages else None,
+                     drain_s=round(time.perf_counter() - produced_at, 2), unprocessed=sent - stats.messages)
+    for name in [name for name in processor if name.startswith("lag_ms")]:
+        processor.pop(name)
+    return {
+        "producer": producer,
+        "processor": processor,
+        # XADD (server clock, from the entry ID) → increments visible after the batch's EXEC
+        "end_to_end": telemetry.percentiles("lag_ms", stats.lag_ms),
+        "round_trips_per_event": round((produced["requests"] + stats.round_trips) / sent, 4) if sent else None,
+        "memory": memory,
+        "dashboard": dashboard,
+    }
+
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """CHECKS metrics worse than the baseline by more than `tolerance` (a fraction)."""
+    out = []
+    for section, metric, higher_is_better in CHECKS:
+        new, old = results.get(section, {}).get(metric), baseline.get(section, {}).get(metric)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > tolerance:
+            out.append(f"{section}.{metric}: {old:,} → {new:,} ({change:+.0%})")
+    return out
+
+
+def main():
+    """Main execution function."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=2000.0, help="mean events per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of producing")
+    parser.add_argument("--profile", choices=load_generator.PROFILES, default="constant", help="arrival profile")
+    parser.add_argument("--batch", type=int, default=100, help="XADDs per pipelined producer request")
+    parser.add_argument("--concurrency", type=int, default=16, help="producer requests in flight")
+    parser.add_argument("--consumers", type=int, default=1, help="processor consumer processes")
+    parser.add_argument("--count", type=int, default=100, help="messages per processor read")
+    parser.add_argument("--refreshes", type=int, default=20, help="timed dashboard refreshes per period")
+    parser.add_argument("--family", default="GROCERY I", help="family the dashboard reads are for")
+    parser.add_argument("--server", choices=SERVERS, default="auto",
+                        help="throwaway server: redis-server, fakeredis, or redis-server if installed")
+    parser.add_argument("--redis-url", help="existing redis:// database to use instead (must be empty)")
+    parser.add_argument("--flush", action="store_true", help="FLUSHDB a non-empty --redis-url first")
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between producer progress lines")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="print every processor batch")
+    parser.add_argument("--output", type=Path, help="write the results JSON here")
+    parser.add_argument("--json", action="store_true", help="also print the results as one JSON line")
+    parser.add_argument("--baseline", type=Path, help="results JSON of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative regression against --baseline")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🏁 End-to-End Pipeline Benchmark")
+    print("=" * 60)
+
+    process = None
+    if args.redis_url:
+        url, server = args.redis_url, "redis-url"
+        redis = redis_client.connect("tcp", url)
+        if int(redis.execute(["DBSIZE"])):
+            if not args.flush:
+                raise SystemExit(f"❌ {url} is not empty; pass --flush to clear it or use a throwaway server")
+            redis.execute(["FLUSHDB"])
+        redis.close()
+    else:
+        url, server, process = start_server(args.server)
+    print(f"  🧪 {server} at {url}")
+
+    pool = event_pool.load_or_build()
+    print(f"  {len(pool.events):,} pool events | {args.rate:,.0f}/s for {args.duration:.0f}s ({args.profile}) | "
+          f"{args.consumers} consumer(s) × {args.count} per read")
+    start = time.time()
+    try:
+        sections = run(url, pool, args)
+    finally:
+        if process is not None:
+            process.terminate()
+            if isinstance(process, subprocess.Popen):
+                process.wait()
+            else:
+                process.join()
+
+    results = {
+        "timestamp": datetime.fromtimestamp(start).isoformat(timespec="seconds"),
+        "config": {"server": server, "rate": args.rate, "duration": args.duration, "profile": args.profile,
+                   "batch": args.batch, "concurrency": args.concurrency, "consumers": args.consumers,
+                   "count": args.count, "event_format": event_codec.STREAM_FORMAT, "seed": args.seed},
+        **sections,
+    }
+
+    producer, processor, latency = results["producer"], results["processor"], results["end_to_end"]
+    print(f"\n  Producer   {producer['achieved_rate']:>10,.0f} events/s  "
+          f"{producer['sent_events']:,} sent, {producer['failed_events']:,} failed")
+    print(f"  Processor  {processor['events_per_s']:>10,.0f} events/s  "
+          f"{processor['round_trips_per_event']} round trips/event, drained {processor['drain_s']}s after the producer")
+    if latency:
+        print(f"  XADD → visible  p50 {latency['lag_ms_p50']:,.1f}ms  p95 {latency['lag_ms_p95']:,.1f}ms  "
+              f"p99 {latency['lag_ms_p99']:,.1f}ms  max {latency['lag_ms_max']:,.1f}ms")
+    memory = results["memory"]
+    print(f"  Memory     {memory['keys_before']:,} → {memory['keys_after']:,} keys"
+          + (f", {memory['bytes_per_event']:,} bytes/event" if memory.get("bytes_per_event") is not None
+             else " (server has no INFO memory)"))
+    dashboard = results["dashboard"]
+    print(f"  Dashboard  refresh p50 {dashboard['refresh_ms_p50']:,.1f}ms  p95 {dashboard['refresh_ms_p95']:,.1f}ms  "
+          f"{dashboard['round_trips_per_refresh']} round trips")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"  💾 Results written to {args.output}")
+    failed = []
+    if args.baseline:
+        failed = regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in failed:
+            print(f"  ❌ Regression {line}")
+        if not failed:
+            print(f"  ✅ Within {args.tolerance:.0%} of {args.baseline}")
+    if processor["unprocessed"]:
+        failed.append(f"{processor['unprocessed']:,} events were not processed")
+        print(f"  ❌ {failed[-1]}")
+    print("=" * 60)
+    if args.json:
+        print(json.dumps(results))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Benchmark Training
+Runs train.py end to end on synthetic Favorita data (utils/synthetic_data.py)
+at one or more scales and reports how each stage scales with the history:
+
+    generate     synthetic CSVs (reused when the same scale / seed exists)
+    lake         scripts/build_data_lake.py on them
+    train.py     in a scratch directory with a local file-store MLflow, a
+                 cold feature cache and (when fakeredis is installed) an empty
+                 in-process Redis, so no Kaggle, MLflow or Redis credentials
+                 are needed; the run's own StageProfiler metrics give seconds
+                 and peak RSS per stage (load, encode, merge, featurize, the
+                 XGBoost and Prophet fits, forecast cube, save)
+
+Fits run one after another (TRAIN_PARALLEL=0) unless --parallel, so each
+stage's time and memory are its own. Results are printed as a table and
+written as JSON.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import mlflow
+from mlflow.tracking import MlflowClient
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import load_generator, synthetic_data
+
+ROOT = Path(__file__).parent.parent
+PARENT_RUN = "Nightly_Pipeline_Run"
+# Pipeline order of train.py's profiler stages; child-run stages are listed right after "fit"
+STAGE_ORDER = ("load", "load_buffer", "encode", "merge", "featurize_dimensions", "featurize_gather", "featurize_cache",
+               "fit", "save_xgboost", "forecast_cube", "save_prophet")
+# The local file store is opt-in on recent MLflow releases (train.py runs inherit this)
+os.environ.setdefault("MLFLOW_ALLOW_FILE_STORE", "true")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_scale(value: str) -> int:
+    """A named scale (1m, 3m, 30m) or a row count."""
+    return synthetic_data.SCALES.get(value.lower()) or int(value)
+
+
+def prepare_data(data_dir: Path, rows: int, stores: int, seed: int) -> Dict:
+    """Generate the CSVs unless this exact dataset is already there; returns its description."""
+    marker = data_dir / "synthetic.json"
+    wanted = {"rows": rows, "stores": stores, "seed": seed}
+    if marker.exists():
+        info = json.loads(marker.read_text())
+        if all(info.get(key) == value for key, value in wanted.items()):
+            print(f"  ♻️ Reusing {data_dir}")
+            return {**info, "generate_s": None}
+    shutil.rmtree(data_dir, ignore_errors=True)
+    start = time.perf_counter()
+    info = {**wanted, **synthetic_data.generate(data_dir, rows, stores, seed)}
+    marker.write_text(json.dumps(info))
+    info["generate_s"] = round(time.perf_counter() - start, 2)
+    print(f"  ✅ Generated {info['train']:,} train rows ({info['start']} → {info['end']}) in {info['generate_s']}s")
+    return info
+
+
+def run_script(script: Path, env: Dict[str, str], cwd: Path, log: Path) -> Dict:
+    """Run a repo script as a child process; returns wall time, its peak RSS and exit code."""
+    start = time.perf_counter()
+    with open(log, "w") as out:
+        process = subprocess.Popen([sys.executable, str(script)], cwd=cwd, env=env, stdout=out, stderr=subprocess.STDOUT)
+        # wait4 reports this child's own peak RSS (getrusage(RUSAGE_CHILDREN) would be the max over all runs)
+        _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {"seconds": round(time.perf_counter() - start, 2), "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+            "returncode": process.returncode}
+
+
+def _stage_rank(stage: str) -> float:
+    if "." in stage:
+        return STAGE_ORDER.index("fit") + 0.5
+    return STAGE_ORDER.index(stage) if stage in STAGE_ORDER else len(STAGE_ORDER)
+
+
+def collect(tracking_uri: str) -> Dict:
+    """
+    Stage metrics of the train.py run in `tracking_uri`.
+
+    Returns:
+        {"stages": {stage: {"seconds", "peak_rss_mb"}}, "mae": {run: mae}, "total_rows": ...};
+        child-run stages are prefixed with the run name
+    """
+    client = MlflowClient(tracking_uri=tracking_uri)
+    experiments = [experiment.experiment_id for experiment in client.search_experiments()]
+    runs = sorted(client.search_runs(experiments), key=lambda run: run.info.start_time)
+    out = {"stages": {}, "mae": {}}
+    for run in runs:
+        name = run.info.run_name
+        metrics = run.data.metrics
+        prefix = "" if name == PARENT_RUN else f"{name}."
+        if name == PARENT_RUN:
+            out["total_rows"] = int(run.data.params.get("total_rows", 0))
+        elif "mae" in metrics:
+            out["mae"][name] = round(metrics["mae"], 4)
+        # Profiler stages are the metrics logged as a <stage>_seconds / <stage>_peak_rss_mb pair
+        for key, value in metrics.items():
+            stage = key[:-len("_seconds")]
+            if key.endswith("_seconds") and f"{stage}_peak_rss_mb" in metrics:
+                out["stages"][prefix + stage] = {"seconds": round(value, 2),
+                                                 "peak_rss_mb": round(metrics[f"{stage}_peak_rss_mb"], 1)}
+    out["stages"] = dict(sorted(out["stages"].items(), key=lambda item: _stage_rank(item[0])))
+    return out
+
+
+def benchmark_scale(rows: int, args, redis_url: str) -> Dict:
+    """Generate (or reuse), build the lake and train once at `rows`."""
+    scale_dir = args.workdir / f"rows{rows}_stores{args.stores}_seed{args.seed}"
+    data_dir = (scale_dir / "data").resolve()
+    run_dir = (scale_dir / "run").resolve()
+    info = prepare_data(data_dir, rows, args.stores, args.seed)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    run_dir.mkdir(parents=True)
+
+    tracking_uri = (run_dir / "mlruns").as_uri()
+    env = {
+        **os.environ,
+        "DATA_DIR": str(data_dir),
+        "DATA_LAKE_DIR": str(data_dir / "lake"),
+        # Cold cache: every month is featurized, as on a first run
+        "FEATURE_CACHE_DIR": str(run_dir / "feature_cache"),
+        "FEATURE_CACHE": "1" if args.feature_cache else "0",
+        "MLFLOW_TRACKING_URI": tracking_uri,
+        "MLFLOW_TRACKING_USERNAME": "benchmark",
+        "MLFLOW_TRACKING_PASSWORD": "benchmark",
+        "REDIS_BACKEND": "tcp",
+        "REDIS_URL": redis_url,
+        "REDIS_RETRIES": "0",
+        "TRAIN_PARALLEL": "1" if args.parallel else "0",
+    }
+
+    lake = run_script(ROOT / "scripts" / "build_data_lake.py", env, run_dir, run_dir / "lake.log")
+    print(f"  🗄️ Data lake ready in {lake['seconds']}s")
+    print(f"  🚀 Training on {info['train']:,} rows (log: {run_dir / 'train.log'})...")
+    train = run_script(ROOT / "train.py", env, run_dir, run_dir / "train.log")
+    if train["returncode"] != 0:
+        tail = (run_dir / "train.log").read_text().splitlines()[-15:]
+        raise SystemExit("❌ train.py failed:\n" + "\n".join(tail))
+    print(f"  ✅ train.py finished in {train['seconds']}s, peak RSS {train['max_rss_mb']:,.0f} MB")
+
+    return {"rows": info["train"], "stores": args.stores, "start": info["start"], "end": info["end"],
+            "generate_s": info["generate_s"], "lake_s": lake["seconds"], "train_s": train["seconds"],
+            "train_max_rss_mb": train["max_rss_mb"], **collect(tracking_uri)}
+
+
+def print_table(results: Dict[str, Dict]):
+    """Seconds and peak RSS per stage, one column pair per scale."""
+    stages = list(dict.fromkeys(stage for result in results.values() for stage in result["stages"]))
+    width = max([len(stage) for stage in stages] + [12])
+    print(f"\n  {'stage':{width}}" + "".join(f"{scale:>22}" for scale in results))
+    print(f"  {'':{width}}" + "".join(f"{'s':>10}{'peak MB':>12}" for _ in results))
+    for stage in stages:
+        cells = ""
+        for result in results.values():
+            record = result["stages"].get(stage)
+            cells += f"{record['seconds']:>10,.1f}{record['peak_rss_mb']:>12,.0f}" if record else f"{'—':>10}{'—':>12}"
+        print(f"  {stage:{width}}{cells}")
+    print(f"  {'train.py total':{width}}"
+          + "".join(f"{result['train_s']:>10,.1f}{result['train_max_rss_mb']:>12,.0f}" for result in results.values()))
+
+
+def main():
+    """Main execution function."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", nargs="+", default=["1m"],
+                        help=f"train.csv sizes: {', '.join(synthetic_data.SCALES)} or a row count")
+    parser.add_argument("--stores", type=int, default=synthetic_data.DEFAULT_STORES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=Path, default=Path("data/benchmark_training"),
+                        help="synthetic datasets and scratch runs")
+    parser.add_argument("--feature-cache", action="store_true",
+                        help="train through the month feature cache (cold) instead of the in-memory frame")
+    parser.add_argument("--parallel", action="store_true", help="run the three fits in parallel, as in production")
+    parser.add_argument("--output", type=Path, help="write the results JSON here")
+    parser.add_argument("--json", action="store_true", help="also print the results as one JSON line")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🏋️ Training Pipeline Benchmark")
+    print("=" * 60)
+
+    if importlib.util.find_spec("fakeredis"):
+        redis_url = load_generator.start_fake_server(free_port())
+    else:
+        # Nothing listens here: the training-buffer read fails at once and train.py carries on without it
+        redis_url = f"redis://127.0.0.1:{free_port()}/0"
+        print("  ℹ️ fakeredis not installed; training runs without a Redis buffer")
+
+    results = {}
+    for scale in args.scales:
+        rows = parse_scale(scale)
+        print(f"\n📐 Scale {scale}: {rows:,} rows")
+        results[scale] = benchmark_scale(rows, args, redis_url)
+
+    print_table(results)
+    for scale, result in results.items():
+        print(f"  {scale}: MAE " + ", ".join(f"{run} {mae}" for run, mae in result["mae"].items()))
+    output = {"config": {"stores": args.stores, "seed": args.seed, "feature_cache": args.feature_cache,
+                         "parallel": args.parallel, "mlflow": mlflow.__version__},
+              "scales": results}
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(output, indent=2))
+        print(f"  💾 Results written to {args.output}")
+    print("=" * 60)
+    if args.json:
+        print(json.dumps(output))
+
+
+if __name__ == "__main__":
+    main()
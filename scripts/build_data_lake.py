@@ -0,0 +1,41 @@
+"""
+Build Columnar Data Lake
+One-time ingestion of the Kaggle CSVs into date-partitioned Parquet datasets.
+Re-running only rebuilds tables whose source CSV changed.
+"""
+
+import sys
+from pathlib import Path
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import data_lake
+
+def main():
+    """Main execution function."""
+    print("=" * 60)
+    print("🗄️  Building Columnar Data Lake")
+    print("=" * 60)
+    print(f"  Source: {data_lake.DATA_DIR}")
+    print(f"  Target: {data_lake.LAKE_DIR}")
+
+    start_time = datetime.now()
+    for name in data_lake.SCHEMAS:
+        if not data_lake.csv_path(name).exists():
+            print(f"  ⚠️ {name}.csv not found, skipping")
+            continue
+
+        rows = data_lake.ingest_csv(name, force="--force" in sys.argv)
+        if rows:
+            print(f"  ✅ {name}: {rows:,} rows written")
+        else:
+            print(f"  ℹ️ {name}: up to date")
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+    print(f"\n⏱️  Ingestion completed in {elapsed:.1f}s")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Build Event Pool
+Precomputes the producer's memory-mapped event pool (utils/event_pool.py):
+integer-coded test.csv events plus per store × family sales distributions
+fitted on train.csv. Re-running only rebuilds when a source CSV changed.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import event_pool
+
+
+def main():
+    """Main execution function."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="rebuild even if the sources are unchanged")
+    parser.add_argument("--fit-days", type=int, default=event_pool.FIT_DAYS,
+                        help="days of train.csv history the sales distributions are fitted on")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🎲 Building Event Pool")
+    print("=" * 60)
+    print(f"  Target: {event_pool.POOL_DIR}")
+
+    meta_file = event_pool.POOL_DIR / "meta.json"
+    if not args.force and meta_file.exists():
+        pool = event_pool.EventPool.load()
+        if pool.is_current() and pool.meta.get("fit_days") == args.fit_days:
+            print(f"  ℹ️ Up to date ({len(pool.events):,} events)")
+            print("=" * 60)
+            return
+
+    start_time = time.perf_counter()
+    pool = event_pool.build_from_lake(args.fit_days)
+    pool.save()
+    cells = pool.sales_params.shape[0] * pool.sales_params.shape[1] * pool.sales_params.shape[2]
+    print(f"  ✅ {len(pool.events):,} events, {len(pool.families)} families, {cells:,} sales distributions "
+          f"fitted on {pool.meta['fit_rows']:,} rows up to {pool.meta['fit_end']}")
+    print(f"\n⏱️  Built in {time.perf_counter() - start_time:.1f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compact Legacy Aggregates
+One-off migration of the old per-family string keys
+(feature:sales_{period}:{family}:{period_id}) into the per-period hashes of
+utils/aggregates.py. Values are added with HINCRBYFLOAT, the hashes get their
+retention EXPIREAT, and the string keys are deleted in the same transaction.
+Keys of periods already past retention are only deleted.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import aggregates, redis_client
+
+LEGACY_PATTERN = "feature:sales_*:*:*"
+SCAN_COUNT = 500
+
+
+def parse_legacy_key(key: str):
+    """(period, family, period start) for a legacy string key, or None if it is not one."""
+    prefix, _, rest = key.partition("feature:sales_")
+    period, _, rest = rest.partition(":")
+    family, _, pid = rest.rpartition(":")
+    if prefix or period not in aggregates.PERIODS or not family:
+        return None
+    try:
+        return period, family, aggregates.parse_period_id(period, pid)
+    except ValueError:
+        return None
+
+
+def compact_page(redis, keys) -> int:
+    """Migrate one SCAN page; returns the number of legacy keys removed."""
+    legacy = [(key, parsed) for key in keys if (parsed := parse_legacy_key(key))]
+    if not legacy:
+        return 0
+    values = redis.execute(["MGET"] + [key for key, _ in legacy])
+
+    now = time.time()
+    tx = redis.multi()
+    for (key, (period, family, day)), value in zip(legacy, values):
+        expiry = aggregates.expire_at(period, day)
+        if value is not None and expiry > now:
+            target = aggregates.hash_key(period, aggregates.period_id(period, day))
+            tx.hincrbyfloat(target, family, float(value))
+            tx.expireat(target, expiry)
+    tx.execute(["DEL"] + [key for key, _ in legacy])
+    tx.exec()
+    return len(legacy)
+
+
+def main():
+    """Main execution function."""
+    load_dotenv()
+    print("=" * 60)
+    print("🗜️  Compacting legacy aggregate keys into per-period hashes")
+    print("=" * 60)
+    redis = redis_client.connect()
+
+    start_time = time.perf_counter()
+    cursor, removed = 0, 0
+    while True:
+        response = redis.execute(["SCAN", str(cursor), "MATCH", LEGACY_PATTERN, "COUNT", str(SCAN_COUNT),
+                                  "TYPE", "string"])
+        cursor, keys = int(response[0]), response[1]
+        removed += compact_page(redis, keys)
+        if cursor == 0:
+            break
+
+    print(f"  ✅ Migrated and removed {removed:,} legacy keys in {time.perf_counter() - start_time:.1f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 sys.path.append(str(Path(__file__).parent.parent))
 
 from utils.pinecone_client import get_pinecone_client
+from utils.data_lake import latest_date, load_table
 
 def load_latest_data(days: int = 1) -> pd.DataFrame:
     """
@@ -25,18 +26,18 @@ def load_latest_data(days: int = 1) -> pd.DataFrame:
     """
     print(f"\n📂 Loading last {days} day(s) of data...")
     
-    # Load training data
-    train_df = pd.read_csv('./data/train.csv', parse_dates=['date'])
+    # Only the newest partition(s) are read: the cutoff is pushed down into the scan
+    cutoff_date = latest_date('train') - timedelta(days=days)
+    train_df = load_table('train', start=cutoff_date + timedelta(days=1))
     
-    # Load store metadata
-    stores_df = pd.read_csv('./data/stores.csv')
+    # Keep the original train.csv row id as the index so vector IDs stay stable
+    train_df = train_df.set_index('id')
     
-    # Merge
-    df = train_df.merge(stores_df, on='store_nbr', how='left')
+    # Load store metadata
+    stores_df = load_table('stores', columns=['store_nbr', 'city', 'state', 'type'])
     
-    # Filter to recent data
-    cutoff_date = df['date'].max() - timedelta(days=days)
-    df = df[df['date'] > cutoff_date]
+    # Merge (index-preserving lookup of store metadata)
+    df = train_df.join(stores_df.set_index('store_nbr'), on='store_nbr')
     
     if len(df) == 0:
         print("  ⚠️ No new records found")
@@ -12,6 +12,7 @@ from datetime import datetime
 sys.path.append(str(Path(__file__).parent.parent))
 
 from utils.pinecone_client import get_pinecone_client
+from utils.data_lake import load_recent, load_table
 
 def load_recent_data(max_records: int = 500000) -> pd.DataFrame:
     """
@@ -25,19 +26,15 @@ def load_recent_data(max_records: int = 500000) -> pd.DataFrame:
     """
     print(f"\n📂 Loading up to {max_records:,} most recent records...")
     
-    # Load training data
-    train_df = pd.read_csv('./data/train.csv', parse_dates=['date'])
+    # Load training data (newest partitions first, stops once max_records are read)
+    train_df = load_recent('train', max_records)
     
     # Load store metadata
-    stores_df = pd.read_csv('./data/stores.csv')
+    stores_df = load_table('stores', columns=['store_nbr', 'city', 'state', 'type'])
     
     # Merge
     df = train_df.merge(stores_df, on='store_nbr', how='left')
     
-    # Sort by date (most recent first) and take the last N records
-    df = df.sort_values('date', ascending=False).head(max_records)
-    df = df.sort_values('date').reset_index(drop=True)  # Re-sort chronologically
-    
     print(f"  ✅ Loaded {len(df):,} records from {df['date'].min().date()} to {df['date'].max().date()}")
     
     return df
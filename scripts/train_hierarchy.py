@@ -0,0 +1,127 @@
+"""
+Hierarchical Prophet Training
+Fits one Prophet model per node of the total / family / store (/ store×family)
+hierarchy across a process pool, reconciles the forecasts and writes
+hierarchy_forecast.npz + hierarchy_params.npz for the dashboard.
+
+Run after train.py so the feature cache and calendar_dim.npz are current; falls
+back to the data lake otherwise. Only lake history months are read: buffer events
+are dated at produce time, and a cube spanning the gap to them would zero-fill it.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import feature_cache, hierarchy
+from utils.calendar_dim import CALENDAR_FILE, CalendarDimension
+from utils.data_lake import list_partitions, load_table
+
+
+def load_cube() -> hierarchy.SalesCube:
+    """Daily sales cube of the lake history, from the feature cache when populated, else from the lake."""
+    df_oil = load_table("oil")
+    if os.path.exists(CALENDAR_FILE):
+        calendar = CalendarDimension.load(CALENDAR_FILE)
+    else:
+        calendar = CalendarDimension.build(load_table("holidays_events"), load_table("stores"))
+
+    # Cached buffer months (dated at produce time) are skipped: SalesCube spans every day
+    # between its first and last date, so they would add years of zero sales to every series
+    history = set(list_partitions("train"))
+    months = [m for m in feature_cache.cached_months() if m in history] if feature_cache.enabled() else []
+    if months and os.path.exists("family_encoder.joblib"):
+        import joblib
+        families = joblib.load("family_encoder.joblib").classes_
+        columns = ['date', 'store_nbr', 'family_encoded', 'sales']
+        chunks = list(feature_cache.iter_months(months, columns))
+        chunks = [dict(c, date=np.asarray(c['date']).astype('datetime64[D]')) for c in chunks]
+        print(f"  ✅ Sales from feature cache: {len(months)} months")
+    else:
+        df = load_table("train", columns=['date', 'store_nbr', 'family', 'sales'])
+        family = df['family'].astype('category')
+        families = family.cat.categories.to_numpy(dtype=str)
+        chunks = [{'date': df['date'].values, 'store_nbr': df['store_nbr'].values,
+                   'family_encoded': family.cat.codes.values, 'sales': df['sales'].values}]
+        print(f"  ✅ Sales from data lake: {len(df):,} rows")
+    return hierarchy.SalesCube.build(chunks, families, df_oil, calendar), calendar
+
+
+def main():
+    """Main execution function."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default=",".join(hierarchy.DEFAULT_LEVELS),
+                        help=f"Comma-separated subset of {','.join(hierarchy.LEVELS)}")
+    parser.add_argument("--method", choices=hierarchy.METHODS, default="mint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=int, default=hierarchy.SERIES_TIMEOUT, help="Per-series fit timeout (s)")
+    parser.add_argument("--horizon", type=int, default=hierarchy.HORIZON, help="Forecast days")
+    args = parser.parse_args()
+    levels = [level.strip() for level in args.levels.split(",") if level.strip()]
+    unknown = set(levels) - set(hierarchy.LEVELS)
+    if unknown:
+        parser.error(f"unknown levels: {', '.join(sorted(unknown))}")
+    if args.method == "bottom_up" and "store_family" not in levels:
+        parser.error("bottom_up reconciliation needs the store_family level")
+
+    print("=" * 60)
+    print("🌳 Hierarchical Prophet Training")
+    print("=" * 60)
+    start_time = time.perf_counter()
+
+    cube, calendar = load_cube()
+    nodes = cube.nodes(levels)
+    print(f"  ✅ {len(nodes):,} series ({', '.join(f'{k}={v}' for k, v in Counter(nodes['level']).items())})")
+
+    # Future regressors: last known oil price, calendar holidays
+    future_dates = cube.dates[-1] + np.arange(1, args.horizon + 1) * hierarchy.ONE_DAY
+    future_oil = np.full(args.horizon, cube.oil[-1], dtype=np.float32)
+    future_any = calendar.any_store(future_dates)
+    tasks = []
+    for name, store, family in zip(nodes['node'], nodes['store'], nodes['family']):
+        tasks.append({
+            'name': name, 'start': cube.start, 'y': cube.series(store, family),
+            'oil': cube.oil, 'holiday': cube.holiday(store),
+            'future_oil': future_oil,
+            'future_holiday': calendar.is_holiday(future_dates, int(cube.stores[store])) if store >= 0 else future_any,
+            'timeout': args.timeout,
+        })
+
+    print(f"  🧵 Fitting on {args.workers} worker(s), {args.timeout}s per-series timeout...")
+    fit_start = time.perf_counter()
+    results = hierarchy.fit_nodes(tasks, args.workers)
+    fit_seconds = time.perf_counter() - fit_start
+    status = Counter(r['status'] for r in results)
+    print(f"  ✅ Fitted in {fit_seconds:.1f}s: " + ", ".join(f"{k}={v}" for k, v in status.items()))
+    for r in results:
+        if r['status'] in ('timeout', 'failed'):
+            print(f"  ⚠️ {r['name']}: {r['status']} ({r.get('error', '')}); seasonal-naive fallback used")
+
+    yhat = np.stack([r['yhat'] for r in results])
+    half_width = np.stack([(r['upper'] - r['lower']) / 2 for r in results])
+    sigma = np.array([r['sigma'] for r in results])
+    reconciled, half_width = hierarchy.reconcile(nodes, yhat, half_width, sigma, args.method)
+    C = hierarchy.constraint_matrix(nodes)
+    if len(C):
+        gap = np.abs(C @ yhat).max()
+        print(f"  ✅ Reconciled ({args.method}): max aggregation gap {gap:,.1f} → {np.abs(C @ reconciled).max():,.3f}")
+
+    hierarchy.save(hierarchy.FORECAST_FILE, hierarchy.PARAMS_FILE, nodes, cube, future_dates,
+                   reconciled, half_width, results, args.method)
+    sizes = {f: os.path.getsize(f) / 1024 for f in (hierarchy.FORECAST_FILE, hierarchy.PARAMS_FILE)}
+    print("  💾 " + ", ".join(f"{f} ({kb:,.0f} KB)" for f, kb in sizes.items()))
+
+    print(f"\n⏱️  Completed in {time.perf_counter() - start_time:.1f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Coherence of the reconciled hierarchy forecasts."""
+
+import numpy as np
+import pytest
+
+from utils import hierarchy
+
+FAMILIES = np.array(["BEVERAGES", "DAIRY", "EGGS"])
+STORES = np.array([1, 4, 7, 9])
+HORIZON = 5
+
+
+def make_nodes(levels):
+    n_days = 30
+    cube = hierarchy.SalesCube(np.datetime64("2017-07-01"),
+                               np.ones((n_days, len(STORES), len(FAMILIES)), dtype=np.float32),
+                               STORES, FAMILIES, np.ones(n_days, dtype=np.float32),
+                               np.zeros((n_days, len(STORES)), dtype=np.int8))
+    return cube.nodes(levels)
+
+
+def base_forecasts(nodes, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(nodes)
+    return rng.gamma(2.0, 50.0, (n, HORIZON)), rng.uniform(1.0, 20.0, (n, HORIZON)), rng.uniform(0.5, 5.0, n)
+
+
+def assert_coherent(nodes, yhat):
+    level, store, family = nodes['level'].values, nodes['store'].values, nodes['family'].values
+    total = yhat[level == 'total'][0]
+    np.testing.assert_allclose(yhat[level == 'store'].sum(axis=0), total, rtol=1e-9)
+    np.testing.assert_allclose(yhat[level == 'family'].sum(axis=0), total, rtol=1e-9)
+    bottom = level == 'store_family'
+    if bottom.any():
+        for i in np.flatnonzero(level == 'store'):
+            np.testing.assert_allclose(yhat[bottom & (store == store[i])].sum(axis=0), yhat[i], rtol=1e-9)
+        for i in np.flatnonzero(level == 'family'):
+            np.testing.assert_allclose(yhat[bottom & (family == family[i])].sum(axis=0), yhat[i], rtol=1e-9)
+
+
+@pytest.mark.parametrize("method, levels", [
+    ("mint", hierarchy.DEFAULT_LEVELS),
+    ("mint", hierarchy.LEVELS),
+    ("bottom_up", hierarchy.LEVELS),
+])
+def test_reconciled_forecasts_add_up(method, levels):
+    nodes = make_nodes(levels)
+    yhat, half_width, sigma = base_forecasts(nodes)
+    # Base forecasts from independent fits are not coherent
+    with pytest.raises(AssertionError):
+        assert_coherent(nodes, yhat)
+
+    out, width = hierarchy.reconcile(nodes, yhat, half_width, sigma, method)
+    assert_coherent(nodes, out)
+    assert width.shape == half_width.shape
+    assert np.isfinite(width).all() and (width >= 0).all()
+
+
+def test_mint_keeps_coherent_forecasts_and_zero_variance_nodes():
+    nodes = make_nodes(hierarchy.LEVELS)
+    yhat, half_width, sigma = base_forecasts(nodes)
+    coherent, _ = hierarchy.reconcile(nodes, yhat, half_width, sigma, "bottom_up")
+    out, _ = hierarchy.reconcile(nodes, coherent, half_width, sigma, "mint")
+    np.testing.assert_allclose(out, coherent, rtol=1e-9)
+
+    # A node without residual variance (constant fallback) is not adjusted
+    sigma[0] = 0.0
+    out, _ = hierarchy.reconcile(nodes, yhat, half_width, sigma, "mint")
+    np.testing.assert_allclose(out[0], yhat[0], rtol=1e-9)
+    assert_coherent(nodes, out)
+
+
+def test_constraint_matrix_vanishes_on_bottom_up_sums():
+    nodes = make_nodes(hierarchy.LEVELS)
+    yhat, half_width, sigma = base_forecasts(nodes)
+    coherent, _ = hierarchy.reconcile(nodes, yhat, half_width, sigma, "bottom_up")
+    C = hierarchy.constraint_matrix(nodes)
+    np.testing.assert_allclose(C @ coherent, 0.0, atol=1e-8)
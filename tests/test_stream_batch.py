@@ -0,0 +1,93 @@
+"""fold() / apply() against an in-memory fakeredis server."""
+
+import socket
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # the rollup cube is written with EVAL
+
+from utils import aggregates, event_codec, load_generator, redis_client, training_buffer
+from utils.stream_batch import GROUP_NAME, STREAM_KEY, apply, ensure_group, fold
+
+
+@pytest.fixture
+def redis():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    client = redis_client.connect("tcp", load_generator.start_fake_server(port))
+    ensure_group(client)
+    yield client
+    client.close()
+
+
+def read_batch(redis, count=100):
+    response = redis.execute(["XREADGROUP", "GROUP", GROUP_NAME, "test", "COUNT", str(count),
+                              "STREAMS", STREAM_KEY, ">"])
+    return response[0][1] if response else []
+
+
+def pending(redis):
+    return redis.execute(["XPENDING", STREAM_KEY, GROUP_NAME, "-", "+", "100"])
+
+
+def add_events(redis, events, fmt, replay=False):
+    for fields in event_codec.xadd_fields(events, day=events['date'], replay=replay, fmt=fmt):
+        redis.xadd(STREAM_KEY, fields)
+
+
+def test_mixed_batch_merges_increments_and_acks_in_one_transaction(redis, monkeypatch):
+    today = datetime.now(timezone.utc).date()
+    text = {"store_nbr": np.array([1, 2, 1]), "family": np.array(["BEVERAGES", "DAIRY", "BEVERAGES"]),
+            "sales": np.array([10.5, 3.25, 4.0]), "onpromotion": np.array([0, 2, 1]), "date": np.datetime64(today)}
+    binary = {"store_nbr": np.array([3, 1]), "family": np.array(["BEVERAGES", "EGGS"]),
+              "sales": np.array([1.5, 7.0]), "onpromotion": np.array([0, 0]), "date": np.datetime64(today)}
+    add_events(redis, text, "text")
+    add_events(redis, binary, "binary")
+    # Replayed history is aggregated but not buffered for training
+    add_events(redis, {**binary, "sales": np.array([2.0, 1.0])}, "binary", replay=True)
+
+    batch = fold(read_batch(redis))
+    assert len(batch.ack_ids) == 7
+    assert (batch.processed, batch.skipped) == (7, 0)
+    assert len(batch.buffer) == 5
+
+    sent = []
+    send = type(redis)._send
+    monkeypatch.setattr(type(redis), "_send",
+                        lambda self, commands, transaction: sent.append((commands, transaction)) or send(
+                            self, commands, transaction))
+    assert apply(redis, batch) == 1
+    assert len(sent) == 1
+    commands, transaction = sent[0]
+    assert transaction is True
+    assert commands[-1][0] == "XACK" and commands[-1][3:] == batch.ack_ids
+
+    expected = {"BEVERAGES": 10.5 + 4.0 + 1.5 + 2.0, "DAIRY": 3.25, "EGGS": 7.0 + 1.0}
+    for period in aggregates.PERIODS:
+        assert aggregates.read_window(redis, period, today) == pytest.approx(expected)
+    assert pending(redis) == []
+    manifest = redis.hgetall(training_buffer.MANIFEST_KEY)
+    assert list(manifest.values()) == ["5"]
+    assert training_buffer.read(redis, list(manifest))['sales'].sum() == pytest.approx(10.5 + 3.25 + 4.0 + 1.5 + 7.0)
+
+
+def test_trimmed_entries_are_acknowledged(redis):
+    today = datetime.now(timezone.utc).date()
+    events = {"store_nbr": np.array([1, 2]), "family": np.array(["BEVERAGES", "DAIRY"]),
+              "sales": np.array([5.0, 6.0]), "onpromotion": np.array([0, 0]), "date": np.datetime64(today)}
+    add_events(redis, events, "binary")
+    messages = read_batch(redis)
+    assert len(pending(redis)) == 2
+    # The first entry was trimmed before it was processed: XAUTOCLAIM hands back its ID without fields
+    redis.execute(["XDEL", STREAM_KEY, messages[0][0]])
+    batch = fold([[messages[0][0], None], messages[1]])
+    assert batch.ack_ids == [messages[0][0], messages[1][0]]
+    assert (batch.processed, batch.skipped) == (1, 1)
+
+    apply(redis, batch)
+    assert pending(redis) == []
+    assert aggregates.read_window(redis, "daily", today) == pytest.approx({"DAIRY": 6.0})
@@ -1,235 +1,387 @@
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_absolute_error
 import mlflow
 import os
 import joblib
-import json
 from dotenv import load_dotenv
-from upstash_redis import Redis
 from prophet import Prophet
+from utils.calendar_dim import CALENDAR_FILE, CalendarDimension
+from utils import feature_cache, prophet_numpy, redis_client, training_buffer, warm_start
+from utils.forecast_cube import CUBE_FILE, ForecastCube
+from utils.parallel_fit import FitJob, run_jobs
+from utils.data_lake import list_partitions, load_table
+from utils.features import FEATURES, TARGET, build_feature_frame, fit_encoders
+from utils.profiling import StageProfiler
+from utils.xgb_streaming import (BOOSTER_PARAMS, EARLY_STOPPING_ROUNDS, NUM_BOOST_ROUND, streaming_enabled,
+                                 streaming_mae, train_mode, train_streaming)
 
-# 1. LOAD CONFIG
-load_dotenv()
-mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
-os.environ['MLFLOW_TRACKING_USERNAME'] = os.getenv("MLFLOW_TRACKING_USERNAME")
-os.environ['MLFLOW_TRACKING_PASSWORD'] = os.getenv("MLFLOW_TRACKING_PASSWORD")
-
-TRAINING_BUFFER_KEY = "training_data_buffer"
-redis = Redis(url=os.getenv("UPSTASH_REDIS_REST_URL"), token=os.getenv("UPSTASH_REDIS_REST_TOKEN"))
-
-print("📂 Loading Data...")
-try:
-    df_history = pd.read_csv("data/train.csv", encoding='latin1', low_memory=False)
-    df_oil = pd.read_csv("data/oil.csv")
-    df_stores = pd.read_csv("data/stores.csv")
-    df_holidays = pd.read_csv("data/holidays_events.csv")
-    df_transactions = pd.read_csv("data/transactions.csv")
-    print(f"  ✅ Loaded history: {len(df_history):,} rows")
-except Exception as e:
-    print(f"❌ Error loading CSVs: {e}")
-    exit()
-
-# Redis Buffer Logic
-df_fresh = pd.DataFrame()
-try:
-    new_data_raw = redis.lrange(TRAINING_BUFFER_KEY, 0, -1)
-    if len(new_data_raw) > 0:
-        print(f"  ✅ Found {len(new_data_raw)} fresh records!")
-        redis.delete(TRAINING_BUFFER_KEY)
-        new_data_json = [json.loads(row) for row in new_data_raw]
-        df_fresh = pd.DataFrame(new_data_json)
-        df_fresh['date'] = pd.to_datetime(df_fresh['date'])
-        df_fresh['store_nbr'] = df_fresh['store_nbr'].astype(int)
-        df_fresh['sales'] = df_fresh['sales'].astype(float)
-        df_fresh['onpromotion'] = df_fresh['onpromotion'].astype(int)
-except:
-    pass
-
-df_train = pd.concat([df_history, df_fresh], ignore_index=True)
-
-# Feature Engineering
-print("⚙️ Engineering Features...")
-df_train['date'] = pd.to_datetime(df_train['date'])
-df_oil['date'] = pd.to_datetime(df_oil['date'])
-df_holidays['date'] = pd.to_datetime(df_holidays['date'])
-df_transactions['date'] = pd.to_datetime(df_transactions['date'])
-
-df_oil = df_oil.set_index('date').resample('D').ffill().reset_index()
-df = pd.merge(df_train, df_oil, on='date', how='left')
-df['dcoilwtico'] = df['dcoilwtico'].ffill().bfill()
-
-df = pd.merge(df, df_stores, on='store_nbr', how='left')
-df_holidays = df_holidays[df_holidays['transferred'] == False]
-df_holidays['is_holiday'] = 1
-df = pd.merge(df, df_holidays[['date', 'is_holiday']], on='date', how='left')
-df['is_holiday'] = df['is_holiday'].fillna(0)
-df = pd.merge(df, df_transactions, on=['date', 'store_nbr'], how='left')
-df['transactions'] = df['transactions'].fillna(0)
-
-df['day_of_week'] = df['date'].dt.dayofweek
-df['month'] = df['date'].dt.month
-df['year'] = df['date'].dt.year
-df['day_of_month'] = df['date'].dt.day
-
-encoders = {}
-for col in ['family', 'city', 'state', 'type']:
-    le = LabelEncoder()
-    df[f'{col}_encoded'] = le.fit_transform(df[col].astype(str))
-    encoders[col] = le
-
-# Save Encoders
-joblib.dump(encoders['family'], 'family_encoder.joblib')
-joblib.dump(encoders['city'], 'city_encoder.joblib')
-joblib.dump(encoders['state'], 'state_encoder.joblib')
-joblib.dump(encoders['type'], 'type_encoder.joblib')
-
-# Global Split Date
-val_date = '2017-08-01'
-
-mlflow.set_experiment("Retail_Prediction_Combined_v3")
-
-# --- START PARENT RUN ---
-print("🚀 Starting MLflow Run...")
-with mlflow.start_run(run_name="Nightly_Pipeline_Run") as parent_run:
-    
-    mlflow.log_param("total_rows", len(df))
-    
-    # Log Encoders to Parent Run
-    mlflow.log_artifact("family_encoder.joblib")
-    mlflow.log_artifact("city_encoder.joblib")
-    mlflow.log_artifact("state_encoder.joblib")
-    mlflow.log_artifact("type_encoder.joblib")
-
-    # ==========================
-    # CHILD RUN 1: XGBoost
-    # ==========================
-    with mlflow.start_run(run_name="XGBoost_Training", nested=True):
-        FEATURES = ['store_nbr', 'family_encoded', 'onpromotion', 'transactions', 
-                    'dcoilwtico', 'is_holiday', 'city_encoded', 'state_encoded', 
-                    'type_encoded', 'day_of_week', 'month', 'year', 'day_of_month']
-        TARGET = 'sales'
-        
-        # Split for XGBoost
-        train_data = df[df['date'] < val_date]
-        test_data = df[df['date'] >= val_date]
-        
-        model = xgb.XGBRegressor(n_estimators=1000, learning_rate=0.05, max_depth=10, 
-                                 early_stopping_rounds=50, n_jobs=-1, random_state=42)
-        
-        model.fit(train_data[FEATURES], train_data[TARGET], 
-                  eval_set=[(test_data[FEATURES], test_data[TARGET])], verbose=False)
-        
-        preds = model.predict(test_data[FEATURES])
-        preds[preds < 0] = 0
-        mae = mean_absolute_error(test_data[TARGET], preds)
-        
-        print(f"  ✅ XGBoost MAE: {mae:.4f}")
-        mlflow.log_metric("mae", mae)
-        
-        # Robust model save (replaces single model.save_model call)
+
+def fit_xgboost(df, months, cores, split, num_boost_round=NUM_BOOST_ROUND, xgb_model=None, start_date=None):
+    """
+    Train before the early-stopping days of `split`, score on its holdout; returns (model, holdout MAE, row counts).
+
+    `df` is None in the streaming modes, where batches come from the cached `months` instead.
+    """
+    _, stop_start, holdout_start = split
+    if df is None:
+        # Batches stream from the memory-mapped month cache; only quantile bins are resident
+        model, info = train_streaming(months, stop_start, num_boost_round=num_boost_round, xgb_model=xgb_model,
+                                      start_date=start_date, nthread=cores, end_date=holdout_start)
+        return model, streaming_mae(model, months, holdout_start), info
+
+    train_mask = df['date'] < stop_start
+    if start_date:
+        train_mask &= df['date'] >= start_date
+    train_data = df[train_mask]
+    # Early stopping and scoring use different days, so the MAE is not tuned on its own rows
+    stop_data = df[(df['date'] >= stop_start) & (df['date'] < holdout_start)]
+    holdout_data = df[df['date'] >= holdout_start]
+
+    model = xgb.XGBRegressor(n_estimators=num_boost_round, learning_rate=BOOSTER_PARAMS['eta'],
+                             max_depth=BOOSTER_PARAMS['max_depth'], early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                             n_jobs=cores, random_state=BOOSTER_PARAMS['seed'])
+    model.fit(train_data[FEATURES], train_data[TARGET],
+              eval_set=[(stop_data[FEATURES], stop_data[TARGET])], verbose=False, xgb_model=xgb_model)
+
+    preds = model.predict(holdout_data[FEATURES])
+    preds[preds < 0] = 0
+    return model, mean_absolute_error(holdout_data[TARGET], preds), {
+        "train_rows": len(train_data), "val_rows": len(stop_data), "holdout_rows": len(holdout_data)}
+
+
+def boosted_rounds(model) -> int:
+    """Trees the model predicts with: up to the early-stopping best iteration, else all of them."""
+    best = getattr(model, "best_iteration", None)
+    if best is not None:
+        return best + 1
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    return booster.num_boosted_rounds()
+
+
+def baseline_mae(df, months, holdout_start, booster, rounds):
+    """MAE of the last full retrain on this run's holdout: the first `rounds` trees of the previous model."""
+    rounds = min(rounds, booster.num_boosted_rounds())
+    if df is None:
+        return streaming_mae(booster, months, holdout_start, iteration_range=(0, rounds))
+    holdout_data = df[df['date'] >= holdout_start]
+    preds = booster.predict(xgb.DMatrix(holdout_data[FEATURES]), iteration_range=(0, rounds))
+    preds[preds < 0] = 0
+    return mean_absolute_error(holdout_data[TARGET], preds)
+
+
+def xgboost_job(df, months, encoders, split, cores):
+    """XGBoost_Training child run: warm-start or full fit, scored on the rolling holdout."""
+    profiler = StageProfiler()
+    mlflow.log_param("train_mode", train_mode() if df is None else "in_memory")
+    # Continue the committed model on recent rows unless a full retrain is due
+    state = warm_start.load_state()
+    fit_mode, fit_reason = warm_start.plan(state, encoders)
+    model = None
+    if fit_mode == "incremental":
+        start_date = split[0]
+        print(f"  🔁 Warm-starting {warm_start.MODEL_FILE} on rows {start_date} → {split[1]} ({fit_reason})")
+        with profiler.stage("xgboost.incremental"):
+            # Boost on the trees the committed model predicts with, not the rejected tail past best_iteration
+            previous = warm_start.previous_model()
+            reference = baseline_mae(df, months, split[2], previous, state["baseline_rounds"])
+            model, mae, fit_info = fit_xgboost(df, months, cores, split, warm_start.incremental_rounds(),
+                                               previous, start_date)
+        mlflow.log_metric("baseline_holdout_mae", reference)
+        if warm_start.degraded(mae, reference):
+            fit_reason = f"incremental MAE {mae:.4f} degraded past baseline {reference:.4f} on the same holdout"
+            print(f"  ⚠️ {fit_reason}; falling back to a full retrain")
+            fit_mode, model = "full", None
+    if model is None:
+        with profiler.stage("xgboost.full"):
+            model, mae, fit_info = fit_xgboost(df, months, cores, split)
+
+    mlflow.log_params({"fit_mode": fit_mode, "fit_reason": fit_reason, "early_stopping_start": split[1],
+                       "holdout_start": split[2], **fit_info})
+    # Wall-clock of each path that ran (xgboost_incremental_seconds / xgboost_full_seconds)
+    mlflow.log_metrics(profiler.as_metrics())
+
+    print(f"  ✅ XGBoost MAE: {mae:.4f}")
+    mlflow.log_metric("mae", mae)
+    return {"model": model, "mae": mae,
+            "state": warm_start.next_state(state, fit_mode, mae, encoders, boosted_rounds(model))}
+
+
+def new_prophet():
+    """Prophet with the oil price and holiday flag as extra regressors."""
+    m = Prophet()
+    m.add_regressor('dcoilwtico')
+    m.add_regressor('is_holiday')
+    return m
+
+
+def prophet_eval_job(df_prophet, holdout_start):
+    """Prophet_Training child run: fit before the holdout, score on it (the same days as XGBoost)."""
+    # Split for Prophet
+    p_train = df_prophet[df_prophet['ds'] < holdout_start]
+    p_test = df_prophet[df_prophet['ds'] >= holdout_start]
+
+    profiler = StageProfiler()
+    m = new_prophet()
+    with profiler.stage("prophet.fit"):
+        m.fit(p_train)
+
+    # Evaluate on Test Set
+    future_test = p_test[['ds', 'dcoilwtico', 'is_holiday']]
+    forecast_test = m.predict(future_test)
+    mae_p = mean_absolute_error(p_test['y'].values, forecast_test['yhat'].values)
+
+    print(f"  ✅ Prophet MAE: {mae_p:.4f}")
+    mlflow.log_metric("mae", mae_p)
+    mlflow.log_metrics(profiler.as_metrics())
+    return {"mae": mae_p}
+
+
+def prophet_final_job(df_prophet):
+    """Prophet_Final_Fit child run: refit on all data for the live dashboard forecast."""
+    profiler = StageProfiler()
+    m_final = new_prophet()
+    with profiler.stage("prophet.fit"):
+        m_final.fit(df_prophet)  # Fit on ALL data
+    mlflow.log_metrics(profiler.as_metrics())
+    return {"model": m_final}
+
+
+def save_xgboost(model):
+    """Write best_model_v2.json, trying the sklearn wrapper first and the raw Booster after."""
+    # Robust model save (replaces single model.save_model call)
+    try:
+        # Print package versions for debugging
         try:
-            # Print package versions for debugging
-            try:
-                from importlib.metadata import version
-                print("xgboost version:", version("xgboost"))
-                print("scikit-learn version:", version("scikit-learn"))
-            except Exception:
-                pass
+            from importlib.metadata import version
+            print("xgboost version:", version("xgboost"))
+            print("scikit-learn version:", version("scikit-learn"))
+        except Exception:
+            pass
 
-            print("Model object type:", type(model))
-            print("_estimator_type:", getattr(model, "_estimator_type", None))
+        print("Model object type:", type(model))
+        print("_estimator_type:", getattr(model, "_estimator_type", None))
 
-            # If model is wrapped in a Pipeline, try to extract final estimator
+        # If model is wrapped in a Pipeline, try to extract final estimator
+        estimator = model
+        try:
+            if hasattr(model, "named_steps"):
+                estimator = list(model.named_steps.values())[-1]
+            elif hasattr(model, "steps"):
+                estimator = model.steps[-1][1]
+        except Exception:
             estimator = model
+
+        saved = False
+        # Try sklearn wrapper save first
+        try:
+            estimator.save_model("best_model_v2.json")
+            saved = True
+            print("Saved model using estimator.save_model")
+        except Exception as e:
+            print("estimator.save_model failed:", e)
+            # Fallback: try underlying Booster
             try:
-                if hasattr(model, "named_steps"):
-                    estimator = list(model.named_steps.values())[-1]
-                elif hasattr(model, "steps"):
-                    estimator = model.steps[-1][1]
-            except Exception:
-                estimator = model
-
-            saved = False
-            # Try sklearn wrapper save first
-            try:
-                estimator.save_model("best_model_v2.json")
+                booster = getattr(estimator, "get_booster", lambda: estimator)()
+                booster.save_model("best_model_v2.json")
                 saved = True
-                print("Saved model using estimator.save_model")
-            except Exception as e:
-                print("estimator.save_model failed:", e)
-                # Fallback: try underlying Booster
+                print("Saved model using booster.save_model")
+            except Exception as e2:
+                print("booster.save_model failed:", e2)
+                # Last resort: temporarily set _estimator_type then retry (hack)
                 try:
-                    booster = getattr(estimator, "get_booster", lambda: estimator)()
-                    booster.save_model("best_model_v2.json")
+                    setattr(estimator, "_estimator_type", "regressor")
+                    estimator.save_model("best_model_v2.json")
                     saved = True
-                    print("Saved model using booster.save_model")
-                except Exception as e2:
-                    print("booster.save_model failed:", e2)
-                    # Last resort: temporarily set _estimator_type then retry (hack)
-                    try:
-                        setattr(estimator, "_estimator_type", "regressor")
-                        estimator.save_model("best_model_v2.json")
-                        saved = True
-                        print("Saved model after setting _estimator_type")
-                    except Exception as e3:
-                        print("All attempts to save model failed:", e3)
-                        raise
-
-            if saved and os.path.exists("best_model_v2.json"):
-                mlflow.log_artifact("best_model_v2.json")
+                    print("Saved model after setting _estimator_type")
+                except Exception as e3:
+                    print("All attempts to save model failed:", e3)
+                    raise
+
+        if saved and os.path.exists("best_model_v2.json"):
+            mlflow.log_artifact("best_model_v2.json")
+        else:
+            print("Model file not found; skipping mlflow.log_artifact for best_model_v2.json")
+        return saved
+    except Exception as exc:
+        print("Error while saving/logging model artifact:", exc)
+        raise
+
+
+def main():
+    # 1. LOAD CONFIG (here, not at import: spawned fit workers re-import this module)
+    load_dotenv()
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+    os.environ['MLFLOW_TRACKING_USERNAME'] = os.getenv("MLFLOW_TRACKING_USERNAME")
+    os.environ['MLFLOW_TRACKING_PASSWORD'] = os.getenv("MLFLOW_TRACKING_PASSWORD")
+
+    redis = redis_client.connect()
+    # Month-partitioned feature cache (requires the columnar lake; FEATURE_CACHE=0 disables)
+    use_feature_cache = feature_cache.enabled()
+    # Out-of-core XGBoost (XGB_TRAIN_MODE=quantile|external) streams cached months instead of a full frame
+    streaming = streaming_enabled()
+
+    profiler = StageProfiler()
+
+    print("📂 Loading Data...")
+    try:
+        with profiler.stage("load"):
+            df_oil = load_table("oil")
+            df_stores = load_table("stores")
+            df_holidays = load_table("holidays_events")
+            df_transactions = load_table("transactions")
+            if use_feature_cache:
+                # Sales rows are only read for months whose cached features are stale
+                history_families = load_table("train", columns=['family'])['family'].unique()
             else:
-                print("Model file not found; skipping mlflow.log_artifact for best_model_v2.json")
-        except Exception as exc:
-            print("Error while saving/logging model artifact:", exc)
-            raise
-        
-    # ==========================
-    # CHILD RUN 2: Prophet (FIXED METRICS)
-    # ==========================
-    with mlflow.start_run(run_name="Prophet_Training", nested=True):
-        # 1. Prepare Aggregated Data (Daily Total Sales)
-        # We aggregate by date to get the total company trend
+                df_history = load_table("train", columns=feature_cache.SALES_COLUMNS)
+                history_families = df_history['family'].unique()
+        if use_feature_cache:
+            print(f"  ✅ Found history: {len(list_partitions('train'))} monthly partitions")
+        else:
+            print(f"  ✅ Loaded history: {len(df_history):,} rows")
+    except Exception as e:
+        print(f"❌ Error loading CSVs: {e}")
+        exit()
+
+    # Redis Buffer Logic: snapshot the chunk manifest (RENAME); chunks are deleted only after a successful run
+    df_fresh = pd.DataFrame()
+    buffer_chunks = []
+    try:
+        with profiler.stage("load.buffer"):
+            snapshot = training_buffer.snapshot(redis)
+            if snapshot:
+                df_fresh = training_buffer.read(redis, list(snapshot))
+                buffer_chunks = list(snapshot)
+        if buffer_chunks:
+            print(f"  ✅ Found {len(df_fresh)} fresh records in {len(buffer_chunks)} buffer chunks!")
+    except Exception as e:
+        print(f"  ⚠️ Training buffer not read ({e}); it is kept for the next run")
+
+    # Feature Engineering (categorical codes + narrow dtypes, dimension joins as array gathers)
+    print("⚙️ Engineering Features...")
+    with profiler.stage("encode"):
+        families = pd.Index(pd.Series(history_families).astype(str).unique())
+        if len(df_fresh) > 0:
+            families = families.union(df_fresh['family'].unique())
+        encoders = fit_encoders(families, df_stores)
+        # One row per (date, store): holiday events resolved against each store's city/state
+        calendar = CalendarDimension.build(df_holidays, df_stores)
+        calendar.save(CALENDAR_FILE)
+
+    if use_feature_cache:
+        with profiler.stage("featurize.cache"):
+            months = feature_cache.refresh(df_fresh, df_oil, df_stores, df_transactions, calendar, encoders)
+            df = None if streaming else feature_cache.load_frame(months)
+    else:
+        months = None
+        with profiler.stage("merge"):
+            if len(df_fresh) > 0:
+                # Share one category table so the concat keeps 'family' categorical
+                df_history['family'] = df_history['family'].astype('category').cat.set_categories(families)
+                df_fresh['family'] = pd.Categorical(df_fresh['family'], categories=families)
+                df_train = pd.concat([df_history, df_fresh], ignore_index=True)
+            else:
+                df_train = df_history
+        del df_history
+        df = build_feature_frame(df_train, df_oil, df_stores, df_transactions, calendar,
+                                 encoders, profiler=profiler)
+        del df_train
+    del df_fresh
+    if streaming:
+        total_rows = sum(feature_cache.month_rows(m) for m in months)
+        print(f"  ✅ Feature matrix: {total_rows:,} rows across {len(months)} cached months (streamed, {train_mode()} mode)")
+    else:
+        total_rows = len(df)
+        print(f"  ✅ Feature matrix: {total_rows:,} rows, {df.memory_usage(deep=True).sum() / 1024**2:,.0f} MB")
+
+    # Save Encoders
+    joblib.dump(encoders['family'], 'family_encoder.joblib')
+    joblib.dump(encoders['city'], 'city_encoder.joblib')
+    joblib.dump(encoders['state'], 'state_encoder.joblib')
+    joblib.dump(encoders['type'], 'type_encoder.joblib')
+
+    # Aggregated daily data (total company trend) for Prophet
+    if streaming:
+        df_prophet = feature_cache.daily_totals(months)
+    else:
         df_prophet = df.groupby('date').agg({
             'sales': 'sum',
             'dcoilwtico': 'mean',
             'is_holiday': 'max'
         }).reset_index()
-        df_prophet = df_prophet.rename(columns={'date': 'ds', 'sales': 'y'})
-        
-        # 2. Split for Prophet
-        p_train = df_prophet[df_prophet['ds'] < val_date]
-        p_test = df_prophet[df_prophet['ds'] >= val_date]
-        
-        m = Prophet()
-        m.add_regressor('dcoilwtico')
-        m.add_regressor('is_holiday')
-        
-        # 3. Fit on Training Set
-        m.fit(p_train)
-        
-        # 4. Evaluate on Test Set
-        future_test = p_test[['ds', 'dcoilwtico', 'is_holiday']]
-        forecast_test = m.predict(future_test)
-        
-        # Calculate Metrics
-        preds_p = forecast_test['yhat'].values
-        actuals_p = p_test['y'].values
-        mae_p = mean_absolute_error(actuals_p, preds_p)
-        
-        print(f"  ✅ Prophet MAE: {mae_p:.4f}")
-        mlflow.log_metric("mae", mae_p)
-        
-        # 5. Refit on Full Data (Optional, but good for the dashboard forecast)
-        # For the live dashboard, we want the model to know about the latest data too.
-        m_final = Prophet()
-        m_final.add_regressor('dcoilwtico')
-        m_final.add_regressor('is_holiday')
-        m_final.fit(df_prophet) # Fit on ALL data
-        
-        joblib.dump(m_final, "long_term_forecast.pkl")
-        mlflow.log_artifact("long_term_forecast.pkl")
-
-print("✨ Pipeline Complete. Check Dagshub for nested runs.")
+    df_prophet = df_prophet.rename(columns={'date': 'ds', 'sales': 'y'})
+
+    # Splits roll forward with the newest row (buffer rows included)
+    split = warm_start.rolling_split(df_prophet['ds'])
+    print(f"  📅 Early stopping from {split[1]}, holdout from {split[2]}")
+
+    experiment = mlflow.set_experiment("Retail_Prediction_Combined_v3")
+
+    # --- START PARENT RUN ---
+    print("🚀 Starting MLflow Run...")
+    with mlflow.start_run(run_name="Nightly_Pipeline_Run") as parent_run:
+
+        mlflow.log_param("total_rows", total_rows)
+        mlflow.log_metrics(profiler.as_metrics())
+
+        # Log Encoders to Parent Run
+        mlflow.log_artifact("family_encoder.joblib")
+        mlflow.log_artifact("city_encoder.joblib")
+        mlflow.log_artifact("state_encoder.joblib")
+        mlflow.log_artifact("type_encoder.joblib")
+        mlflow.log_artifact(CALENDAR_FILE)
+
+        # The three fits are independent: each runs in its own child run. XGBoost stays in this
+        # process (no pickled copy of the feature frame) while the Prophet fits run in workers
+        # (Prophet's Stan fits are single-threaded; XGBoost takes the rest)
+        jobs = [
+            FitJob("XGBoost_Training", xgboost_job, {"df": df, "months": months, "encoders": encoders, "split": split},
+                   local=True),
+            FitJob("Prophet_Training", prophet_eval_job, {"df_prophet": df_prophet, "holdout_start": split[2]}, cores=1),
+            FitJob("Prophet_Final_Fit", prophet_final_job, {"df_prophet": df_prophet}, cores=1),
+        ]
+        with profiler.stage("fit"):
+            results = run_jobs(jobs, parent_run.info.run_id, experiment.experiment_id)
+        mlflow.log_metric("fit_wall_seconds", round(profiler.stages[-1]["seconds"], 3))
+        mlflow.log_metric("fit_sequential_seconds", round(sum(r["seconds"] for r in results.values()), 3))
+
+        # Artifacts are written only after every fit has finished
+        xgb_result = results["XGBoost_Training"]
+        with mlflow.start_run(run_id=xgb_result["run_id"], nested=True):
+            with profiler.stage("save.xgboost"):
+                saved = save_xgboost(xgb_result["model"])
+            if saved:
+                warm_start.save_state(xgb_result["state"])
+                mlflow.log_artifact(warm_start.METRICS_FILE)
+
+                # Score the store × family × day × promo grid from the saved file, exactly as the dashboard loads it
+                with profiler.stage("forecast_cube"):
+                    served = xgb.XGBRegressor()
+                    served.load_model("best_model_v2.json")
+                    cube = ForecastCube.build(served, df_stores, encoders, calendar)
+                    cube.save(CUBE_FILE)
+                print(f"  🧊 Forecast cube: {cube.values.size:,} predictions, {cube.start} → {cube.end}")
+                mlflow.log_metric("forecast_cube_seconds", round(profiler.stages[-1]["seconds"], 3))
+                mlflow.log_artifact(CUBE_FILE)
+
+        with mlflow.start_run(run_id=results["Prophet_Final_Fit"]["run_id"], nested=True), profiler.stage("save.prophet"):
+            joblib.dump(results["Prophet_Final_Fit"]["model"], "long_term_forecast.pkl")
+            mlflow.log_artifact("long_term_forecast.pkl")
+            # Compact parameters for the dashboard's NumPy evaluator (no Prophet import at serve time)
+            prophet_numpy.export(results["Prophet_Final_Fit"]["model"], prophet_numpy.PARAMS_FILE)
+            mlflow.log_artifact(prophet_numpy.PARAMS_FILE)
+
+        # Every stage of the run (encode / merge / featurize / fit / save), for run-to-run comparison
+        mlflow.log_metrics(profiler.as_metrics())
+
+    if buffer_chunks:
+        training_buffer.release(redis, buffer_chunks)
+        print(f"  🧹 Released {len(buffer_chunks)} training buffer chunks")
+
+    print("✨ Pipeline Complete. Check Dagshub for nested runs.")
+
+
+if __name__ == "__main__":
+    main()
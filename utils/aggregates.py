@@ -0,0 +1,89 @@
+"""
+Sales Aggregate Layout
+One Redis hash per period instead of one string key per family per period:
+
+    feature:sales_daily:{YYYY-MM-DD}    field = family
+    (same for sales_weekly:{YYYY-Www} and sales_monthly:{YYYY-MM})
+
+Store / promo breakdowns live in the rollup cube (utils/rollup_cube.py),
+which uses the same periods and retention.
+
+Every event is added to its daily, weekly and monthly hashes at ingest, so the
+monthly hash already holds the roll-up of its days. Each hash expires a fixed
+retention after its period ends (EXPIREAT, so late events never push it out),
+which keeps the key count bounded: at most ~retention / period live hashes
+per layout.
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+PERIODS = ("daily", "weekly", "monthly")
+
+# Days a hash is kept after its period ends
+RETENTION_DAYS = {
+    "daily": int(os.getenv("AGG_DAILY_RETENTION_DAYS", "35")),
+    "weekly": int(os.getenv("AGG_WEEKLY_RETENTION_DAYS", "182")),
+    "monthly": int(os.getenv("AGG_MONTHLY_RETENTION_DAYS", "730")),
+}
+
+
+def period_id(period: str, day: date) -> str:
+    """Period label used in the key (same formats as the old string keys)."""
+    if period == "daily":
+        return day.strftime('%Y-%m-%d')
+    if period == "weekly":
+        return day.strftime('%Y-W%U')
+    if period == "monthly":
+        return day.strftime('%Y-%m')
+    raise ValueError(f"unknown period {period!r}")
+
+
+def parse_period_id(period: str, pid: str) -> date:
+    """First day of the period a label refers to (inverse of period_id)."""
+    if period == "daily":
+        return datetime.strptime(pid, '%Y-%m-%d').date()
+    if period == "weekly":
+        # %U needs a weekday to resolve; 0 = the Sunday that starts the week
+        return datetime.strptime(f"{pid}-0", '%Y-W%U-%w').date()
+    if period == "monthly":
+        return datetime.strptime(pid, '%Y-%m').date()
+    raise ValueError(f"unknown period {period!r}")
+
+
+def period_end(period: str, day: date) -> date:
+    """Last day of the period containing `day` (weeks run Sunday..Saturday, like %U)."""
+    if period == "daily":
+        return day
+    if period == "weekly":
+        return day + timedelta(days=(5 - day.weekday()) % 7)
+    if period == "monthly":
+        next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return next_month - timedelta(days=1)
+    raise ValueError(f"unknown period {period!r}")
+
+
+def hash_key(period: str, pid: str) -> str:
+    """Hash holding one period's family totals."""
+    return f"feature:sales_{period}:{pid}"
+
+
+def expire_at(period: str, day: date) -> int:
+    """Unix time the period's hashes expire: end of period plus its retention."""
+    end = period_end(period, day) + timedelta(days=1 + RETENTION_DAYS[period])
+    return int(datetime(end.year, end.month, end.day, tzinfo=timezone.utc).timestamp())
+
+
+def targets(family: str, day: date) -> List[Tuple[str, str, int]]:
+    """Every (hash key, field, expire-at) an event contributes to."""
+    return [(hash_key(period, period_id(period, day)), family, expire_at(period, day)) for period in PERIODS]
+
+
+def read_window(redis, period: str, day: date) -> Dict[str, float]:
+    """All family totals for one period in a single HGETALL."""
+    raw = redis.hgetall(hash_key(period, period_id(period, day))) or {}
+    if isinstance(raw, list):
+        # Raw RESP reply (TCP client): [field, value, field, value, ...]
+        raw = dict(zip(raw[0::2], raw[1::2]))
+    return {field: float(value) for field, value in raw.items()}
@@ -0,0 +1,136 @@
+"""
+Calendar Dimension
+Precomputed holiday table keyed by date, resolved against every store's city and state.
+
+holidays_events.csv can list several events on the same date, so joining it on
+date multiplies sales rows. This table holds exactly one entry per
+(date, store) as a bitmask of NATIONAL / REGIONAL / LOCAL flags, and lookups
+are a date-ordinal index into a dense array.
+"""
+
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_FILE = "calendar_dim.npz"
+
+NATIONAL = 1
+REGIONAL = 2
+LOCAL = 4
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+class CalendarDimension:
+    """Dense [day, store_nbr] holiday bitmask with O(1) date-ordinal lookups."""
+
+    def __init__(self, start: np.datetime64, flags: np.ndarray):
+        """
+        Args:
+            start: First date covered (row 0 of `flags`)
+            flags: uint8 array of shape (n_days, max_store_nbr + 1)
+        """
+        self.start = np.datetime64(start, 'D')
+        self.flags = flags
+
+    @classmethod
+    def build(cls, df_holidays: pd.DataFrame, df_stores: pd.DataFrame) -> "CalendarDimension":
+        """
+        Resolve holiday events against store locations.
+
+        Args:
+            df_holidays: holidays_events table (date, locale, locale_name, transferred)
+            df_stores: stores table (store_nbr, city, state)
+
+        Returns:
+            CalendarDimension spanning the first to last event date
+        """
+        events = df_holidays[df_holidays['transferred'] == False]
+        event_days = pd.to_datetime(events['date']).values.astype('datetime64[D]')
+        start, end = event_days.min(), event_days.max()
+        n_days = int((end - start) // ONE_DAY) + 1
+        n_stores = int(df_stores['store_nbr'].max()) + 1
+
+        flags = np.zeros((n_days, n_stores), dtype=np.uint8)
+        day = ((event_days - start) // ONE_DAY).astype(np.intp)
+        locale = events['locale'].astype(str).to_numpy(dtype=object)
+        locale_name = events['locale_name'].astype(str).to_numpy(dtype=object)
+        store_nbr = df_stores['store_nbr'].values.astype(np.intp)
+        store_city = df_stores['city'].astype(str).to_numpy(dtype=object)
+        store_state = df_stores['state'].astype(str).to_numpy(dtype=object)
+
+        national = locale == 'National'
+        flags[day[national], 1:] |= NATIONAL
+
+        # Regional/local events apply to the stores whose state/city matches locale_name
+        for mask, store_attr, bit in [(locale == 'Regional', store_state, REGIONAL),
+                                      (locale == 'Local', store_city, LOCAL)]:
+            match = locale_name[mask][:, None] == store_attr[None, :]
+            ev_idx, st_idx = np.nonzero(match)
+            flags[day[mask][ev_idx], store_nbr[st_idx]] |= bit
+
+        return cls(start, flags)
+
+    def ordinals(self, dates) -> np.ndarray:
+        """Row index for each date (may fall outside the table)."""
+        days = pd.to_datetime(pd.Series(np.atleast_1d(dates))).values.astype('datetime64[D]')
+        return ((days - self.start) // ONE_DAY).astype(np.int64)
+
+    def lookup(self, dates, store_nbr) -> np.ndarray:
+        """
+        Holiday bitmask for each (date, store) pair; 0 outside the covered range.
+
+        Args:
+            dates: Date or array of dates
+            store_nbr: Store number or array broadcastable against `dates`
+
+        Returns:
+            uint8 array of NATIONAL | REGIONAL | LOCAL flags
+        """
+        return self.lookup_ordinal(self.ordinals(dates), store_nbr)
+
+    def lookup_ordinal(self, day: np.ndarray, store_nbr) -> np.ndarray:
+        """Same as lookup() but takes precomputed row indices (see ordinals())."""
+        day, store = np.broadcast_arrays(np.asarray(day, dtype=np.int64), np.asarray(store_nbr, dtype=np.int64))
+        valid = (day >= 0) & (day < self.flags.shape[0]) & (store >= 0) & (store < self.flags.shape[1])
+        out = np.zeros(day.shape, dtype=np.uint8)
+        out[valid] = self.flags[day[valid], store[valid]]
+        return out
+
+    def is_holiday(self, dates, store_nbr) -> np.ndarray:
+        """1 where any holiday applies to the store on that date (int8)."""
+        return (self.lookup(dates, store_nbr) > 0).astype(np.int8)
+
+    def any_store(self, dates) -> np.ndarray:
+        """1 where a holiday applies to at least one store (company-wide daily view)."""
+        day = self.ordinals(dates)
+        valid = (day >= 0) & (day < self.flags.shape[0])
+        out = np.zeros(day.shape, dtype=np.int8)
+        out[valid] = self.flags[day[valid]].any(axis=1)
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long table: one row per (date, store_nbr) with national/regional/local columns."""
+        n_days, n_stores = self.flags.shape
+        dates = self.start + np.arange(n_days) * ONE_DAY
+        frame = pd.DataFrame({
+            'date': np.repeat(dates, n_stores - 1).astype('datetime64[ns]'),
+            'store_nbr': np.tile(np.arange(1, n_stores), n_days),
+        })
+        values = self.flags[:, 1:].ravel()
+        frame['national'] = (values & NATIONAL > 0).astype(np.int8)
+        frame['regional'] = (values & REGIONAL > 0).astype(np.int8)
+        frame['local'] = (values & LOCAL > 0).astype(np.int8)
+        return frame
+
+    def save(self, path: Union[str, Path] = CALENDAR_FILE):
+        """Write the table as a compressed .npz artifact."""
+        np.savez_compressed(path, start=np.array(str(self.start)), flags=self.flags)
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = CALENDAR_FILE) -> "CalendarDimension":
+        """Load a table written by save()."""
+        with np.load(path) as data:
+            return cls(np.datetime64(str(data['start']), 'D'), data['flags'])
@@ -0,0 +1,319 @@
+"""
+Columnar Data Lake
+Converts the Kaggle CSVs into typed, month-partitioned Parquet datasets and
+loads them back with column projection and date-range predicate pushdown.
+"""
+
+import json
+import os
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
+LAKE_DIR = Path(os.getenv("DATA_LAKE_DIR", str(DATA_DIR / "lake")))
+MANIFEST_FILE = "_manifest.json"
+PARTITION_COLUMN = "month"
+
+DateLike = Union[str, date, datetime, pd.Timestamp]
+
+# Column types for every Kaggle file. Tables with a date column are partitioned by month.
+SCHEMAS: Dict[str, Dict[str, pa.DataType]] = {
+    "train": {
+        "id": pa.int32(),
+        "date": pa.date32(),
+        "store_nbr": pa.int8(),
+        "family": pa.string(),
+        "sales": pa.float64(),
+        "onpromotion": pa.int16(),
+    },
+    "test": {
+        "id": pa.int32(),
+        "date": pa.date32(),
+        "store_nbr": pa.int8(),
+        "family": pa.string(),
+        "onpromotion": pa.int16(),
+    },
+    "oil": {
+        "date": pa.date32(),
+        "dcoilwtico": pa.float64(),
+    },
+    "holidays_events": {
+        "date": pa.date32(),
+        "type": pa.string(),
+        "locale": pa.string(),
+        "locale_name": pa.string(),
+        "description": pa.string(),
+        "transferred": pa.bool_(),
+    },
+    "transactions": {
+        "date": pa.date32(),
+        "store_nbr": pa.int8(),
+        "transactions": pa.int32(),
+    },
+    "stores": {
+        "store_nbr": pa.int8(),
+        "city": pa.string(),
+        "state": pa.string(),
+        "type": pa.string(),
+        "cluster": pa.int8(),
+    },
+}
+
+# Low-cardinality string columns stored dictionary-encoded (loaded as pandas categoricals)
+DICTIONARY_COLUMNS = {"family", "type", "locale", "locale_name", "city", "state"}
+
+
+def _is_partitioned(name: str) -> bool:
+    return "date" in SCHEMAS[name]
+
+
+def _to_date(value: DateLike) -> date:
+    return pd.Timestamp(value).date()
+
+
+def csv_path(name: str) -> Path:
+    """Return the path of the raw Kaggle CSV for `name`."""
+    return DATA_DIR / f"{name}.csv"
+
+
+def _read_manifest() -> Dict:
+    path = LAKE_DIR / MANIFEST_FILE
+    if path.exists():
+        return json.loads(path.read_text())
+    return {}
+
+
+def _write_manifest(manifest: Dict):
+    LAKE_DIR.mkdir(parents=True, exist_ok=True)
+    (LAKE_DIR / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+
+
+def _source_signature(path: Path) -> Dict:
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def is_built(name: str) -> bool:
+    """Return True if the lake holds an ingested copy of `name`."""
+    return name in _read_manifest() and (LAKE_DIR / name).exists()
+
+
+def ingest_csv(name: str, force: bool = False) -> int:
+    """
+    Convert one Kaggle CSV into a typed Parquet dataset.
+
+    Args:
+        name: Dataset name (key of SCHEMAS, e.g. 'train')
+        force: Rebuild even if the source CSV has not changed
+
+    Returns:
+        Number of rows written (0 if the existing copy is up to date)
+    """
+    source = csv_path(name)
+    manifest = _read_manifest()
+    signature = _source_signature(source)
+
+    if not force and manifest.get(name, {}).get("source") == signature and (LAKE_DIR / name).exists():
+        return 0
+
+    schema = SCHEMAS[name]
+    table = pv.read_csv(
+        source,
+        read_options=pv.ReadOptions(encoding="latin1"),
+        convert_options=pv.ConvertOptions(column_types=schema, include_columns=list(schema)),
+    )
+    for column in DICTIONARY_COLUMNS.intersection(schema):
+        idx = table.schema.get_field_index(column)
+        table = table.set_column(idx, column, pc.dictionary_encode(table[column]))
+
+    target = LAKE_DIR / name
+    if _is_partitioned(name):
+        # Sorted rows give tight per-row-group date statistics for pushdown inside a partition
+        table = table.sort_by("date")
+        months = pc.strftime(table["date"].cast(pa.timestamp("s")), format="%Y-%m")
+        table = table.append_column(PARTITION_COLUMN, months)
+        ds.write_dataset(
+            table,
+            target,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive"),
+            existing_data_behavior="delete_matching",
+        )
+        # delete_matching only replaces months being written; drop months no longer in the source
+        written = set(pc.unique(table[PARTITION_COLUMN]).to_pylist())
+        for month in set(list_partitions(name)) - written:
+            shutil.rmtree(target / f"{PARTITION_COLUMN}={month}")
+    else:
+        ds.write_dataset(table, target, format="parquet", existing_data_behavior="delete_matching")
+
+    manifest[name] = {"source": signature, "rows": table.num_rows}
+    _write_manifest(manifest)
+    return table.num_rows
+
+
+def list_partitions(name: str) -> List[str]:
+    """Return the sorted month keys ('YYYY-MM') present for a partitioned dataset."""
+    prefix = f"{PARTITION_COLUMN}="
+    root = LAKE_DIR / name
+    if not root.exists():
+        return []
+    return sorted(p.name[len(prefix):] for p in root.iterdir() if p.is_dir() and p.name.startswith(prefix))
+
+
+def partition_files(name: str, month: str) -> List[Path]:
+    """Return the Parquet files backing one month partition."""
+    return sorted((LAKE_DIR / name / f"{PARTITION_COLUMN}={month}").glob("*.parquet"))
+
+
+def _date_filter(
+    start: Optional[DateLike], end: Optional[DateLike], partitioned: bool = True
+) -> Optional[ds.Expression]:
+    """Date-range filter; `partitioned` also prunes on the hive month key (absent from per-file datasets)."""
+    expr = None
+    if start is not None:
+        start_d = _to_date(start)
+        expr = ds.field("date") >= start_d
+        if partitioned:
+            expr = (ds.field(PARTITION_COLUMN) >= start_d.strftime("%Y-%m")) & expr
+    if end is not None:
+        end_d = _to_date(end)
+        end_expr = ds.field("date") <= end_d
+        if partitioned:
+            end_expr = (ds.field(PARTITION_COLUMN) <= end_d.strftime("%Y-%m")) & end_expr
+        expr = end_expr if expr is None else expr & end_expr
+    return expr
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    df = table.to_pandas(date_as_object=False)
+    if "date" in df.columns:
+        df["date"] = df["date"].astype("datetime64[ns]")
+    return df
+
+
+def _load_csv(name: str, columns: Optional[List[str]], start: Optional[DateLike], end: Optional[DateLike]) -> pd.DataFrame:
+    """Fallback path used when the lake has not been built yet."""
+    usecols = None
+    if columns is not None:
+        usecols = list(dict.fromkeys(columns + (["date"] if _is_partitioned(name) else [])))
+    df = pd.read_csv(csv_path(name), usecols=usecols, encoding="latin1", low_memory=False)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+        if start is not None:
+            df = df[df["date"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["date"] <= pd.Timestamp(end)]
+    if columns is not None:
+        df = df[columns]
+    return df.reset_index(drop=True)
+
+
+def load_table(
+    name: str,
+    columns: Optional[List[str]] = None,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+) -> pd.DataFrame:
+    """
+    Load a Kaggle table, reading only the requested columns and dates.
+
+    Args:
+        name: Dataset name (key of SCHEMAS, e.g. 'train')
+        columns: Columns to project (default: all)
+        start: Inclusive first date (partitioned tables only)
+        end: Inclusive last date (partitioned tables only)
+
+    Returns:
+        DataFrame with typed columns; dictionary columns come back as categoricals
+    """
+    if not is_built(name):
+        print(f"  ⚠️ '{name}' not in data lake, reading {csv_path(name)}")
+        return _load_csv(name, columns, start, end)
+
+    dataset = ds.dataset(LAKE_DIR / name, format="parquet", partitioning="hive" if _is_partitioned(name) else None)
+    projection = columns if columns is not None else list(SCHEMAS[name])
+    expr = _date_filter(start, end) if _is_partitioned(name) else None
+    return _to_pandas(dataset.to_table(columns=projection, filter=expr))
+
+
+def iter_partitions(
+    name: str,
+    columns: Optional[List[str]] = None,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    newest_first: bool = False,
+) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Yield (month, DataFrame) pairs one partition at a time.
+
+    Args:
+        name: Partitioned dataset name
+        columns: Columns to project (default: all)
+        start: Inclusive first date
+        end: Inclusive last date
+        newest_first: Walk partitions from the most recent month backwards
+    """
+    months = list_partitions(name)
+    if start is not None:
+        months = [m for m in months if m >= _to_date(start).strftime("%Y-%m")]
+    if end is not None:
+        months = [m for m in months if m <= _to_date(end).strftime("%Y-%m")]
+    if newest_first:
+        months = months[::-1]
+
+    projection = columns if columns is not None else list(SCHEMAS[name])
+    # Months are already pruned above; the per-file datasets carry no `month` field
+    expr = _date_filter(start, end, partitioned=False)
+    for month in months:
+        dataset = ds.dataset(partition_files(name, month), format="parquet")
+        yield month, _to_pandas(dataset.to_table(columns=projection, filter=expr))
+
+
+def latest_date(name: str) -> pd.Timestamp:
+    """Return the most recent date in a partitioned dataset, scanning one partition."""
+    months = list_partitions(name)
+    if not months:
+        return load_table(name, columns=["date"])["date"].max()
+    dataset = ds.dataset(partition_files(name, months[-1]), format="parquet")
+    return pd.Timestamp(pc.max(dataset.to_table(columns=["date"])["date"]).as_py())
+
+
+def load_recent(name: str, max_rows: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load the `max_rows` most recent rows, reading partitions newest-first until enough are found.
+
+    Args:
+        name: Partitioned dataset name
+        max_rows: Number of rows to return
+        columns: Columns to project (default: all)
+
+    Returns:
+        DataFrame sorted chronologically
+    """
+    if not is_built(name):
+        df = load_table(name, columns)
+        return df.sort_values("date", ascending=False).head(max_rows).sort_values("date").reset_index(drop=True)
+
+    if columns is not None and "date" not in columns:
+        columns = columns + ["date"]
+
+    frames, total = [], 0
+    for _, part in iter_partitions(name, columns, newest_first=True):
+        frames.append(part)
+        total += len(part)
+        if total >= max_rows:
+            break
+    if not frames:
+        return pd.DataFrame(columns=columns or list(SCHEMAS[name]))
+
+    df = pd.concat(frames[::-1], ignore_index=True)
+    return df.sort_values("date", ascending=False).head(max_rows).sort_values("date").reset_index(drop=True)
+
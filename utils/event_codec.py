@@ -0,0 +1,196 @@
+"""
+Stream Event Codec
+Binary encoding of sales events for the Redis stream.
+
+An event is one stream field, EVENT_FIELD, whose value is the base64 text of
+one fixed 24-byte record (base64 because the REST client only carries
+strings):
+
+    version u1 | flags u1 | store_nbr u2 | family u2 | batch_id u2 |
+    onpromotion i4 | date i4 (days since epoch) | sales f8
+
+Store and family are integer codes (family indexes FAMILIES, which is part
+of schema version 1), so an entry holds 1 field instead of 5-7 text pairs.
+24 bytes are exactly 32 base64 characters without padding, so a whole
+XREADGROUP batch decodes with one b64decode + np.frombuffer.
+
+Readers also accept the original text entries ([field, value, ...]), so
+the stream can hold both formats while producers are switched over.
+STREAM_EVENT_FORMAT=text keeps producers on the old format.
+"""
+
+import base64
+import binascii
+import os
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+EVENT_FIELD = "e"
+SCHEMA_VERSION = 1
+# Set on events replayed from train.csv (scripts/backfill.py), which must not be trained on twice
+REPLAY_FIELD = "replay"
+FLAG_REPLAY = 1
+# "binary" or "text"
+STREAM_FORMAT = os.getenv("STREAM_EVENT_FORMAT", "binary")
+
+RECORD_DTYPE = np.dtype([
+    ("version", "u1"),
+    ("flags", "u1"),
+    ("store_nbr", "<u2"),
+    ("family", "<u2"),
+    ("batch_id", "<u2"),
+    ("onpromotion", "<i4"),
+    ("date", "<i4"),
+    ("sales", "<f8"),
+])
+PAYLOAD_CHARS = RECORD_DTYPE.itemsize // 3 * 4
+
+# Schema v1 family codes (the Favorita product families); append only
+FAMILIES = (
+    "AUTOMOTIVE", "BABY CARE", "BEAUTY", "BEVERAGES", "BOOKS", "BREAD/BAKERY", "CELEBRATION",
+    "CLEANING", "DAIRY", "DELI", "EGGS", "FROZEN FOODS", "GROCERY I", "GROCERY II", "HARDWARE",
+    "HOME AND KITCHEN I", "HOME AND KITCHEN II", "HOME APPLIANCES", "HOME CARE", "LADIESWEAR",
+    "LAWN AND GARDEN", "LINGERIE", "LIQUOR,WINE,BEER", "MAGAZINES", "MEATS", "PERSONAL CARE",
+    "PET SUPPLIES", "PLAYERS AND ELECTRONICS", "POULTRY", "PREPARED FOODS", "PRODUCE",
+    "SCHOOL AND OFFICE SUPPLIES", "SEAFOOD",
+)
+_FAMILY_CODES = {family: code for code, family in enumerate(FAMILIES)}
+_FAMILY_NAMES = np.asarray(FAMILIES, dtype=object)
+# Day numbers datetime.date can represent (0001-01-01 .. 9999-12-31)
+_MIN_DAY = int(np.datetime64('0001-01-01', 'D').astype(np.int64))
+_MAX_DAY = int(np.datetime64('9999-12-31', 'D').astype(np.int64))
+
+# (family, date, store_nbr, onpromotion, sales, replay)
+Event = Tuple[str, date, int, int, float, bool]
+
+
+def _days(values) -> np.ndarray:
+    """YYYY-MM-DD strings / dates / datetime64 → days since epoch."""
+    return np.asarray(values, dtype='datetime64[D]').astype(np.int64)
+
+
+def family_codes(families) -> np.ndarray:
+    """Schema codes for family names (-1 for names outside FAMILIES)."""
+    return np.fromiter((_FAMILY_CODES.get(str(f), -1) for f in families), dtype=np.int64, count=len(families))
+
+
+def encode(events: Dict[str, np.ndarray], day=None, replay: bool = False, batch_id=None) -> np.ndarray:
+    """
+    Pack events into schema records.
+
+    Args:
+        events: store_nbr / family / sales / onpromotion arrays, plus 'date' unless `day` is given
+        day: One date for every event (YYYY-MM-DD, date or datetime64)
+        replay: Mark the events as replayed history
+        batch_id: Per-event producer batch index (0 when omitted)
+
+    Returns:
+        RECORD_DTYPE array; rows whose family or store does not fit the schema have version 0
+    """
+    n = len(events['family'])
+    codes = family_codes(events['family'])
+    store = np.asarray(events['store_nbr'], dtype=np.int64)
+    records = np.zeros(n, dtype=RECORD_DTYPE)
+    records['version'] = np.where((codes >= 0) & (store >= 0) & (store <= 0xFFFF), SCHEMA_VERSION, 0)
+    records['flags'] = FLAG_REPLAY if replay else 0
+    records['store_nbr'] = np.clip(store, 0, 0xFFFF)
+    records['family'] = np.maximum(codes, 0)
+    records['batch_id'] = 0 if batch_id is None else batch_id
+    records['onpromotion'] = events['onpromotion']
+    records['date'] = _days(events['date'] if day is None else day)
+    records['sales'] = events['sales']
+    return records
+
+
+def payloads(records: np.ndarray) -> List[str]:
+    """One base64 field value per record (a single b64encode for the whole batch)."""
+    text = base64.b64encode(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes()).decode()
+    return [text[i:i + PAYLOAD_CHARS] for i in range(0, len(text), PAYLOAD_CHARS)]
+
+
+def text_fields(events: Dict[str, np.ndarray], day=None, replay: bool = False, batch_id=None) -> List[List[str]]:
+    """The original [field, value, ...] entries (same arguments as encode())."""
+    n = len(events['family'])
+    dates = np.datetime_as_string(np.asarray(events['date'] if day is None else day, dtype='datetime64[D]'))
+    dates = np.broadcast_to(dates, (n,))
+    sales = np.round(np.asarray(events['sales'], dtype=np.float64), 2).astype(str)
+    extra = [REPLAY_FIELD, "1"] if replay else []
+    out = []
+    for i, (store, family, promo) in enumerate(zip(events['store_nbr'], events['family'], events['onpromotion'])):
+        fields = ["date", str(dates[i]), "store_nbr", str(store), "family", str(family),
+                  "sales", str(sales[i]), "onpromotion", str(promo)] + extra
+        if batch_id is not None:
+            fields += ["batch_id", str(batch_id[i])]
+        out.append(fields)
+    return out
+
+
+def xadd_fields(events: Dict[str, np.ndarray], day=None, replay: bool = False, batch_id=None,
+                fmt: str = STREAM_FORMAT) -> List[List[str]]:
+    """
+    Stream entries for XADD: [EVENT_FIELD, payload] per event in the binary format.
+
+    Events the schema cannot represent (unknown family, negative store) fall
+    back to text fields, so nothing is dropped. Arguments as in encode().
+    """
+    if fmt == "text":
+        return text_fields(events, day, replay, batch_id)
+    records = encode(events, day, replay, batch_id)
+    out = [[EVENT_FIELD, payload] for payload in payloads(records)]
+    bad = np.flatnonzero(records['version'] != SCHEMA_VERSION)
+    if len(bad):
+        subset = {name: np.asarray(events[name])[bad] for name in ('store_nbr', 'family', 'sales', 'onpromotion')}
+        days = np.asarray(events['date'] if day is None else day, dtype='datetime64[D]')
+        subset_day = days[bad] if days.ndim else days
+        ids = None if batch_id is None else np.broadcast_to(batch_id, (len(out),))[bad]
+        for i, fields in zip(bad, text_fields(subset, subset_day, replay, ids)):
+            out[i] = fields
+    return out
+
+
+def is_encoded(fields_raw: List) -> bool:
+    """True for a binary entry ([EVENT_FIELD, payload])."""
+    return len(fields_raw) == 2 and fields_raw[0] == EVENT_FIELD
+
+
+def decode(values: List[Union[str, bytes]]) -> np.ndarray:
+    """
+    Payloads → RECORD_DTYPE array in one pass.
+
+    Payloads that are not a valid record decode to version 0 (a later schema
+    version keeps its own version byte and is rejected by rows()).
+    """
+    if not values:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    if all(len(value) == PAYLOAD_CHARS for value in values):
+        joined = "".join(v if isinstance(v, str) else v.decode() for v in values)
+        try:
+            return np.frombuffer(base64.b64decode(joined, validate=True), dtype=RECORD_DTYPE)
+        except (binascii.Error, ValueError):
+            pass
+    records = np.zeros(len(values), dtype=RECORD_DTYPE)
+    for i, value in enumerate(values):
+        try:
+            raw = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            continue
+        if len(raw) == RECORD_DTYPE.itemsize:
+            records[i] = np.frombuffer(raw, dtype=RECORD_DTYPE)[0]
+    return records
+
+
+def rows(records: np.ndarray) -> Iterator[Optional[Event]]:
+    """Decoded records as (family, date, store_nbr, onpromotion, sales, replay) tuples (None if invalid)."""
+    # Non-finite sales would fail HINCRBYFLOAT, days outside datetime.date's range its conversion
+    valid = (records['version'] == SCHEMA_VERSION) & (records['family'] < len(FAMILIES)) \
+        & np.isfinite(records['sales']) & (records['date'] >= _MIN_DAY) & (records['date'] <= _MAX_DAY)
+    families = _FAMILY_NAMES[np.where(valid, records['family'], 0)].tolist()
+    # datetime64[D].tolist() yields datetime.date objects
+    days = np.where(valid, records['date'], 0).astype('datetime64[D]').tolist()
+    replay = (records['flags'] & FLAG_REPLAY).astype(bool).tolist()
+    columns = zip(valid.tolist(), families, days, records['store_nbr'].tolist(),
+                  records['onpromotion'].tolist(), records['sales'].tolist(), replay)
+    for ok, family, day, store, promo, sales, replayed in columns:
+        yield (family, day, store, promo, sales, replayed) if ok else None
@@ -0,0 +1,176 @@
+"""
+Event Pool
+Prebuilt, memory-mapped source of simulated sales events for the producer.
+
+    events.npy        structured array, one row per test.csv event:
+                      store_nbr (int16), family code (uint16), onpromotion (int16)
+    sales_params.npy  float32 [store_nbr, family, promo flag, (p_zero, mu, sigma)]
+    meta.json         family names, fit window and source CSV signatures
+
+Sales are drawn per store × family × promo flag from a zero-inflated
+log-normal fitted on the last FIT_DAYS of train.csv: zero with probability
+p_zero, otherwise exp(N(mu, sigma)). Cells with fewer than MIN_SAMPLES
+non-zero days fall back to the family × promo fit, then to the global one.
+
+Loading is two np.load(mmap_mode='r') calls, and a batch of any size is one
+vectorized draw, so producer startup no longer reads test.csv.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import data_lake, event_codec
+
+POOL_DIR = Path(os.getenv("EVENT_POOL_DIR", str(data_lake.DATA_DIR / "event_pool")))
+# Days of train.csv (ending at its last date) the sales distributions are fitted on
+FIT_DAYS = int(os.getenv("EVENT_POOL_FIT_DAYS", "365"))
+# Non-zero days a store × family × promo cell needs for its own log-normal fit
+MIN_SAMPLES = int(os.getenv("EVENT_POOL_MIN_SAMPLES", "20"))
+
+EVENT_DTYPE = np.dtype([("store_nbr", "<i2"), ("family", "<u2"), ("onpromotion", "<i2")])
+P_ZERO, MU, SIGMA = 0, 1, 2
+
+
+def source_signature() -> Dict:
+    """Size and mtime of the CSVs the pool is built from (None for a missing file)."""
+    out = {}
+    for name in ("test", "train"):
+        path = data_lake.csv_path(name)
+        out[name] = [path.stat().st_size, int(path.stat().st_mtime)] if path.exists() else None
+    return out
+
+
+def _lognormal_fit(positive_log: pd.Series, keys: List[pd.Series]) -> pd.DataFrame:
+    """mu / sigma / count of log(sales) per key (sigma 0 for single observations)."""
+    fit = positive_log.groupby(keys).agg(['mean', 'std', 'count'])
+    return fit.fillna({'std': 0.0})
+
+
+def fit_sales(df_train: pd.DataFrame, families: pd.Index, n_stores: int) -> np.ndarray:
+    """
+    Zero-inflated log-normal parameters per store × family × promo flag.
+
+    Args:
+        df_train: date / store_nbr / family / sales / onpromotion rows
+        families: Family names, in code order
+        n_stores: Largest store number + 1
+
+    Returns:
+        float32 [n_stores, len(families), 2, 3] array of (p_zero, mu, sigma)
+    """
+    store = df_train['store_nbr'].astype(np.int64)
+    family = pd.Series(families.get_indexer(df_train['family'].astype(str)), index=df_train.index)
+    promo = (df_train['onpromotion'] > 0).astype(np.int64)
+    sales = df_train['sales'].astype(np.float64)
+    positive = sales > 0
+    log_sales = np.log(sales[positive])
+
+    # Global and family × promo fallbacks first, then overwrite cells with enough data
+    params = np.zeros((n_stores, len(families), 2, 3), dtype=np.float32)
+    params[..., P_ZERO] = 1.0 - positive.mean()
+    params[..., MU] = log_sales.mean()
+    params[..., SIGMA] = log_sales.std()
+
+    for keys, index in (([family, promo], lambda f, p: (slice(None), f, p)),
+                        ([store, family, promo], lambda s, f, p: (s, f, p))):
+        zero_share = (~positive).groupby(keys).mean()
+        fit = _lognormal_fit(log_sales, [k[positive] for k in keys])
+        fit = fit[fit['count'] >= MIN_SAMPLES]
+        for key, row in fit.iterrows():
+            cell = index(*key)
+            params[cell + (P_ZERO,)] = zero_share.loc[key]
+            params[cell + (MU,)] = row['mean']
+            params[cell + (SIGMA,)] = row['std']
+    return params
+
+
+class EventPool:
+    """Integer-coded events plus per-cell sales distributions, sampled in one vectorized draw."""
+
+    def __init__(self, events: np.ndarray, sales_params: np.ndarray, families: List[str], meta: Optional[Dict] = None):
+        self.events = events
+        self.sales_params = sales_params
+        self.families = np.asarray(families, dtype=object)
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, df_test: pd.DataFrame, df_train: pd.DataFrame, fit_days: int = FIT_DAYS) -> "EventPool":
+        """
+        Encode the test events and fit the sales distributions.
+
+        Args:
+            df_test: store_nbr / family / onpromotion rows to draw events from
+            df_train: date / store_nbr / family / sales / onpromotion history
+            fit_days: Days of history (up to its last date) used for the fit
+        """
+        families = pd.Index(sorted(set(df_test['family'].astype(str)) | set(df_train['family'].astype(str))))
+        events = np.empty(len(df_test), dtype=EVENT_DTYPE)
+        events['store_nbr'] = df_test['store_nbr'].astype(np.int16)
+        events['family'] = families.get_indexer(df_test['family'].astype(str))
+        events['onpromotion'] = df_test['onpromotion'].astype(np.int16)
+
+        recent = df_train[df_train['date'] > df_train['date'].max() - pd.Timedelta(days=fit_days)]
+        n_stores = int(max(df_test['store_nbr'].max(), recent['store_nbr'].max())) + 1
+        params = fit_sales(recent, families, n_stores)
+        meta = {"families": families.tolist(), "fit_days": fit_days, "fit_rows": len(recent),
+                "fit_end": str(df_train['date'].max().date()), "source": source_signature()}
+        return cls(events, params, families.tolist(), meta)
+
+    def save(self, directory: Path = POOL_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "events.npy", self.events)
+        np.save(directory / "sales_params.npy", self.sales_params)
+        (directory / "meta.json").write_text(json.dumps(self.meta, indent=2))
+
+    @classmethod
+    def load(cls, directory: Path = POOL_DIR) -> "EventPool":
+        """Memory-map a saved pool."""
+        meta = json.loads((directory / "meta.json").read_text())
+        return cls(np.load(directory / "events.npy", mmap_mode='r'),
+                   np.load(directory / "sales_params.npy", mmap_mode='r'), meta["families"], meta)
+
+    def is_current(self) -> bool:
+        """False when the source CSVs changed since the pool was built."""
+        return self.meta.get("source") == source_signature()
+
+    def sample(self, n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        """
+        n random events with simulated sales.
+
+        Returns:
+            Arrays store_nbr, family (names), onpromotion and sales (2 decimals)
+        """
+        events = self.events[rng.integers(0, len(self.events), n)]
+        store, family = events['store_nbr'].astype(np.intp), events['family'].astype(np.intp)
+        params = self.sales_params[store, family, (events['onpromotion'] > 0).astype(np.intp)]
+        draws = np.exp(params[:, MU] + params[:, SIGMA] * rng.standard_normal(n))
+        sales = np.where(rng.random(n) < params[:, P_ZERO], 0.0, np.round(draws, 2))
+        return {"store_nbr": events['store_nbr'], "family": self.families[family],
+                "onpromotion": events['onpromotion'], "sales": sales}
+
+    def xadd_fields(self, n: int, rng: np.random.Generator, date: str) -> List[List[str]]:
+        """n stream entries dated `date`, encoded by utils/event_codec.py."""
+        return event_codec.xadd_fields(self.sample(n, rng), date)
+
+
+def build_from_lake(fit_days: int = FIT_DAYS) -> EventPool:
+    """Build a pool from the lake (or the CSVs if the lake is missing)."""
+    df_test = data_lake.load_table("test", columns=['store_nbr', 'family', 'onpromotion'])
+    df_train = data_lake.load_table("train", columns=['date', 'store_nbr', 'family', 'sales', 'onpromotion'])
+    return EventPool.build(df_test, df_train, fit_days)
+
+
+def load_or_build(directory: Path = POOL_DIR) -> EventPool:
+    """The saved pool if it is current, otherwise a fresh one (saved for the next run)."""
+    if (directory / "meta.json").exists():
+        pool = EventPool.load(directory)
+        if pool.is_current():
+            return pool
+    pool = build_from_lake()
+    pool.save(directory)
+    return pool
@@ -0,0 +1,235 @@
+"""
+Incremental Feature Cache
+Featurized training rows persisted per month, each tagged with a content hash
+of its inputs, so a nightly run only re-featurizes months whose inputs changed.
+
+Layout (one directory per month):
+    FEATURE_CACHE_DIR/month=YYYY-MM/<column>.npy
+    FEATURE_CACHE_DIR/month=YYYY-MM/manifest.json   {"hash": ..., "rows": ...}
+
+Cached columns are plain .npy files, so unchanged months are memory-mapped
+instead of being read and parsed again.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from utils import data_lake
+from utils.calendar_dim import CalendarDimension
+from utils.features import FEATURES, TARGET, ONE_DAY, build_dimensions, gather_features
+
+CACHE_COLUMNS = ['date'] + FEATURES + [TARGET]
+
+# Bump whenever utils/features.py changes what a cached row contains
+FEATURE_VERSION = "1"
+
+SALES_COLUMNS = ['date', 'store_nbr', 'family', 'sales', 'onpromotion']
+
+
+def enabled() -> bool:
+    """The cache needs the columnar lake (partition files are what gets hashed)."""
+    return os.getenv("FEATURE_CACHE", "1") != "0" and data_lake.is_built("train")
+
+
+def cache_dir() -> Path:
+    """FEATURE_CACHE_DIR, read when used so a .env loaded after import still applies."""
+    return Path(os.getenv("FEATURE_CACHE_DIR", str(data_lake.DATA_DIR / "feature_cache")))
+
+
+def _month_dir(month: str) -> Path:
+    return cache_dir() / f"month={month}"
+
+
+def _month_window(month: str):
+    start = np.datetime64(month, 'D')
+    end = np.datetime64(np.datetime64(month, 'M') + 1, 'D')
+    return start, int((end - start) // ONE_DAY)
+
+
+def _digest_files(h, paths: List[Path]):
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+
+
+def _month_hash(month: str, dims: Dict[str, np.ndarray], encoders: Dict[str, LabelEncoder],
+                fresh: Optional[pd.DataFrame]) -> str:
+    """Content hash of everything that determines one month of features."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"v{FEATURE_VERSION}|{month}".encode())
+    for name in sorted(dims):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(dims[name]).tobytes())
+    for col in sorted(encoders):
+        h.update("|".join(map(str, encoders[col].classes_)).encode())
+    _digest_files(h, data_lake.partition_files("train", month))
+    if fresh is not None and len(fresh):
+        h.update(pd.util.hash_pandas_object(fresh[SALES_COLUMNS], index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _read_manifest(month: str) -> Dict:
+    path = _month_dir(month) / "manifest.json"
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _write_month(month: str, df: pd.DataFrame, digest: str):
+    """Write one month atomically (temp directory + rename)."""
+    target = _month_dir(month)
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for col in CACHE_COLUMNS:
+        values = df[col].values
+        if col == 'date':
+            values = values.astype('datetime64[D]').astype(np.int32)  # days since epoch
+        np.save(tmp / f"{col}.npy", np.ascontiguousarray(values))
+    (tmp / "manifest.json").write_text(json.dumps({"hash": digest, "rows": len(df)}))
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+
+
+def refresh(
+    df_fresh: pd.DataFrame,
+    df_oil: pd.DataFrame,
+    df_stores: pd.DataFrame,
+    df_transactions: pd.DataFrame,
+    calendar: CalendarDimension,
+    encoders: Dict[str, LabelEncoder],
+) -> List[str]:
+    """
+    Bring every month partition up to date, re-featurizing only stale months.
+
+    Args:
+        df_fresh: Live rows from the Redis training buffer (may be empty)
+        df_oil: Daily oil prices
+        df_stores: Store metadata
+        df_transactions: Transactions per store and date
+        calendar: Store-resolved holiday table
+        encoders: Fitted encoders (a change invalidates every month)
+
+    Returns:
+        Sorted list of month keys that make up the training set
+    """
+    fresh_months = pd.Series(dtype=str)
+    if len(df_fresh):
+        fresh_months = df_fresh['date'].dt.strftime('%Y-%m')
+    months = sorted(set(data_lake.list_partitions("train")) | set(fresh_months.unique()))
+    n_stores = int(df_stores['store_nbr'].max()) + 1
+    if len(df_fresh):
+        n_stores = max(n_stores, int(df_fresh['store_nbr'].max()) + 1)
+
+    rebuilt = 0
+    for month in months:
+        start, n_days = _month_window(month)
+        dims = build_dimensions(start, n_days, n_stores, df_oil, df_stores, df_transactions, calendar, encoders)
+        fresh = df_fresh[fresh_months.values == month] if len(df_fresh) else None
+        digest = _month_hash(month, dims, encoders, fresh)
+        if _read_manifest(month).get("hash") == digest:
+            continue
+
+        sales = data_lake.load_table("train", columns=SALES_COLUMNS, start=start, end=start + (n_days - 1) * ONE_DAY)
+        if fresh is not None and len(fresh):
+            sales['family'] = sales['family'].astype(str)
+            sales = pd.concat([sales, fresh[SALES_COLUMNS]], ignore_index=True)
+        _write_month(month, gather_features(sales, dims, start, encoders), digest)
+        rebuilt += 1
+
+    # Drop months that no longer have inputs
+    keep = {f"month={m}" for m in months}
+    root = cache_dir()
+    if root.exists():
+        for stale in root.iterdir():
+            if stale.is_dir() and stale.name not in keep:
+                shutil.rmtree(stale, ignore_errors=True)
+
+    print(f"  ✅ Feature cache: {rebuilt} of {len(months)} month partitions re-featurized")
+    return months
+
+
+def cached_months() -> List[str]:
+    """Month keys currently present in the cache (as left by the last refresh())."""
+    root = cache_dir()
+    if not root.exists():
+        return []
+    return sorted(d.name.split("=", 1)[1] for d in root.glob("month=*")
+                  if d.is_dir() and not d.name.endswith(".tmp") and (d / "manifest.json").exists())
+
+
+def month_arrays(month: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """Memory-mapped column arrays for one cached month."""
+    return {col: np.load(_month_dir(month) / f"{col}.npy", mmap_mode='r') for col in (columns or CACHE_COLUMNS)}
+
+
+def month_rows(month: str) -> int:
+    """Row count of one cached month (from its manifest)."""
+    return int(_read_manifest(month)["rows"])
+
+
+def iter_months(months: List[str], columns: Optional[List[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+    """Yield memory-mapped column arrays month by month."""
+    for month in months:
+        yield month_arrays(month, columns)
+
+
+def load_frame(months: List[str], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Assemble cached months into one training frame.
+
+    Each output column is allocated once and filled straight from the
+    memory-mapped month files, so no per-month DataFrames are built.
+
+    Args:
+        months: Month keys from refresh()
+        columns: Columns to load (default: date + FEATURES + target)
+
+    Returns:
+        DataFrame in month order with the cached narrow dtypes
+    """
+    columns = columns or CACHE_COLUMNS
+    sizes = [month_rows(m) for m in months]
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    out = {}
+    for col in columns:
+        first = month_arrays(months[0], [col])[col]
+        buf = np.empty(int(offsets[-1]), dtype=first.dtype)
+        for i, month in enumerate(months):
+            buf[offsets[i]:offsets[i + 1]] = month_arrays(month, [col])[col]
+        if col == 'date':
+            buf = buf.astype('datetime64[D]').astype('datetime64[ns]')
+        out[col] = buf
+    return pd.DataFrame(out, copy=False)
+
+
+def daily_totals(months: List[str]) -> pd.DataFrame:
+    """
+    Company-wide daily aggregates (sales sum, oil mean, holiday max) built month by month.
+
+    Args:
+        months: Month keys from refresh()
+
+    Returns:
+        DataFrame with date, sales, dcoilwtico, is_holiday (one row per date)
+    """
+    frames = []
+    for month in months:
+        arrays = month_arrays(month, ['date', 'sales', 'dcoilwtico', 'is_holiday'])
+        part = pd.DataFrame({
+            'date': np.asarray(arrays['date']),
+            'sales': np.asarray(arrays['sales'], dtype=np.float64),
+            'dcoilwtico': np.asarray(arrays['dcoilwtico'], dtype=np.float64),
+            'is_holiday': np.asarray(arrays['is_holiday']),
+        })
+        frames.append(part.groupby('date').agg({'sales': 'sum', 'dcoilwtico': 'mean', 'is_holiday': 'max'}))
+    daily = pd.concat(frames).reset_index()
+    daily['date'] = daily['date'].values.astype('datetime64[D]').astype('datetime64[ns]')
+    return daily
@@ -0,0 +1,228 @@
+"""
+Feature Engineering
+Memory-planned featurization for the XGBoost sales model.
+
+Dimension tables (oil, stores, transactions, the calendar dimension) are
+turned into small dense arrays indexed by day ordinal and/or store number,
+and joined onto the sales rows with NumPy gathers instead of pandas merges. Columns are stored at
+the narrowest dtype that holds them.
+"""
+
+from contextlib import nullcontext
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from utils.calendar_dim import CalendarDimension
+from utils.profiling import StageProfiler
+
+FEATURES = ['store_nbr', 'family_encoded', 'onpromotion', 'transactions',
+            'dcoilwtico', 'is_holiday', 'city_encoded', 'state_encoded',
+            'type_encoded', 'day_of_week', 'month', 'year', 'day_of_month']
+TARGET = 'sales'
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def fit_encoders(families: Iterable[str], df_stores: pd.DataFrame) -> Dict[str, LabelEncoder]:
+    """
+    Fit the label encoders saved alongside the model.
+
+    Args:
+        families: Every family value seen in the training data
+        df_stores: Store metadata (city, state, type)
+
+    Returns:
+        Dict of fitted LabelEncoders keyed by column name
+    """
+    encoders = {'family': LabelEncoder().fit(pd.Series(list(families)).astype(str))}
+    for col in ['city', 'state', 'type']:
+        encoders[col] = LabelEncoder().fit(df_stores[col].astype(str))
+    return encoders
+
+
+def encode_codes(values: pd.Series, encoder: LabelEncoder) -> np.ndarray:
+    """Encode values to the encoder's integer codes without a per-row string search (-1 if unseen)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Recode the (small) category table instead of the rows
+        codes = values.cat.set_categories(encoder.classes_).cat.codes
+    else:
+        codes = pd.Categorical(values.astype(str), categories=encoder.classes_).codes
+    return np.asarray(codes, dtype=np.int8)
+
+
+def day_ordinals(dates: pd.Series, origin: np.datetime64) -> np.ndarray:
+    """Days since `origin` for every date (int32)."""
+    return ((dates.values.astype('datetime64[D]') - origin) // ONE_DAY).astype(np.int32)
+
+
+def _oil_by_day(df_oil: pd.DataFrame, origin: np.datetime64, n_days: int) -> np.ndarray:
+    """Daily oil price array, forward-filled (seeded by the last earlier price), then back-filled."""
+    oil = df_oil.dropna(subset=['dcoilwtico'])
+    daily = np.full(n_days, np.nan, dtype=np.float32)
+    idx = day_ordinals(oil['date'], origin)
+    keep = (idx >= 0) & (idx < n_days)
+    daily[idx[keep]] = oil['dcoilwtico'].values[keep]
+
+    # Prices outside the window still seed the fills
+    if np.isnan(daily[0]) and (idx < 0).any():
+        daily[0] = oil['dcoilwtico'].values[idx < 0][-1]
+    series = pd.Series(daily).ffill()
+    if series.isna().any() and (idx >= 0).any():
+        series = series.fillna(oil['dcoilwtico'].values[idx >= 0][0])
+    return series.values.astype(np.float32)
+
+
+def _store_lookup(df_stores: pd.DataFrame, encoders: Dict[str, LabelEncoder], n_stores: int) -> Dict[str, np.ndarray]:
+    """Per-store encoded city/state/type arrays indexed by store_nbr."""
+    lookup = {}
+    store_idx = df_stores['store_nbr'].values.astype(np.int64)
+    for col in ['city', 'state', 'type']:
+        arr = np.full(n_stores, -1, dtype=np.int8)
+        arr[store_idx] = encode_codes(df_stores[col], encoders[col])
+        lookup[col] = arr
+    return lookup
+
+
+def _transactions_by_day_store(df_transactions: pd.DataFrame, origin: np.datetime64, n_days: int, n_stores: int) -> np.ndarray:
+    """Dense [day, store] transactions matrix (0 where missing)."""
+    grid = np.zeros((n_days, n_stores), dtype=np.float32)
+    days = day_ordinals(df_transactions['date'], origin)
+    stores = df_transactions['store_nbr'].values.astype(np.int64)
+    keep = (days >= 0) & (days < n_days) & (stores < n_stores)
+    grid[days[keep], stores[keep]] = df_transactions['transactions'].values[keep]
+    return grid
+
+
+def _calendar_by_day(origin: np.datetime64, n_days: int) -> Dict[str, np.ndarray]:
+    """Calendar features for each day in the window."""
+    days = pd.DatetimeIndex(origin + np.arange(n_days) * ONE_DAY)
+    return {
+        'day_of_week': days.dayofweek.values.astype(np.int8),
+        'month': days.month.values.astype(np.int8),
+        'year': days.year.values.astype(np.int16),
+        'day_of_month': days.day.values.astype(np.int8),
+    }
+
+
+def build_dimensions(
+    origin: np.datetime64,
+    n_days: int,
+    n_stores: int,
+    df_oil: pd.DataFrame,
+    df_stores: pd.DataFrame,
+    df_transactions: pd.DataFrame,
+    calendar: CalendarDimension,
+    encoders: Dict[str, LabelEncoder],
+) -> Dict[str, np.ndarray]:
+    """
+    Materialize every dimension table as a dense array over one date window.
+
+    Args:
+        origin: First date of the window
+        n_days: Number of days in the window
+        n_stores: Largest store_nbr + 1
+        df_oil: Daily oil prices (date, dcoilwtico)
+        df_stores: Store metadata (store_nbr, city, state, type)
+        df_transactions: Transactions per store and date
+        calendar: Store-resolved holiday table (see utils.calendar_dim)
+        encoders: Fitted encoders from fit_encoders()
+
+    Returns:
+        Dict of arrays indexed by day ordinal and/or store_nbr
+    """
+    origin = np.datetime64(origin, 'D')
+    cal_day = np.arange(n_days) + int((origin - calendar.start) // ONE_DAY)
+    dims = {
+        'oil': _oil_by_day(df_oil, origin, n_days),
+        'transactions': _transactions_by_day_store(df_transactions, origin, n_days, n_stores),
+        'holidays': (calendar.lookup_ordinal(cal_day[:, None], np.arange(n_stores)[None, :]) > 0).astype(np.int8),
+    }
+    for col, values in _store_lookup(df_stores, encoders, n_stores).items():
+        dims[f'store_{col}'] = values
+    for col, values in _calendar_by_day(origin, n_days).items():
+        dims[f'calendar_{col}'] = values
+    return dims
+
+
+def gather_features(
+    df_sales: pd.DataFrame,
+    dims: Dict[str, np.ndarray],
+    origin: np.datetime64,
+    encoders: Dict[str, LabelEncoder],
+) -> pd.DataFrame:
+    """
+    Join dimension arrays onto sales rows by day ordinal / store_nbr.
+
+    The sales frame is consumed column by column and emptied as it goes, so
+    callers should not reuse it afterwards.
+
+    Args:
+        df_sales: Sales rows (date, store_nbr, family, sales, onpromotion)
+        dims: Output of build_dimensions() for a window starting at `origin`
+        origin: First date of the window
+        encoders: Fitted encoders from fit_encoders()
+
+    Returns:
+        Compact DataFrame with narrow dtypes, one row per sales row
+    """
+    day = day_ordinals(df_sales['date'], np.datetime64(origin, 'D'))
+    store = df_sales['store_nbr'].values.astype(np.int8)
+    store_i = store.astype(np.intp)
+
+    df = pd.DataFrame({'date': df_sales.pop('date')})
+    df['store_nbr'] = store
+    df['family_encoded'] = encode_codes(df_sales.pop('family'), encoders['family'])
+    df['onpromotion'] = df_sales.pop('onpromotion').values.astype(np.int16)
+    df['transactions'] = dims['transactions'][day, store_i]
+    df['dcoilwtico'] = dims['oil'][day]
+    df['is_holiday'] = dims['holidays'][day, store_i]
+    for col in ['city', 'state', 'type']:
+        df[f'{col}_encoded'] = dims[f'store_{col}'][store_i]
+    for col in ['day_of_week', 'month', 'year', 'day_of_month']:
+        df[col] = dims[f'calendar_{col}'][day]
+    df[TARGET] = df_sales.pop(TARGET).values.astype(np.float32)
+    return df
+
+
+def build_feature_frame(
+    df_sales: pd.DataFrame,
+    df_oil: pd.DataFrame,
+    df_stores: pd.DataFrame,
+    df_transactions: pd.DataFrame,
+    calendar: CalendarDimension,
+    encoders: Dict[str, LabelEncoder],
+    profiler: Optional[StageProfiler] = None,
+) -> pd.DataFrame:
+    """
+    Build the model matrix (FEATURES + date + sales) from raw tables in one pass.
+
+    Args:
+        df_sales: Sales rows (date, store_nbr, family, sales, onpromotion); consumed
+        df_oil: Daily oil prices (date, dcoilwtico)
+        df_stores: Store metadata (store_nbr, city, state, type)
+        df_transactions: Transactions per store and date
+        calendar: Store-resolved holiday table (see utils.calendar_dim)
+        encoders: Fitted encoders from fit_encoders()
+        profiler: Optional StageProfiler for per-stage RSS reporting
+
+    Returns:
+        Compact DataFrame with narrow dtypes, one row per sales row
+    """
+    stage = profiler.stage if profiler else (lambda name: nullcontext())
+
+    with stage("featurize.dimensions"):
+        dates = df_sales['date'].values.astype('datetime64[D]')
+        origin = dates.min()
+        n_days = int((dates.max() - origin) // ONE_DAY) + 1
+        n_stores = int(max(df_sales['store_nbr'].max(), df_stores['store_nbr'].max())) + 1
+        del dates
+        dims = build_dimensions(origin, n_days, n_stores, df_oil, df_stores, df_transactions, calendar, encoders)
+
+    with stage("featurize.gather"):
+        df = gather_features(df_sales, dims, origin, encoders)
+        del dims
+
+    return df
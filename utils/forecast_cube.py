@@ -0,0 +1,149 @@
+"""
+Forecast Cube
+XGBoost predictions for every store × family × next-N-days × promo flag,
+scored once per night so the dashboard answers the common queries with an
+array lookup instead of live inference.
+
+Grid inputs match the dashboard defaults: oil at DEFAULT_OIL, transactions at
+DEFAULT_TRANSACTIONS, store-resolved holidays from the calendar dimension and
+each store's real city/state/type codes.
+"""
+
+import os
+from datetime import date
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from utils.calendar_dim import CalendarDimension
+from utils.features import FEATURES, _calendar_by_day, _store_lookup
+
+CUBE_FILE = "forecast_cube.npz"
+CUBE_DAYS = int(os.getenv("FORECAST_CUBE_DAYS", "30"))
+
+DEFAULT_OIL = 45.0
+DEFAULT_TRANSACTIONS = 1500
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def grid_frame(start: np.datetime64, n_days: int, stores: np.ndarray, n_families: int,
+               codes: Dict[str, np.ndarray], calendar: Optional[CalendarDimension]) -> pd.DataFrame:
+    """Feature rows for the full grid, in [day, store, family, promo] C order."""
+    start = np.datetime64(start, 'D')
+    d, s, f, p = np.meshgrid(np.arange(n_days), np.arange(len(stores)), np.arange(n_families), np.arange(2),
+                             indexing='ij')
+    d, s, f, p = d.ravel(), s.ravel(), f.ravel(), p.ravel()
+    store_nbr = stores[s]
+    cal = _calendar_by_day(start, n_days)
+    if calendar is not None:
+        day = calendar.ordinals(start + np.arange(n_days) * ONE_DAY)
+        holidays = (calendar.lookup_ordinal(day[:, None], stores[None, :]) > 0).astype(np.int8)
+    else:
+        holidays = np.zeros((n_days, len(stores)), dtype=np.int8)
+
+    frame = pd.DataFrame({
+        'store_nbr': store_nbr.astype(np.int8),
+        'family_encoded': f.astype(np.int8),
+        'onpromotion': p.astype(np.int16),
+        'transactions': np.float32(DEFAULT_TRANSACTIONS),
+        'dcoilwtico': np.float32(DEFAULT_OIL),
+        'is_holiday': holidays[d, s],
+        'city_encoded': codes['city'][store_nbr],
+        'state_encoded': codes['state'][store_nbr],
+        'type_encoded': codes['type'][store_nbr],
+        'day_of_week': cal['day_of_week'][d],
+        'month': cal['month'][d],
+        'year': cal['year'][d],
+        'day_of_month': cal['day_of_month'][d],
+    })
+    return frame[FEATURES]
+
+
+class ForecastCube:
+    """Dense float32 [day, store, family, promo] prediction grid with O(1) lookups."""
+
+    def __init__(self, start: np.datetime64, values: np.ndarray, stores: np.ndarray, families: np.ndarray,
+                 codes: Dict[str, np.ndarray]):
+        """
+        Args:
+            start: Date of day 0
+            values: float32 [n_days, n_stores, n_families, 2] predicted sales
+            stores: store_nbr of each store column
+            families: Family name of each family column (encoder order)
+            codes: Encoded city/state/type indexed by store_nbr (for off-grid live rows)
+        """
+        self.start = np.datetime64(start, 'D')
+        self.values = values
+        self.stores = stores
+        self.families = families
+        self.codes = codes
+        self._store_index = {int(s): i for i, s in enumerate(stores)}
+        self._family_index = {str(f): i for i, f in enumerate(families)}
+
+    @classmethod
+    def build(cls, model, df_stores: pd.DataFrame, encoders: Dict[str, LabelEncoder],
+              calendar: Optional[CalendarDimension], start: Optional[date] = None,
+              n_days: int = CUBE_DAYS) -> "ForecastCube":
+        """
+        Score the whole grid in one predict call.
+
+        Args:
+            model: Fitted XGBRegressor (or anything with predict(DataFrame))
+            df_stores: Store metadata (store_nbr, city, state, type)
+            encoders: Fitted encoders from fit_encoders()
+            calendar: Store-resolved holiday table (None = no holidays)
+            start: First grid date (default: today)
+            n_days: Grid length in days
+        """
+        start = np.datetime64(start or date.today(), 'D')
+        stores = np.sort(df_stores['store_nbr'].values.astype(np.int64))
+        families = np.asarray(encoders['family'].classes_, dtype=str)
+        codes = _store_lookup(df_stores, encoders, int(stores.max()) + 1)
+
+        X = grid_frame(start, n_days, stores, len(families), codes, calendar)
+        preds = np.maximum(np.asarray(model.predict(X), dtype=np.float32), 0)
+        return cls(start, preds.reshape(n_days, len(stores), len(families), 2), stores, families, codes)
+
+    def save(self, path: Union[str, Path] = CUBE_FILE):
+        """Write the grid as a compressed .npz artifact."""
+        np.savez_compressed(path, start=np.array(str(self.start)), values=self.values, stores=self.stores,
+                            families=self.families, **{f'code_{k}': v for k, v in self.codes.items()})
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = CUBE_FILE) -> "ForecastCube":
+        """Load a grid written by save()."""
+        with np.load(path) as data:
+            codes = {k: data[f'code_{k}'] for k in ['city', 'state', 'type']}
+            return cls(np.datetime64(str(data['start']), 'D'), data['values'], data['stores'],
+                       data['families'], codes)
+
+    @property
+    def end(self) -> np.datetime64:
+        """Last date on the grid."""
+        return self.start + (self.values.shape[0] - 1) * ONE_DAY
+
+    def lookup(self, dates, store_nbr: int, family: str, promo) -> Optional[np.ndarray]:
+        """
+        Grid predictions for one store/family over one or more dates.
+
+        Args:
+            dates: Date or array of dates
+            store_nbr: Store number
+            family: Family name
+            promo: Promotion flag (scalar or per-date array)
+
+        Returns:
+            float32 array aligned with `dates`, or None if any date/store/family is off the grid
+        """
+        s = self._store_index.get(int(store_nbr))
+        f = self._family_index.get(str(family))
+        days = pd.to_datetime(pd.Series(np.atleast_1d(dates))).values.astype('datetime64[D]')
+        d = ((days - self.start) // ONE_DAY).astype(np.int64)
+        if s is None or f is None or (d < 0).any() or (d >= self.values.shape[0]).any():
+            return None
+        p = np.broadcast_to(np.asarray(promo, dtype=np.int64) > 0, d.shape).astype(np.intp)
+        return self.values[d, s, f, p]
@@ -0,0 +1,429 @@
+"""
+Hierarchical Prophet Forecasting
+One Prophet model per node of the sales hierarchy, fitted across a process
+pool and reconciled so that every level adds up to the total.
+
+Nodes (in this order):
+    total
+    family:<FAMILY>                  one per product family
+    store:<n>                        one per store
+    store:<n>|family:<FAMILY>        optional bottom level (~1,800 series)
+
+Families and stores are two groupings of the same total, so the hierarchy is
+"grouped" rather than a single tree. Reconciliation either sums the
+store×family forecasts (bottom_up) or projects every base forecast onto the
+coherent subspace with MinT weights (W = diagonal of each model's residual
+variance, i.e. Prophet's sigma_obs). Interval widths are reconciled too,
+treating the base forecast errors as independent.
+
+Artifacts:
+    hierarchy_forecast.npz   reconciled yhat / yhat_lower / yhat_upper per node + recent history
+    hierarchy_params.npz     fitted Prophet parameters per node, stacked into float32 arrays
+"""
+
+import math
+import os
+import signal
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+FORECAST_FILE = "hierarchy_forecast.npz"
+PARAMS_FILE = "hierarchy_params.npz"
+
+LEVELS = ("total", "family", "store", "store_family")
+DEFAULT_LEVELS = ("total", "family", "store")
+METHODS = ("mint", "bottom_up")
+
+HORIZON = int(os.getenv("HIER_HORIZON", "90"))
+SERIES_TIMEOUT = int(os.getenv("HIER_SERIES_TIMEOUT", "120"))
+UNCERTAINTY_SAMPLES = int(os.getenv("HIER_UNCERTAINTY_SAMPLES", "200"))
+HISTORY_DAYS = 60
+
+# Every node uses the same Prophet layout so parameters stack into fixed-width arrays
+N_CHANGEPOINTS = 25
+REGRESSORS = ['dcoilwtico', 'is_holiday']
+INTERVAL_WIDTH = 0.8
+Z_INTERVAL = 1.2815515655446004  # two-sided 80% normal quantile
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def node_name(store: Optional[int] = None, family: Optional[str] = None) -> str:
+    """Canonical node name for a (store, family) pair; both None is the total."""
+    if store is None and family is None:
+        return "total"
+    if store is None:
+        return f"family:{family}"
+    if family is None:
+        return f"store:{store}"
+    return f"store:{store}|family:{family}"
+
+
+class SalesCube:
+    """Dense [day, store, family] daily sales with the regressors each node needs."""
+
+    def __init__(self, start: np.datetime64, sales: np.ndarray, stores: np.ndarray, families: np.ndarray,
+                 oil: np.ndarray, holidays: np.ndarray):
+        """
+        Args:
+            start: Date of day 0
+            sales: float32 [n_days, n_stores, n_families]
+            stores: store_nbr of each store column
+            families: Family name of each family column
+            oil: float32 [n_days] daily oil price
+            holidays: int8 [n_days, n_stores] store-resolved holiday flag
+        """
+        self.start = np.datetime64(start, 'D')
+        self.sales = sales
+        self.stores = stores
+        self.families = families
+        self.oil = oil
+        self.holidays = holidays
+
+    @classmethod
+    def build(cls, chunks: Iterable[Dict[str, np.ndarray]], families: np.ndarray, df_oil: pd.DataFrame,
+              calendar) -> "SalesCube":
+        """
+        Scatter-add sales rows into the cube.
+
+        Args:
+            chunks: Dicts of date (datetime64 or int days since epoch), store_nbr,
+                family_encoded and sales arrays (e.g. feature cache months)
+            families: Family names indexed by family_encoded
+            df_oil: Daily oil prices (date, dcoilwtico)
+            calendar: CalendarDimension for the holiday regressor
+        """
+        from utils.features import _oil_by_day
+
+        chunks = [{k: np.asarray(v) for k, v in chunk.items()} for chunk in chunks]
+        days = [c['date'].astype('datetime64[D]') for c in chunks]
+        start = min(d.min() for d in days if len(d))
+        end = max(d.max() for d in days if len(d))
+        n_days = int((end - start) // ONE_DAY) + 1
+        n_stores = int(max(c['store_nbr'].max() for c in chunks if len(c['store_nbr']))) + 1
+
+        sales = np.zeros((n_days, n_stores, len(families)), dtype=np.float32)
+        for chunk, day in zip(chunks, days):
+            np.add.at(sales, (((day - start) // ONE_DAY).astype(np.intp), chunk['store_nbr'].astype(np.intp),
+                              chunk['family_encoded'].astype(np.intp)), chunk['sales'].astype(np.float32))
+
+        # Drop store numbers that never sold anything (store_nbr is 1-based)
+        stores = np.flatnonzero(sales.any(axis=(0, 2)))
+        cal_day = np.arange(n_days) + int((start - calendar.start) // ONE_DAY)
+        holidays = (calendar.lookup_ordinal(cal_day[:, None], stores[None, :]) > 0).astype(np.int8)
+        return cls(start, sales[:, stores], stores, np.asarray(families, dtype=str),
+                   _oil_by_day(df_oil, start, n_days), holidays)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.start + np.arange(self.sales.shape[0]) * ONE_DAY
+
+    def nodes(self, levels: Iterable[str] = DEFAULT_LEVELS) -> pd.DataFrame:
+        """Node table: name, level, store column index (-1 = all), family column index (-1 = all)."""
+        rows = []
+        if "total" in levels:
+            rows.append(("total", "total", -1, -1))
+        if "family" in levels:
+            rows += [(node_name(family=f), "family", -1, j) for j, f in enumerate(self.families)]
+        if "store" in levels:
+            rows += [(node_name(store=int(s)), "store", i, -1) for i, s in enumerate(self.stores)]
+        if "store_family" in levels:
+            rows += [(node_name(int(s), f), "store_family", i, j)
+                     for i, s in enumerate(self.stores) for j, f in enumerate(self.families)]
+        return pd.DataFrame(rows, columns=['node', 'level', 'store', 'family'])
+
+    def series(self, store: int, family: int) -> np.ndarray:
+        """Daily sales of one node (-1 sums over that axis)."""
+        cube = self.sales if store < 0 else self.sales[:, store:store + 1]
+        cube = cube if family < 0 else cube[:, :, family:family + 1]
+        return cube.sum(axis=(1, 2), dtype=np.float64)
+
+    def holiday(self, store: int) -> np.ndarray:
+        """Holiday regressor of a node: its store's flag, or any store for company/family nodes."""
+        return self.holidays[:, store] if store >= 0 else self.holidays.max(axis=1)
+
+
+@contextmanager
+def _time_limit(seconds: int):
+    """Raise TimeoutError in the current (main) thread after `seconds`; no-op without SIGALRM."""
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def _expired(signum, frame):
+        raise TimeoutError(f"series fit exceeded {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, _expired)
+    signal.alarm(seconds)
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _pad(values: np.ndarray, width: int, fill: float) -> np.ndarray:
+    out = np.full(width, fill, dtype=np.float64)
+    out[:min(width, len(values))] = values[:width]
+    return out
+
+
+def _prophet_params(m) -> Dict[str, np.ndarray]:
+    """Everything needed to evaluate a fitted model without Prophet, as plain numbers."""
+    return {
+        'k': m.params['k'][0, 0],
+        'm': m.params['m'][0, 0],
+        'sigma_obs': m.params['sigma_obs'][0, 0],
+        # Short histories get fewer changepoints; zero deltas pad without changing the trend
+        'delta': _pad(m.params['delta'][0], N_CHANGEPOINTS, 0.0),
+        'changepoints_t': _pad(np.asarray(m.changepoints_t), N_CHANGEPOINTS, 1.0),
+        'beta': m.params['beta'][0],
+        'y_scale': m.y_scale,
+        'start': (np.datetime64(m.start, 'D') - np.datetime64(0, 'D')) // ONE_DAY,
+        't_scale': m.t_scale / pd.Timedelta(days=1),
+        'regressor_mu': np.array([m.extra_regressors[r]['mu'] for r in REGRESSORS]),
+        'regressor_std': np.array([m.extra_regressors[r]['std'] for r in REGRESSORS]),
+    }
+
+
+def _naive_forecast(y: np.ndarray, horizon: int):
+    """Seasonal-naive fallback (repeat the last week) with a weekly-difference noise estimate."""
+    if len(y) < 14:
+        level = float(y[-7:].mean()) if len(y) else 0.0
+        return np.full(horizon, level), float(y.std()) if len(y) else 0.0
+    yhat = np.resize(y[-7:], horizon)
+    diff = y[-56:] - y[-63:-7] if len(y) >= 63 else y[7:] - y[:-7]
+    return yhat, float(diff.std())
+
+
+def fit_series(task: Dict) -> Dict:
+    """
+    Fit one node (runs in a pool worker).
+
+    Args:
+        task: name, start, y, oil, holiday, future_oil, future_holiday, timeout
+
+    Returns:
+        Dict with status ('prophet' | 'constant' | 'timeout' | 'failed'), yhat/lower/upper,
+        sigma (residual std in sales units), params (None unless Prophet fitted) and seconds
+    """
+    started = time.perf_counter()
+    y = task['y']
+    horizon = len(task['future_oil'])
+    result = {'name': task['name'], 'params': None}
+
+    # Skip leading zeros (store not open yet / family not stocked)
+    nonzero = np.flatnonzero(y)
+    if len(nonzero) == 0 or not y[-HISTORY_DAYS:].any():
+        result.update(status='constant', yhat=np.zeros(horizon), lower=np.zeros(horizon),
+                      upper=np.zeros(horizon), sigma=0.0)
+        result['seconds'] = time.perf_counter() - started
+        return result
+    first = int(nonzero[0])
+
+    try:
+        import logging
+        from prophet import Prophet
+        # One line per series is noise at ~1,800 series (e.g. short-history yearly seasonality warnings)
+        logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+        logging.getLogger("prophet").setLevel(logging.ERROR)
+
+        dates = np.datetime64(task['start'], 'D') + np.arange(len(y)) * ONE_DAY
+        history = pd.DataFrame({'ds': dates[first:], 'y': y[first:],
+                                'dcoilwtico': task['oil'][first:], 'is_holiday': task['holiday'][first:]})
+        future = pd.DataFrame({'ds': dates[-1] + np.arange(1, horizon + 1) * ONE_DAY,
+                               'dcoilwtico': task['future_oil'], 'is_holiday': task['future_holiday']})
+
+        m = Prophet(yearly_seasonality=True, weekly_seasonality=True, daily_seasonality=False,
+                    n_changepoints=N_CHANGEPOINTS, interval_width=INTERVAL_WIDTH,
+                    uncertainty_samples=UNCERTAINTY_SAMPLES)
+        for regressor in REGRESSORS:
+            m.add_regressor(regressor)
+        # The optimizer runs in a CmdStan subprocess that SIGALRM cannot stop: cmdstanpy's own
+        # timeout kills it (and raises TimeoutError), the alarm then bounds the rest of the budget
+        m.fit(history, timeout=task['timeout'] or None)
+        remaining = task['timeout'] and max(1, math.ceil(task['timeout'] - (time.perf_counter() - started)))
+        with _time_limit(remaining):
+            forecast = m.predict(future)
+
+        result.update(status='prophet', yhat=forecast['yhat'].values, lower=forecast['yhat_lower'].values,
+                      upper=forecast['yhat_upper'].values, sigma=float(m.params['sigma_obs'][0, 0] * m.y_scale),
+                      params=_prophet_params(m))
+    except Exception as exc:
+        yhat, sigma = _naive_forecast(y[first:], horizon)
+        result.update(status='timeout' if isinstance(exc, TimeoutError) else 'failed', error=str(exc),
+                      yhat=yhat, lower=yhat - Z_INTERVAL * sigma, upper=yhat + Z_INTERVAL * sigma, sigma=sigma)
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def fit_nodes(tasks: List[Dict], workers: int) -> List[Dict]:
+    """Fit every node, in a spawned process pool when workers > 1 (results keep task order)."""
+    if workers <= 1:
+        return [fit_series(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        return list(pool.map(fit_series, tasks, chunksize=chunksize))
+
+
+def constraint_matrix(nodes: pd.DataFrame) -> np.ndarray:
+    """
+    Rows C with C @ y == 0 for every coherent forecast vector y (one column per node).
+
+    Without the store×family level the coherent forecasts are those where stores
+    and families each sum to the total; with it, every store and family must also
+    equal the sum of its store×family children.
+    """
+    index = {(s, f): i for i, (s, f) in enumerate(zip(nodes['store'], nodes['family']))}
+    level = nodes['level'].values
+    rows = []
+
+    def add(parent, children):
+        if parent in index and all(c in index for c in children) and children:
+            row = np.zeros(len(nodes))
+            row[index[parent]] = 1.0
+            row[[index[c] for c in children]] -= 1.0
+            rows.append(row)
+
+    stores = sorted(set(nodes.loc[level == 'store', 'store']) | set(nodes.loc[level == 'store_family', 'store']))
+    families = sorted(set(nodes.loc[level == 'family', 'family']) | set(nodes.loc[level == 'store_family', 'family']))
+    add((-1, -1), [(s, -1) for s in stores])
+    add((-1, -1), [(-1, f) for f in families])
+    if (level == 'store_family').any():
+        for s in stores:
+            add((s, -1), [(s, f) for f in families])
+        for f in families:
+            add((-1, f), [(s, f) for s in stores])
+        if (-1, -1) in index:
+            add((-1, -1), [(s, f) for s in stores for f in families])
+    return np.array(rows).reshape(len(rows), len(nodes))
+
+
+def reconcile(nodes: pd.DataFrame, yhat: np.ndarray, half_width: np.ndarray, sigma: np.ndarray,
+              method: str = "mint"):
+    """
+    Make forecasts add up across the hierarchy.
+
+    Args:
+        nodes: Output of SalesCube.nodes()
+        yhat: [n_nodes, horizon] base forecasts
+        half_width: [n_nodes, horizon] base interval half-widths
+        sigma: [n_nodes] residual std per node (MinT weights)
+        method: 'mint' or 'bottom_up'
+
+    Returns:
+        (yhat, half_width) reconciled
+    """
+    level = nodes['level'].values
+    if method == "bottom_up":
+        bottom = np.flatnonzero(level == 'store_family')
+        if len(bottom) == 0:
+            raise ValueError("bottom_up reconciliation needs the store_family level")
+        store, family = nodes['store'].values, nodes['family'].values
+        out, width = yhat.copy(), half_width.copy()
+        for i in np.flatnonzero(level != 'store_family'):
+            children = bottom[((store[bottom] == store[i]) | (store[i] < 0)) & ((family[bottom] == family[i]) | (family[i] < 0))]
+            out[i] = yhat[children].sum(axis=0)
+            # Independent children: variances add
+            width[i] = np.sqrt((half_width[children] ** 2).sum(axis=0))
+        return out, width
+
+    if method != "mint":
+        raise ValueError(f"unknown reconciliation method {method!r} (expected one of {METHODS})")
+    C = constraint_matrix(nodes)
+    if len(C) == 0:
+        return yhat, half_width
+    # MinT: y~ = P y with P = I - W C' (C W C')^+ C and W = diag(sigma^2); zero-variance nodes stay fixed
+    w = np.maximum(sigma.astype(np.float64) ** 2, 0.0)
+    WCt = C.T * w[:, None]
+    M = WCt @ np.linalg.pinv(C @ WCt)
+    P = np.eye(len(w)) - M @ C
+    # Widths go through the same projection: with independent base errors (as in bottom_up)
+    # the reconciled variance of node i is sum_j P_ij^2 var_j, and widths scale with the std
+    width = np.sqrt((P ** 2) @ (half_width.astype(np.float64) ** 2))
+    return yhat - M @ (C @ yhat), width
+
+
+def stack_params(results: List[Dict]) -> Dict[str, np.ndarray]:
+    """Stack per-node parameter dicts into float32 arrays (NaN rows where Prophet was not fitted)."""
+    template = next((r['params'] for r in results if r['params'] is not None), None)
+    if template is None:
+        return {}
+    stacked = {}
+    for key, value in template.items():
+        shape = (len(results),) + np.shape(value)
+        arr = np.full(shape, np.nan, dtype=np.float64 if key in ('start', 'y_scale') else np.float32)
+        for i, r in enumerate(results):
+            if r['params'] is not None:
+                arr[i] = r['params'][key]
+        stacked[key] = arr
+    return stacked
+
+
+def save(path_forecast: Union[str, Path], path_params: Union[str, Path], nodes: pd.DataFrame,
+         cube: SalesCube, dates: np.ndarray, yhat: np.ndarray, half_width: np.ndarray, results: List[Dict],
+         method: str):
+    """Write the reconciled forecast and the stacked parameters."""
+    history = np.stack([cube.series(s, f)[-HISTORY_DAYS:] for s, f in zip(nodes['store'], nodes['family'])])
+    np.savez_compressed(
+        path_forecast,
+        nodes=nodes['node'].to_numpy(dtype=str), levels=nodes['level'].to_numpy(dtype=str),
+        dates=dates.astype('datetime64[D]'), method=np.array(method),
+        yhat=yhat.astype(np.float32),
+        yhat_lower=(yhat - half_width).astype(np.float32), yhat_upper=(yhat + half_width).astype(np.float32),
+        history_dates=cube.dates[-HISTORY_DAYS:], history=history.astype(np.float32),
+        status=np.array([r['status'] for r in results]),
+    )
+    np.savez_compressed(path_params, nodes=nodes['node'].to_numpy(dtype=str),
+                        status=np.array([r['status'] for r in results]), **stack_params(results))
+
+
+class HierarchyForecast:
+    """Read side of hierarchy_forecast.npz: look up any node's reconciled forecast."""
+
+    LABELS = {"total": "Company Total", "family": "Product Family", "store": "Store",
+              "store_family": "Store × Family"}
+
+    def __init__(self, data: Dict[str, np.ndarray]):
+        self.nodes = data['nodes']
+        self.levels = data['levels']
+        self.dates = data['dates']
+        self.method = str(data['method'])
+        self.yhat, self.yhat_lower, self.yhat_upper = data['yhat'], data['yhat_lower'], data['yhat_upper']
+        self.history_dates, self.history = data['history_dates'], data['history']
+        self._index = {name: i for i, name in enumerate(self.nodes)}
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = FORECAST_FILE) -> "HierarchyForecast":
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files})
+
+    def available_levels(self) -> List[str]:
+        return [level for level in LEVELS if (self.levels == level).any()]
+
+    def keys(self, level: str) -> List[str]:
+        """Node names on one level."""
+        return [str(node) for node in self.nodes[self.levels == level]]
+
+    def forecast(self, node: str, days: Optional[int] = None) -> pd.DataFrame:
+        """Reconciled forecast of one node (first `days` days of the horizon)."""
+        i = self._index[node]
+        days = days or len(self.dates)
+        return pd.DataFrame({
+            'ds': self.dates[:days].astype('datetime64[ns]'),
+            'yhat': self.yhat[i, :days],
+            'yhat_lower': self.yhat_lower[i, :days],
+            'yhat_upper': self.yhat_upper[i, :days],
+        })
+
+    def recent(self, node: str) -> pd.DataFrame:
+        """Last HISTORY_DAYS of actual sales for one node."""
+        return pd.DataFrame({'ds': self.history_dates.astype('datetime64[ns]'), 'y': self.history[self._index[node]]})
@@ -0,0 +1,257 @@
+"""
+Stream Load Generator
+Open-loop asyncio producer for finding where the feature processor saturates.
+
+Arrivals follow a target rate profile (constant, bursty or a compressed
+diurnal curve) regardless of how fast Redis answers: every tick adds the
+events the profile scheduled since the last tick to a credit, and whole
+events are cut into pipelined XADD batches sent concurrently, at most
+`concurrency` requests in flight. When the
+server falls behind, credit piles up and is sent as fast as the in-flight
+limit allows, and event latency is measured from the scheduled send time
+(not the actual one), so queueing delay shows up in the percentiles instead
+of being hidden.
+
+Targets: the Upstash REST API (async client), any redis:// server
+(redis.asyncio), or an in-process fakeredis TCP server for offline runs.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.event_pool import EventPool
+from utils.stream_batch import GROUP_NAME, STREAM_KEY
+
+PROFILES = ("constant", "bursty", "diurnal")
+# Scheduler resolution
+TICK_S = 0.01
+# Bursty profile: BURST_FACTOR x the mean rate for BURST_S out of every BURST_EVERY_S
+BURST_EVERY_S = float(os.getenv("LOAD_BURST_EVERY_S", "10"))
+BURST_S = float(os.getenv("LOAD_BURST_S", "2"))
+BURST_FACTOR = float(os.getenv("LOAD_BURST_FACTOR", "4"))
+# Diurnal profile: one simulated day every DAY_S seconds, trough at DIURNAL_LOW x the mean
+DAY_S = float(os.getenv("LOAD_DAY_S", "60"))
+DIURNAL_LOW = float(os.getenv("LOAD_DIURNAL_LOW", "0.2"))
+
+
+def expected_arrivals(profile: str, rate: float, t: float) -> float:
+    """
+    Events the profile has asked for in the first `t` seconds (every profile averages `rate`).
+
+    Integrating the rate keeps the schedule exact even when the loop was
+    blocked on backpressure for a while.
+
+    Args:
+        profile: constant (flat), bursty (BURST_FACTOR x for BURST_S of every
+            BURST_EVERY_S, the remainder of the mean in between) or diurnal
+            (cosine day of DAY_S seconds from a DIURNAL_LOW x trough)
+        rate: Mean events per second
+        t: Seconds since the start
+    """
+    if profile == "constant":
+        return rate * t
+    if profile == "bursty":
+        duty = BURST_S / BURST_EVERY_S
+        high = rate * BURST_FACTOR
+        # Quiet stretches carry whatever the bursts leave of the mean
+        low = max(rate * (1 - duty * BURST_FACTOR) / (1 - duty), 0.0)
+        cycles, into = divmod(t, BURST_EVERY_S)
+        per_cycle = high * BURST_S + low * (BURST_EVERY_S - BURST_S)
+        return cycles * per_cycle + high * min(into, BURST_S) + low * max(into - BURST_S, 0.0)
+    if profile == "diurnal":
+        # rate * (1 - (1 - low) * cos(2*pi*t / day)), integrated
+        swing = (1 - DIURNAL_LOW) * DAY_S / (2 * math.pi)
+        return rate * (t - swing * math.sin(2 * math.pi * t / DAY_S))
+    raise ValueError(f"unknown profile {profile!r}")
+
+
+class AsyncTarget:
+    """One XADD pipeline call shape over the Upstash async client or redis.asyncio."""
+
+    def __init__(self, client, rest: bool):
+        self.client = client
+        self.rest = rest
+
+    @classmethod
+    def upstash(cls, url: str, token: str) -> "AsyncTarget":
+        from upstash_redis.asyncio import Redis as AsyncRedis
+        return cls(AsyncRedis(url=url, token=token, allow_telemetry=False), rest=True)
+
+    @classmethod
+    def tcp(cls, url: str, max_connections: int) -> "AsyncTarget":
+        import redis.asyncio as redis_async
+        return cls(redis_async.Redis.from_url(url, decode_responses=True, max_connections=max_connections), rest=False)
+
+    async def pipeline(self, commands: List[List[str]]) -> List:
+        if self.rest:
+            pipe = self.client.pipeline()
+            for command in commands:
+                pipe.execute(command)
+            return await pipe.exec()
+        async with self.client.pipeline(transaction=False) as pipe:
+            for command in commands:
+                pipe.execute_command(*command)
+            return await pipe.execute()
+
+    async def execute(self, command: List[str]):
+        if self.rest:
+            return await self.client.execute(command)
+        return await self.client.execute_command(*command)
+
+    async def close(self):
+        if self.rest:
+            await self.client.close()
+        else:
+            await self.client.aclose()
+
+
+def start_fake_server(port: int) -> str:
+    """Serve an in-memory fakeredis on 127.0.0.1:`port` from a daemon thread; returns its URL."""
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError as e:
+        raise SystemExit("--fake-server needs fakeredis (pip install fakeredis)") from e
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+async def group_lag(target: AsyncTarget, stream_key: str = STREAM_KEY, group: str = GROUP_NAME) -> Optional[int]:
+    """Entries the consumer group has not read yet (XINFO GROUPS 'lag'; None if unknown)."""
+    try:
+        groups = await target.execute(["XINFO", "GROUPS", stream_key])
+    except Exception:
+        return None
+    for info in groups or []:
+        if isinstance(info, list):
+            info = dict(zip(info[0::2], info[1::2]))
+        if info.get("name") == group:
+            lag = info.get("lag")
+            return int(lag) if lag is not None else None
+    return None
+
+
+def _weighted_percentiles(values: np.ndarray, weights: np.ndarray, quantiles) -> List[float]:
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return [float(values[order][np.searchsorted(cumulative, q * cumulative[-1])]) for q in quantiles]
+
+
+class LoadStats:
+    """Per-request latencies plus event counts, for rate and percentile reporting."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.request_ms: List[float] = []
+        self.event_ms: List[float] = []
+        self.batch_events: List[int] = []
+        self.sent = 0
+        self.errors = 0
+        self.first_error: Optional[str] = None
+
+    def record(self, events: int, request_ms: float, event_ms: float):
+        self.request_ms.append(request_ms)
+        self.event_ms.append(event_ms)
+        self.batch_events.append(events)
+        self.sent += events
+
+    def fail(self, events: int, error: Exception):
+        self.errors += events
+        self.first_error = self.first_error or repr(error)
+
+    def summary(self, seconds: float, target_events: int) -> Dict:
+        """Totals and latency percentiles as a flat dict."""
+        out = {"seconds": round(seconds, 3), "target_events": target_events, "sent_events": self.sent,
+               "failed_events": self.errors, "requests": len(self.request_ms),
+               "achieved_rate": round(self.sent / seconds, 1) if seconds > 0 else 0.0}
+        if self.request_ms:
+            request = np.percentile(self.request_ms, [q * 100 for q in self.QUANTILES])
+            event = _weighted_percentiles(np.array(self.event_ms), np.array(self.batch_events), self.QUANTILES)
+            for q, r, e in zip(self.QUANTILES, request, event):
+                out[f"request_ms_p{int(q * 100)}"] = round(float(r), 2)
+                out[f"event_ms_p{int(q * 100)}"] = round(e, 2)
+            out["request_ms_max"] = round(max(self.request_ms), 2)
+        return out
+
+
+async def run(target: AsyncTarget, pool: EventPool, rate: float, duration: float,
+              profile: str = "constant", batch_size: int = 100, concurrency: int = 16,
+              report_every: float = 5.0, maxlen: int = 0, seed: Optional[int] = None,
+              stream_key: str = STREAM_KEY) -> Dict:
+    """
+    Drive the stream at the profile's rate for `duration` seconds.
+
+    Args:
+        target: Where to XADD
+        pool: Event source (sampled per batch in one vectorized draw)
+        rate: Mean events per second
+        duration: Seconds of arrivals (in-flight requests are awaited afterwards)
+        profile: constant, bursty or diurnal
+        batch_size: Most XADDs per pipelined request
+        concurrency: Most requests in flight
+        report_every: Seconds between progress lines (0 disables them)
+        maxlen: Approximate stream cap (XADD MAXLEN ~); 0 leaves the stream untrimmed
+        seed: Sampling seed
+
+    Returns:
+        LoadStats.summary() plus the final consumer-group lag
+    """
+    stats = LoadStats()
+    rng = np.random.default_rng(seed)
+    today = datetime.now().strftime("%Y-%m-%d")
+    slots = asyncio.Semaphore(concurrency)
+    in_flight = set()
+    trim = ["MAXLEN", "~", str(maxlen)] if maxlen else []
+
+    async def send(fields: List[List[str]], scheduled: float):
+        try:
+            sent_at = time.perf_counter()
+            await target.pipeline([["XADD", stream_key] + trim + ["*"] + f for f in fields])
+            done = time.perf_counter()
+            stats.record(len(fields), (done - sent_at) * 1000, (done - scheduled) * 1000)
+        except Exception as e:
+            stats.fail(len(fields), e)
+        finally:
+            slots.release()
+
+    start = time.perf_counter()
+    last = start
+    window_start, window_sent, window_target = start, 0, 0
+    credit, target_events = 0.0, 0
+    while (now := time.perf_counter()) - start < duration:
+        scheduled = last
+        credit += expected_arrivals(profile, rate, now - start) - expected_arrivals(profile, rate, last - start)
+        last = now
+        while credit >= 1:
+            n = min(int(credit), batch_size)
+            credit -= n
+            target_events += n
+            # Backpressure: waits here while `concurrency` requests are outstanding
+            await slots.acquire()
+            task = asyncio.create_task(send(pool.xadd_fields(n, rng, today), scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if report_every and now - window_start >= report_every:
+            lag = await group_lag(target, stream_key)
+            window = now - window_start
+            print(f"  ⏱️ t={now - start:5.1f}s target {(target_events - window_target) / window:8,.0f}/s "
+                  f"achieved {(stats.sent - window_sent) / window:8,.0f}/s | in flight {len(in_flight)}"
+                  + (f" | group lag {lag:,}" if lag is not None else ""))
+            window_start, window_sent, window_target = now, stats.sent, target_events
+        await asyncio.sleep(TICK_S)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    summary = stats.summary(time.perf_counter() - start, target_events)
+    summary["group_lag"] = await group_lag(target, stream_key)
+    if stats.first_error:
+        summary["first_error"] = stats.first_error
+    return summary
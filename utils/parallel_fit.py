@@ -0,0 +1,143 @@
+"""
+Parallel Fit Scheduler
+Runs independent model fits in separate worker processes, each inside its own
+MLflow child run and pinned to its own share of the CPU cores, so a pipeline
+run takes roughly as long as its slowest fit.
+
+Workers are spawned (not forked): they start without the parent's active
+MLflow run or OpenMP state. The child run is linked to the parent through the
+mlflow.parentRunId tag, which is what a nested start_run() would set.
+
+Job arguments are pickled into the worker, so a job over a large frame is
+marked `local`: it runs in this process while the workers run, instead of
+copying the frame into a second process.
+"""
+
+import inspect
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import mlflow
+
+
+class FitJob:
+    """
+    One independent fit: `fn(**kwargs)` executed inside an MLflow child run named `name`.
+
+    `fn` also gets `cores=<budget>` when its signature has a `cores` parameter (thread-count
+    knobs like n_jobs); single-threaded fits can leave it out.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Dict], kwargs: Optional[Dict] = None, cores: Optional[int] = None,
+                 local: bool = False):
+        """
+        Args:
+            name: MLflow child run name (also the key of the result)
+            fn: Module-level function returning a dict of results (must be picklable)
+            kwargs: Arguments for `fn` (pickled into the worker unless `local`)
+            cores: Fixed core budget; None shares whatever the fixed jobs leave over
+            local: Run in the calling process alongside the workers (no copy of `kwargs`)
+        """
+        self.name = name
+        self.fn = fn
+        self.kwargs = kwargs or {}
+        self.cores = cores
+        self.local = local
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def plan_cores(jobs: List[FitJob], cpus: List[int]) -> Dict[str, List[int]]:
+    """
+    Split CPUs into disjoint per-job sets.
+
+    Fixed budgets are served first and the remaining cores are shared evenly by
+    the other jobs. With fewer cores than jobs every job gets every core.
+    """
+    fixed = sum(job.cores for job in jobs if job.cores)
+    flexible = [job for job in jobs if not job.cores]
+    if fixed + len(flexible) > len(cpus):
+        return {job.name: list(cpus) for job in jobs}
+
+    spare = len(cpus) - fixed
+    plan, offset = {}, 0
+    for job in jobs:
+        if job.cores:
+            n = job.cores
+        else:
+            i = flexible.index(job)
+            n = spare // len(flexible) + (1 if i < spare % len(flexible) else 0)
+        plan[job.name] = list(cpus[offset:offset + n])
+        offset += n
+    return plan
+
+
+def _run_child(job: FitJob, cpus: List[int], parent_run_id: str, experiment_id: str, pin: bool) -> Dict:
+    """Execute one job inside its MLflow child run (in a worker or in-process)."""
+    if pin and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError:
+            pass
+
+    start = time.perf_counter()
+    with mlflow.start_run(run_name=job.name, experiment_id=experiment_id,
+                          tags={"mlflow.parentRunId": parent_run_id},
+                          nested=mlflow.active_run() is not None) as run:
+        mlflow.log_param("cores", len(cpus))
+        kwargs = dict(job.kwargs)
+        if "cores" in inspect.signature(job.fn).parameters:
+            kwargs["cores"] = len(cpus)
+        result = dict(job.fn(**kwargs))
+        seconds = time.perf_counter() - start
+        mlflow.log_metric("fit_seconds", round(seconds, 3))
+
+    result["run_id"] = run.info.run_id
+    result["seconds"] = seconds
+    return result
+
+
+def run_jobs(jobs: List[FitJob], parent_run_id: str, experiment_id: str,
+             parallel: Optional[bool] = None) -> Dict[str, Dict]:
+    """
+    Run every job and wait for all of them.
+
+    Args:
+        jobs: Independent fits
+        parent_run_id: MLflow run the child runs hang off
+        experiment_id: Experiment of the parent run
+        parallel: Use worker processes (falls back to in-process on a single core); default
+            from TRAIN_PARALLEL (0 runs the jobs one after another in this process), read here
+            so a .env loaded after import still applies
+
+    Returns:
+        {job name: fn result + run_id + seconds}
+    """
+    if parallel is None:
+        parallel = os.getenv("TRAIN_PARALLEL", "1") != "0"
+    cpus = available_cores()
+    plan = plan_cores(jobs, cpus)
+
+    if not parallel or len(jobs) < 2 or len(cpus) < 2:
+        return {job.name: _run_child(job, plan[job.name], parent_run_id, experiment_id, pin=False) for job in jobs}
+
+    print(f"  🧵 Running {len(jobs)} fits in parallel on {len(cpus)} cores: "
+          + ", ".join(f"{job.name}={len(plan[job.name])}{' (local)' if job.local else ''}" for job in jobs))
+    workers = [job for job in jobs if not job.local]
+    with ProcessPoolExecutor(max_workers=max(len(workers), 1), mp_context=mp.get_context("spawn")) as pool:
+        futures = {job.name: pool.submit(_run_child, job, plan[job.name], parent_run_id, experiment_id, True)
+                   for job in workers}
+        # Local jobs keep this process's affinity; their core budget is passed to the fit as `cores`
+        results = {job.name: _run_child(job, plan[job.name], parent_run_id, experiment_id, pin=False)
+                   for job in jobs if job.local}
+        results.update((name, future.result()) for name, future in futures.items())
+    return {job.name: results[job.name] for job in jobs}
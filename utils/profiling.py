@@ -0,0 +1,107 @@
+"""
+Stage Profiler
+Wall-clock time and peak resident memory (RSS) for each pipeline stage.
+"""
+
+import gc
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+_STATUS = Path("/proc/self/status")
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+# Peak RSS carried over for every open stage (any StageProfiler in this process), innermost last
+_open_peaks: List[List[float]] = []
+
+
+def _status_mb(field: str) -> float:
+    """Read a kB field (VmRSS, VmHWM) from /proc/self/status."""
+    for line in _STATUS.read_text().splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process right now, in MB."""
+    try:
+        return _status_mb("VmRSS")
+    except (OSError, KeyError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size since the last reset (or process start), in MB."""
+    try:
+        return _status_mb("VmHWM")
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and kB on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS watermark so the next reading covers one stage only."""
+    try:
+        _CLEAR_REFS.write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageProfiler:
+    """Records duration and peak RSS for named stages."""
+
+    def __init__(self, verbose: bool = True):
+        self.verbose = verbose
+        self.stages: List[Dict] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Profile the enclosed block.
+
+        Args:
+            name: Stage name used in the report and metric keys
+        """
+        gc.collect()
+        rss_before = current_rss_mb()
+        if _open_peaks:
+            # Nested stage: the reset below would drop the enclosing stages' peak so far
+            peak = peak_rss_mb()
+            for outer in _open_peaks:
+                outer[0] = max(outer[0], peak)
+        isolated = reset_peak_rss()
+        carried = [0.0]
+        _open_peaks.append(carried)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            # Stages close innermost first
+            _open_peaks.pop()
+            record = {
+                "stage": name,
+                "seconds": seconds,
+                "rss_before_mb": rss_before,
+                "rss_after_mb": current_rss_mb(),
+                # Without a resettable watermark this is the process-wide peak so far
+                "peak_rss_mb": max(peak_rss_mb(), carried[0]),
+                "peak_isolated": isolated,
+            }
+            self.stages.append(record)
+            if self.verbose:
+                print(f"  📏 {name}: {seconds:.1f}s | RSS {record['rss_after_mb']:,.0f} MB | peak {record['peak_rss_mb']:,.0f} MB")
+
+    def as_metrics(self) -> Dict[str, float]:
+        """Flatten recorded stages into MLflow-friendly metric names."""
+        metrics = {}
+        for record in self.stages:
+            key = record["stage"].replace(" ", "_").replace(".", "_").lower()
+            metrics[f"{key}_seconds"] = round(record["seconds"], 3)
+            metrics[f"{key}_peak_rss_mb"] = round(record["peak_rss_mb"], 1)
+        return metrics
@@ -0,0 +1,205 @@
+"""
+NumPy Prophet Inference
+Evaluates a fitted Prophet model from its exported parameters, so the
+dashboard can forecast without importing Prophet / cmdstan or unpickling the
+model.
+
+Supported: linear growth, Fourier seasonalities, extra regressors (additive or
+multiplicative), MAP fits. yhat is reproduced exactly. Future yhat_lower /
+yhat_upper are simulated the same way as Prophet's vectorized predict() (random
+future trend changes + observation noise), so they match within sampling
+error; inside the history only the noise is random and its quantiles are
+computed in closed form.
+"""
+
+import json
+from statistics import NormalDist
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+PARAMS_FILE = "long_term_forecast.json"
+HISTORY_TAIL = 60
+
+_EPOCH = pd.Timestamp("1970-01-01")
+
+
+def export_params(m) -> Dict:
+    """
+    Extract everything predict() needs from a fitted Prophet model.
+
+    Args:
+        m: Fitted prophet.Prophet
+
+    Returns:
+        JSON-serializable parameter dict
+    """
+    if m.growth != "linear":
+        raise ValueError(f"only linear growth is supported (got {m.growth!r})")
+    if m.params['k'].shape[0] != 1:
+        raise ValueError("only MAP fits are supported (mcmc_samples=0)")
+    if m.holidays is not None or m.country_holidays is not None:
+        raise ValueError("built-in holidays are not supported; pass them as extra regressors")
+    if any(s['condition_name'] is not None for s in m.seasonalities.values()):
+        raise ValueError("conditional seasonalities are not supported")
+
+    seasonalities = [{'name': name, 'period': float(s['period']), 'fourier_order': int(s['fourier_order']),
+                      'mode': s['mode']} for name, s in m.seasonalities.items()]
+    regressors = [{'name': name, 'mu': float(r['mu']), 'std': float(r['std']), 'mode': r['mode']}
+                  for name, r in m.extra_regressors.items()]
+    beta = m.params['beta'][0]
+    if len(beta) != sum(2 * s['fourier_order'] for s in seasonalities) + len(regressors):
+        raise ValueError("unexpected feature layout (beta does not match seasonalities + regressors)")
+
+    history = m.history.iloc[-HISTORY_TAIL:]
+    return {
+        'k': float(m.params['k'][0, 0]),
+        'm': float(m.params['m'][0, 0]),
+        'delta': m.params['delta'][0].tolist(),
+        'sigma_obs': float(m.params['sigma_obs'][0, 0]),
+        'beta': beta.tolist(),
+        'changepoints_t': np.asarray(m.changepoints_t).tolist(),
+        'y_scale': float(m.y_scale),
+        'floor': 0.0,
+        'start': m.start.isoformat(),
+        't_scale_days': m.t_scale / pd.Timedelta(days=1),
+        'history_start': m.history['ds'].min().isoformat(),
+        'history_end': m.history['ds'].max().isoformat(),
+        'history_t_step': float(np.diff(m.history['t']).mean()),
+        'seasonalities': seasonalities,
+        'regressors': regressors,
+        'interval_width': float(m.interval_width),
+        'uncertainty_samples': int(m.uncertainty_samples or 0),
+        'history_tail': {'ds': history['ds'].dt.strftime('%Y-%m-%d').tolist(), 'y': history['y'].tolist()},
+    }
+
+
+def export(m, path: Union[str, Path] = PARAMS_FILE) -> Dict:
+    """Write export_params(m) as JSON and return it."""
+    params = export_params(m)
+    with open(path, "w") as f:
+        json.dump(params, f)
+    return params
+
+
+class NumpyProphet:
+    """Prophet predict() re-implemented over exported parameters."""
+
+    def __init__(self, params: Dict):
+        self.params = params
+        self.k, self.m = params['k'], params['m']
+        self.delta = np.asarray(params['delta'])
+        self.changepoints_t = np.asarray(params['changepoints_t'])
+        self.beta = np.asarray(params['beta'])
+        self.y_scale, self.floor = params['y_scale'], params['floor']
+        self.start = pd.Timestamp(params['start'])
+        self.t_scale_days = params['t_scale_days']
+        self.seasonalities = params['seasonalities']
+        self.regressors = params['regressors']
+
+        # Per-feature mode flags, in Prophet's column order (seasonalities, then regressors)
+        modes = [s['mode'] for s in self.seasonalities for _ in range(2 * s['fourier_order'])]
+        modes += [r['mode'] for r in self.regressors]
+        self.additive = np.array([mode == 'additive' for mode in modes], dtype=np.float64)
+        self.multiplicative = 1.0 - self.additive
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = PARAMS_FILE) -> "NumpyProphet":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def history(self) -> pd.DataFrame:
+        """Last HISTORY_TAIL training points (ds, y)."""
+        tail = self.params['history_tail']
+        return pd.DataFrame({'ds': pd.to_datetime(tail['ds']), 'y': tail['y']})
+
+    def future_dates(self, periods: int, include_history: bool = True) -> pd.DatetimeIndex:
+        """Daily dates like Prophet.make_future_dataframe(periods)."""
+        end = pd.Timestamp(self.params['history_end'])
+        future = pd.date_range(end + pd.Timedelta(days=1), periods=periods, freq='D')
+        if not include_history:
+            return future
+        return pd.date_range(pd.Timestamp(self.params['history_start']), end, freq='D').append(future)
+
+    def _features(self, ds: pd.DatetimeIndex, regressors: Dict) -> np.ndarray:
+        """Seasonality + standardized regressor matrix in the fitted column order."""
+        days = ((ds - _EPOCH) / pd.Timedelta(days=1)).values.astype(np.float64)
+        columns = []
+        for s in self.seasonalities:
+            order = np.arange(1, s['fourier_order'] + 1)
+            angle = 2 * np.pi * days[:, None] * order[None, :] / s['period']
+            block = np.empty((len(days), 2 * len(order)))
+            block[:, 0::2] = np.sin(angle)
+            block[:, 1::2] = np.cos(angle)
+            columns.append(block)
+        for r in self.regressors:
+            if r['name'] not in regressors:
+                raise ValueError(f"missing regressor {r['name']!r}")
+            values = np.broadcast_to(np.asarray(regressors[r['name']], dtype=np.float64), days.shape)
+            columns.append(((values - r['mu']) / r['std'])[:, None])
+        return np.hstack(columns) if columns else np.zeros((len(days), 0))
+
+    def _trend(self, t: np.ndarray) -> np.ndarray:
+        """Piecewise-linear trend (scaled units)."""
+        active = (self.changepoints_t[None, :] <= t[:, None]) * self.delta
+        return (self.k + active.sum(axis=1)) * t + (self.m + (active * -self.changepoints_t).sum(axis=1))
+
+    def _trend_uncertainty(self, t: np.ndarray, n_samples: int, rng: np.random.Generator) -> np.ndarray:
+        """Random future slope changes (Prophet's vectorized _sample_uncertainty), scaled units."""
+        out = np.zeros((n_samples, len(t)))
+        future = t > 1
+        n_future = int(future.sum())
+        if n_future == 0:
+            return out
+        step = np.diff(t[future]).mean() if n_future > 1 else self.params['history_t_step']
+        likelihood = len(self.changepoints_t) * step
+        mean_delta = np.mean(np.abs(self.delta)) + 1e-8
+
+        change = rng.uniform(size=(n_samples, n_future)) < likelihood
+        shifts = rng.laplace(0, mean_delta, size=change.shape) * change
+        shifts = (np.hstack([np.zeros((n_samples, 1)), shifts])[:, :-1] + shifts) / 2
+        out[:, future] = shifts.cumsum(axis=1).cumsum(axis=1) * step
+        return out
+
+    def predict(self, ds, regressors: Optional[Dict] = None, n_samples: Optional[int] = None,
+                seed: Optional[int] = 0) -> pd.DataFrame:
+        """
+        Forecast for arbitrary dates and regressor values.
+
+        Args:
+            ds: Dates to forecast (sorted, like Prophet's future dataframe)
+            regressors: {name: scalar or array aligned with ds}
+            n_samples: Uncertainty draws (default: the model's uncertainty_samples; 0 skips intervals)
+            seed: RNG seed for reproducible intervals (None for fresh draws)
+
+        Returns:
+            DataFrame with ds, trend, yhat, yhat_lower, yhat_upper
+        """
+        ds = pd.DatetimeIndex(pd.to_datetime(ds))
+        t = ((ds - self.start) / pd.Timedelta(days=1)).values.astype(np.float64) / self.t_scale_days
+        X = self._features(ds, regressors or {})
+        additive = X @ (self.beta * self.additive) * self.y_scale
+        multiplicative = X @ (self.beta * self.multiplicative)
+
+        trend = self._trend(t) * self.y_scale + self.floor
+        out = pd.DataFrame({'ds': ds, 'trend': trend, 'yhat': trend * (1 + multiplicative) + additive})
+
+        n_samples = self.params['uncertainty_samples'] if n_samples is None else n_samples
+        if n_samples:
+            width = self.params['interval_width']
+            noise_sd = self.params['sigma_obs'] * self.y_scale
+            # Inside the history the trend is fixed, so the interval is yhat plus normal noise quantiles
+            z = NormalDist().inv_cdf((1 + width) / 2)
+            lower, upper = out['yhat'].values - z * noise_sd, out['yhat'].values + z * noise_sd
+
+            future = t > 1
+            if future.any():
+                rng = np.random.default_rng(seed)
+                base = self._trend(t[future])[None, :] + self._trend_uncertainty(t, n_samples, rng)[:, future]
+                trends = base * self.y_scale + self.floor
+                sims = trends * (1 + multiplicative[future]) + additive[future] + rng.normal(0, noise_sd, trends.shape)
+                lower[future], upper[future] = np.percentile(sims, [100 * (1 - width) / 2, 100 * (1 + width) / 2], axis=0)
+            out['yhat_lower'], out['yhat_upper'] = lower, upper
+        return out
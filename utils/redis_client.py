@@ -0,0 +1,320 @@
+"""
+Redis Client
+One client API over two backends, picked with REDIS_BACKEND:
+
+    upstash   Upstash REST API over one kept-alive, pooled httpx session with
+              connect / read timeouts; pipelines go to /pipeline and MULTI/EXEC
+              blocks to /multi-exec, one HTTP request each
+    tcp       redis-py over a connection pool (REDIS_URL), for a local or
+              self-hosted server without the HTTP overhead
+
+Both speak the call style the pipeline code is written against:
+`execute([...])`, `multi()` / `pipeline()` + `exec()`, raw RESP replies, plus
+the few high-level operations it needs (stream append / read / ack,
+increments, bulk get / set).
+
+Transient failures (connection errors, timeouts, HTTP 429 / 5xx) are retried
+with full-jitter exponential backoff. Commands that must not run twice
+(increments, XADD, EVAL, and any batch containing one) are only retried when
+the request never reached the server, so a lost reply cannot double-count.
+"""
+
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+# Settings are read from the environment when used, not at import, so entry
+# points can load_dotenv() after importing utils:
+#   REDIS_BACKEND            "upstash" (REST) or "tcp" (redis-py)
+#   REDIS_URL                TCP server, local by default so the TCP backend can run offline
+#   REDIS_TIMEOUT_S / REDIS_CONNECT_TIMEOUT_S
+#   REDIS_MAX_CONNECTIONS    pooled connections (TCP) / kept-alive HTTP connections (REST) per client
+#   REDIS_RETRIES            retries after the first attempt; backoff is
+#                            uniform(0, min(REDIS_BACKOFF_CAP_S, REDIS_BACKOFF_BASE_S * 2**attempt))
+DEFAULT_URL = "redis://localhost:6379/0"
+
+
+def configured_backend() -> str:
+    return os.getenv("REDIS_BACKEND", "upstash")
+
+
+def redis_url() -> str:
+    return os.getenv("REDIS_URL", DEFAULT_URL)
+
+
+def _timeouts():
+    """(read, connect) timeouts in seconds."""
+    return float(os.getenv("REDIS_TIMEOUT_S", "10")), float(os.getenv("REDIS_CONNECT_TIMEOUT_S", "5"))
+
+
+def _max_connections() -> int:
+    return int(os.getenv("REDIS_MAX_CONNECTIONS", "16"))
+
+
+def _retries() -> int:
+    return int(os.getenv("REDIS_RETRIES", "3"))
+
+
+# Not safe to repeat after an ambiguous failure (the first attempt may have been applied)
+NON_IDEMPOTENT = frozenset({
+    "INCR", "INCRBY", "INCRBYFLOAT", "DECR", "DECRBY", "HINCRBY", "HINCRBYFLOAT", "APPEND",
+    "LPUSH", "RPUSH", "XADD", "EVAL", "EVALSHA", "RENAME", "RENAMENX",
+})
+
+
+class RedisCommandError(Exception):
+    """The server rejected a command (REST backend; the TCP backend raises redis-py's errors)."""
+
+
+def backoff_s(attempt: int) -> float:
+    """Full-jitter delay before retry number `attempt` (0-based)."""
+    cap = float(os.getenv("REDIS_BACKOFF_CAP_S", "2"))
+    base = float(os.getenv("REDIS_BACKOFF_BASE_S", "0.05"))
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def repeatable(commands: Iterable[List]) -> bool:
+    return all(str(command[0]).upper() not in NON_IDEMPOTENT for command in commands)
+
+
+class Commands(ABC):
+    """High-level operations, spelled as raw commands so they go through execute() (and its retries)."""
+
+    @abstractmethod
+    def execute(self, command: List) -> Any:
+        """Run (or, in a batch, queue) one command given as a list."""
+
+    def set(self, key: str, value: str, ex: Optional[int] = None):
+        return self.execute(["SET", key, value] + (["EX", str(ex)] if ex else []))
+
+    def hset(self, key: str, mapping: Dict[str, Any]):
+        return self.execute(["HSET", key] + [str(v) for item in mapping.items() for v in item])
+
+    def hincrbyfloat(self, key: str, field: str, amount: float):
+        return self.execute(["HINCRBYFLOAT", key, field, repr(float(amount))])
+
+    def incrbyfloat(self, key: str, amount: float):
+        return self.execute(["INCRBYFLOAT", key, repr(float(amount))])
+
+    def expireat(self, key: str, timestamp: int):
+        return self.execute(["EXPIREAT", key, str(int(timestamp))])
+
+    def delete(self, *keys: str):
+        return self.execute(["DEL", *keys])
+
+    def xadd(self, stream: str, fields: List[str], maxlen: Optional[int] = None):
+        """Append one entry ([field, value, ...]); `maxlen` caps the stream approximately."""
+        return self.execute(["XADD", stream] + (["MAXLEN", "~", str(maxlen)] if maxlen else []) + ["*"] + fields)
+
+    def xack(self, stream: str, group: str, *ids: str):
+        return self.execute(["XACK", stream, group, *ids])
+
+
+class Client(Commands):
+    """Backend-independent part: retries, batches and the read helpers."""
+
+    # Requests sent, retries included (round-trip accounting for benchmarks)
+    requests = 0
+
+    @abstractmethod
+    def _send(self, commands: List[List], transaction: Optional[bool]) -> Any:
+        """One request: a single command (transaction None) or a pipeline / MULTI block."""
+
+    @abstractmethod
+    def _never_sent(self, error: Exception) -> bool:
+        """True if the request failed before reaching the server."""
+
+    @abstractmethod
+    def _transient(self, error: Exception) -> bool:
+        """True if the request is worth retrying (connection errors, timeouts, overload)."""
+
+    def _call(self, commands: List[List], transaction: Optional[bool]) -> Any:
+        safe = repeatable(commands)
+        retries = _retries()
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                return self._send(commands, transaction)
+            except Exception as e:
+                if attempt >= retries or not self._transient(e) or not (safe or self._never_sent(e)):
+                    raise
+                time.sleep(backoff_s(attempt))
+                attempt += 1
+
+    def execute(self, command: List) -> Any:
+        """Run one command given as a list, e.g. ["XACK", stream, group, id]."""
+        return self._call([command], None)
+
+    def multi(self) -> "Batch":
+        """Transactional batch (MULTI/EXEC), sent in one request by exec()."""
+        return Batch(self, transaction=True)
+
+    def pipeline(self) -> "Batch":
+        """Non-transactional batch, also sent in one request by exec()."""
+        return Batch(self, transaction=False)
+
+    def ping(self) -> bool:
+        return self.execute(["PING"]) in ("PONG", True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.execute(["GET", key])
+
+    def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return self.execute(["MGET"] + list(keys)) if keys else []
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        raw = self.execute(["HGETALL", key]) or []
+        return dict(zip(raw[0::2], raw[1::2])) if isinstance(raw, list) else raw
+
+    def hkeys(self, key: str) -> List[str]:
+        return self.execute(["HKEYS", key]) or []
+
+    def smembers(self, key: str) -> List[str]:
+        return list(self.execute(["SMEMBERS", key]) or [])
+
+    def xreadgroup(self, group: str, consumer: str, stream: str, count: int, block_ms: Optional[int] = None,
+                   entry_id: str = ">") -> List:
+        """New (or, with an entry_id, pending) entries as [[msg_id, [field, value, ...]], ...]."""
+        command = ["XREADGROUP", "GROUP", group, consumer, "COUNT", str(count)]
+        if block_ms is not None:
+            command += ["BLOCK", str(block_ms)]
+        response = self.execute(command + ["STREAMS", stream, entry_id])
+        return response[0][1] if response else []
+
+
+class Batch(Commands):
+    """Commands queued by execute() / the helpers and sent together by exec()."""
+
+    def __init__(self, client: Client, transaction: bool):
+        self.client = client
+        self.transaction = transaction
+        self.commands: List[List] = []
+
+    def execute(self, command: List) -> "Batch":
+        self.commands.append(command)
+        return self
+
+    def exec(self) -> List[Any]:
+        if not self.commands:
+            return []
+        return self.client._call(self.commands, self.transaction)
+
+
+class RestRedis(Client):
+    """Upstash REST backend over one pooled, kept-alive httpx session."""
+
+    def __init__(self, url: Optional[str] = None, token: Optional[str] = None,
+                 max_connections: Optional[int] = None):
+        """
+        Args:
+            url: UPSTASH_REDIS_REST_URL (default: from the environment)
+            token: UPSTASH_REDIS_REST_TOKEN (default: from the environment)
+            max_connections: Kept-alive HTTP connections (default: REDIS_MAX_CONNECTIONS)
+        """
+        max_connections = max_connections or _max_connections()
+        timeout, connect_timeout = _timeouts()
+        self.url = (url or os.getenv("UPSTASH_REDIS_REST_URL") or "").rstrip("/")
+        self.session = httpx.Client(
+            headers={"Authorization": f"Bearer {token or os.getenv('UPSTASH_REDIS_REST_TOKEN')}"},
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @staticmethod
+    def _result(reply: Dict) -> Any:
+        if "error" in reply:
+            raise RedisCommandError(reply["error"])
+        return reply.get("result")
+
+    def _send(self, commands: List[List], transaction: Optional[bool]) -> Any:
+        body = [[str(arg) for arg in command] for command in commands]
+        if transaction is None:
+            response = self.session.post(self.url, json=body[0])
+        else:
+            response = self.session.post(f"{self.url}/{'multi-exec' if transaction else 'pipeline'}", json=body)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        reply = response.json()
+        if transaction is None or isinstance(reply, dict):
+            # A rejected MULTI block comes back as one {"error": ...}
+            return self._result(reply)
+        return [self._result(item) for item in reply]
+
+    def _never_sent(self, error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            # Rate-limited requests are rejected before they run
+            return error.response.status_code == 429
+        return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+    def _transient(self, error: Exception) -> bool:
+        return isinstance(error, (httpx.TransportError, httpx.HTTPStatusError))
+
+    def close(self):
+        self.session.close()
+
+
+class TcpRedis(Client):
+    """redis-py backend over a connection pool, returning raw replies like the REST API's."""
+
+    def __init__(self, url: Optional[str] = None, max_connections: Optional[int] = None, **kwargs):
+        """
+        Args:
+            url: redis:// or rediss:// URL (default: REDIS_URL)
+            max_connections: Pool size (default: REDIS_MAX_CONNECTIONS)
+            **kwargs: Extra redis.Redis options (health_check_interval, ...)
+        """
+        import redis as redis_py
+        from redis.backoff import NoBackoff
+        from redis.retry import Retry
+
+        self._errors = redis_py.exceptions
+        timeout, connect_timeout = _timeouts()
+        # Retries are ours (jittered, idempotency-aware), so redis-py's own are off
+        self.client = redis_py.Redis.from_url(
+            url or redis_url(), decode_responses=True, protocol=2,
+            max_connections=max_connections or _max_connections(),
+            socket_timeout=timeout, socket_connect_timeout=connect_timeout,
+            retry=Retry(NoBackoff(), 0), **kwargs)
+        # No reply parsing: XREADGROUP / XAUTOCLAIM / XPENDING come back as nested lists
+        self.client.response_callbacks.clear()
+
+    def _send(self, commands: List[List], transaction: Optional[bool]) -> Any:
+        if transaction is None:
+            return self.client.execute_command(*commands[0])
+        with self.client.pipeline(transaction=transaction) as pipe:
+            for command in commands:
+                pipe.execute_command(*command)
+            return pipe.execute()
+
+    def _never_sent(self, error: Exception) -> bool:
+        # redis-py words every connect-phase failure as "... connecting to ..."
+        return isinstance(error, self._errors.ConnectionError) and "connecting to" in str(error)
+
+    def _transient(self, error: Exception) -> bool:
+        return isinstance(error, (self._errors.ConnectionError, self._errors.TimeoutError))
+
+    def close(self):
+        self.client.close()
+
+
+def connect(backend: Optional[str] = None, url: Optional[str] = None, **kwargs) -> Client:
+    """
+    Client for the configured backend.
+
+    Args:
+        backend: "upstash" or "tcp" (default: REDIS_BACKEND; a redis:// `url` implies tcp)
+        url: REST URL or redis:// URL (default: UPSTASH_REDIS_REST_URL / REDIS_URL)
+        **kwargs: Backend options (max_connections, and redis.Redis options for tcp)
+    """
+    if backend is None:
+        backend = "tcp" if url and url.startswith(("redis://", "rediss://", "unix://")) else configured_backend()
+    if backend == "tcp":
+        return TcpRedis(url, **kwargs)
+    if backend == "upstash":
+        return RestRedis(url, **kwargs)
+    raise ValueError(f"unknown REDIS_BACKEND {backend!r} (expected 'upstash' or 'tcp')")
@@ -0,0 +1,173 @@
+"""
+Rollup Cube
+Pre-aggregated sales over store × family × promo flag per day / week / month,
+with sum, count, min and max in every cell.
+
+Each period is one hash, feature:cube_{period}:{period_id}. Every event updates
+all 8 roll-ups of its cell (each dimension either kept or replaced by "*"), so
+any slice or roll-up is a fixed set of fields:
+
+    store 5, promo, all families   →  5|*|1
+    every family, all stores       →  *|{family}|*  for each family
+
+query() asks for exactly those fields with one HMGET, so its cost is O(cells
+returned). Cells of a batch are merged in memory and applied by one Lua call
+per hash (min / max need a compare-and-set); the hashes expire with the same
+retention as utils/aggregates.py. Dimension members are kept in small sets so
+"each store" / "each family" queries can be expanded without scanning.
+"""
+
+from datetime import date
+from itertools import product
+from typing import Dict, List, Tuple
+
+from utils import aggregates
+
+DIMENSIONS = ("store", "family", "promo")
+STATS = ("sum", "count", "min", "max")
+ALL = "*"
+# Query value meaning "one result per member" (group by this dimension)
+EACH = object()
+
+Cell = Tuple[str, str, str]
+
+# KEYS[1] = hash, ARGV[1] = EXPIREAT, then (cell, sum, count, min, max) groups
+UPDATE_SCRIPT = """
+local key = KEYS[1]
+for i = 2, #ARGV, 5 do
+  local cell = ARGV[i]
+  redis.call('HINCRBYFLOAT', key, cell .. '|sum', ARGV[i + 1])
+  redis.call('HINCRBY', key, cell .. '|count', ARGV[i + 2])
+  local lo = redis.call('HGET', key, cell .. '|min')
+  if not lo or tonumber(ARGV[i + 3]) < tonumber(lo) then
+    redis.call('HSET', key, cell .. '|min', ARGV[i + 3])
+  end
+  local hi = redis.call('HGET', key, cell .. '|max')
+  if not hi or tonumber(ARGV[i + 4]) > tonumber(hi) then
+    redis.call('HSET', key, cell .. '|max', ARGV[i + 4])
+  end
+end
+redis.call('EXPIREAT', key, ARGV[1])
+return (#ARGV - 1) / 5
+"""
+
+
+def cube_key(period: str, pid: str) -> str:
+    """Hash holding one period's cube."""
+    return f"feature:cube_{period}:{pid}"
+
+
+def members_key(dimension: str) -> str:
+    """Set of every value seen for a dimension."""
+    return f"feature:cube_members:{dimension}"
+
+
+def cell_name(cell: Cell) -> str:
+    return "|".join(cell)
+
+
+def rollups(store: str, family: str, promo: str) -> List[Cell]:
+    """The event's cell and its 7 roll-ups."""
+    return [tuple(value if keep else ALL for value, keep in zip((store, family, promo), mask))
+            for mask in product((True, False), repeat=3)]
+
+
+class CubeFold:
+    """Cube cells of one batch, merged in memory: (hash, cell) -> [sum, count, min, max]."""
+
+    def __init__(self):
+        self.cells: Dict[Tuple[str, Cell], List[float]] = {}
+        self.expiry: Dict[str, int] = {}
+        self.members: Dict[str, set] = {dimension: set() for dimension in DIMENSIONS}
+
+    def add(self, store: str, family: str, promo: str, sales: float, day: date, now: float):
+        """Fold one event into every period's cube (periods past retention are skipped)."""
+        for dimension, value in zip(DIMENSIONS, (store, family, promo)):
+            self.members[dimension].add(value)
+        cells = rollups(store, family, promo)
+        for period in aggregates.PERIODS:
+            expiry = aggregates.expire_at(period, day)
+            if expiry <= now:
+                continue
+            key = cube_key(period, aggregates.period_id(period, day))
+            self.expiry[key] = expiry
+            for cell in cells:
+                stats = self.cells.get((key, cell))
+                if stats is None:
+                    self.cells[(key, cell)] = [sales, 1, sales, sales]
+                else:
+                    stats[0] += sales
+                    stats[1] += 1
+                    stats[2] = min(stats[2], sales)
+                    stats[3] = max(stats[3], sales)
+
+    def queue(self, tx):
+        """Add the cube writes to a pipeline / transaction (one EVAL per touched hash)."""
+        args: Dict[str, List[str]] = {key: [str(expiry)] for key, expiry in self.expiry.items()}
+        for (key, cell), (total, count, lo, hi) in self.cells.items():
+            args[key] += [cell_name(cell), repr(total), str(count), repr(lo), repr(hi)]
+        for key, argv in args.items():
+            tx.execute(["EVAL", UPDATE_SCRIPT, "1", key] + argv)
+        for dimension, values in self.members.items():
+            if values:
+                tx.execute(["SADD", members_key(dimension)] + sorted(values))
+
+
+def promo_flag(onpromotion) -> str:
+    """'1' when any item was on promotion, else '0'."""
+    try:
+        return "1" if float(onpromotion or 0) > 0 else "0"
+    except ValueError:
+        return "0"
+
+
+def members(redis, dimension: str) -> List[str]:
+    """Every value seen for a dimension (stores sorted numerically)."""
+    values = redis.smembers(members_key(dimension)) or []
+    return sorted(values, key=lambda v: (len(v), v) if dimension == "store" else v)
+
+
+def _expand(redis, dimension: str, value) -> List[str]:
+    if value is None:
+        return [ALL]
+    if value is EACH:
+        return members(redis, dimension)
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def query(redis, period: str, day: date, store=None, family=None, promo=None) -> Dict[Cell, Dict[str, float]]:
+    """
+    Slice / roll-up query for one period.
+
+    Each dimension takes None (rolled up), a value, a list of values, or EACH
+    (one cell per known member). Cells without data are left out.
+
+    Args:
+        redis: utils.redis_client client
+        period: daily / weekly / monthly
+        day: Any date inside the period
+        store, family, promo: Dimension filters (promo as 0/1)
+
+    Returns:
+        {(store, family, promo): {sum, count, min, max, mean}}, "*" marking rolled-up dimensions
+
+    Example:
+        query(redis, "weekly", today, store=5, promo=1)  # store 5 promo sales this week
+    """
+    cells = list(product(*(_expand(redis, d, v) for d, v in zip(DIMENSIONS, (store, family, promo)))))
+    if not cells:
+        return {}
+    fields = [f"{cell_name(cell)}|{stat}" for cell in cells for stat in STATS]
+    values = redis.execute(["HMGET", cube_key(period, aggregates.period_id(period, day))] + fields)
+
+    out = {}
+    for i, cell in enumerate(cells):
+        raw = values[i * len(STATS):(i + 1) * len(STATS)]
+        if raw[1] is None:
+            continue
+        stats = {stat: float(v) for stat, v in zip(STATS, raw)}
+        stats["mean"] = stats["sum"] / stats["count"] if stats["count"] else 0.0
+        out[cell] = stats
+    return out
@@ -0,0 +1,345 @@
+"""
+Stream Batch Folding
+Turns one XREADGROUP batch into a single Redis transaction: increments that
+share a hash field are merged in memory (see utils/aggregates.py and
+utils/timeseries.py for the layouts), raw events go out as one compressed
+training-buffer chunk (utils/training_buffer.py) and every message ID is acknowledged by one XACK. A 100-message read costs two
+round trips (read + transaction) instead of ~500. Binary entries
+(utils/event_codec.py) of a read are decoded together in one pass; text
+entries are still parsed field by field.
+
+The transaction (MULTI/EXEC) keeps delivery at-least-once: if it fails nothing
+is applied and the messages stay pending until a consumer reclaims them with
+XAUTOCLAIM.
+"""
+
+import math
+import os
+import socket
+import statistics
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils import aggregates, event_codec, rollup_cube, timeseries, training_buffer
+from utils.event_codec import REPLAY_FIELD
+
+STREAM_KEY = "store_sales_stream"
+GROUP_NAME = "ml_feature_group"
+CONSUMER_PREFIX = "feature_processor"
+# Pending entries idle this long belong to a crashed / stuck consumer
+RECLAIM_IDLE_MS = int(os.getenv("STREAM_RECLAIM_IDLE_MS", "60000"))
+
+
+def parse_fields(fields_raw: List) -> Dict[str, str]:
+    """Flat [field, value, field, value, ...] stream entry → dict."""
+    return {fields_raw[i]: fields_raw[i + 1] for i in range(0, len(fields_raw), 2)}
+
+
+class BatchFold:
+    """In-memory result of folding a batch of stream messages."""
+
+    def __init__(self):
+        # (hash key, field) -> summed sales; hash key -> EXPIREAT
+        self.increments: Dict[Tuple[str, str], float] = {}
+        self.expiry: Dict[str, int] = {}
+        self.cube = rollup_cube.CubeFold()
+        self.buffer: List[Dict[str, str]] = []
+        self.ack_ids: List[str] = []
+        self.processed = 0
+        self.skipped = 0
+
+    def add(self, msg_id: str, data: Dict[str, str]):
+        """Fold one text message (invalid ones are only acknowledged)."""
+        self.ack_ids.append(msg_id)
+        family = data.get('family')
+        event_date_str = data.get('date')
+        if not family or not event_date_str:
+            self.skipped += 1
+            return
+        try:
+            event_date = datetime.strptime(event_date_str, "%Y-%m-%d")
+        except ValueError:
+            print(f"  SKIPPED: Invalid date format {event_date_str}")
+            self.skipped += 1
+            return
+        try:
+            sales = float(data.get('sales', 0.0))
+        except (TypeError, ValueError):
+            sales = math.nan
+        if not math.isfinite(sales):
+            # HINCRBYFLOAT rejects NaN / inf, which would fail every retry of the transaction
+            print(f"  SKIPPED: Invalid sales value {data.get('sales')!r}")
+            self.skipped += 1
+            return
+
+        store_nbr = data.get('store_nbr')
+        store_nbr = None if store_nbr in (None, "", "?") else str(store_nbr)
+        self._fold(msg_id, family, event_date.date(), store_nbr, rollup_cube.promo_flag(data.get('onpromotion')), sales)
+        if data.get(REPLAY_FIELD) != "1":
+            # strptime accepts "2026-1-5"; the chunk encoder only parses zero-padded dates
+            self.buffer.append(dict(data, date=event_date.date().isoformat()))
+        self.processed += 1
+
+    def add_event(self, msg_id: str, event: Optional[event_codec.Event]):
+        """Fold one decoded binary message (None = undecodable, only acknowledged)."""
+        self.ack_ids.append(msg_id)
+        if event is None:
+            self.skipped += 1
+            return
+        family, day, store_nbr, onpromotion, sales, replay = event
+        self._fold(msg_id, family, day, str(store_nbr), "1" if onpromotion > 0 else "0", sales)
+        if not replay:
+            self.buffer.append({"date": day.isoformat(), "store_nbr": store_nbr, "family": family,
+                                "sales": sales, "onpromotion": onpromotion})
+        self.processed += 1
+
+    def _fold(self, msg_id: str, family: str, day: date, store_nbr: Optional[str], promo: str, sales: float):
+        now = time.time()
+        for key, field, expiry in aggregates.targets(family, day):
+            # Periods already past retention would be deleted on arrival
+            if expiry <= now:
+                continue
+            self.increments[(key, field)] = self.increments.get((key, field), 0.0) + sales
+            self.expiry[key] = expiry
+        key, field, expiry = timeseries.target(family, timeseries.event_time(day, msg_id))
+        if expiry > now:
+            self.increments[(key, field)] = self.increments.get((key, field), 0.0) + sales
+            self.expiry[key] = expiry
+        if store_nbr is not None:
+            self.cube.add(store_nbr, family, promo, sales, day, now)
+
+
+def consumer_name(index: int = 0) -> str:
+    """Group-unique consumer name: prefix, host, process id and slot."""
+    return f"{CONSUMER_PREFIX}-{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+def ensure_group(redis, stream_key: str = STREAM_KEY, group: str = GROUP_NAME) -> bool:
+    """Create the consumer group (and stream) if missing; True if it was created."""
+    try:
+        redis.execute(["XGROUP", "CREATE", stream_key, group, "0", "MKSTREAM"])
+        return True
+    except Exception as e:
+        if "BUSYGROUP" in str(e):
+            return False
+        raise
+
+
+def fold(stream_data: List, batch: Optional[BatchFold] = None) -> BatchFold:
+    """
+    Fold the messages of one XREADGROUP stream entry.
+
+    Args:
+        stream_data: [[msg_id, [field, value, ...]], ...]
+        batch: Fold to add to (several reads can share one flush); None starts a new one
+
+    Returns:
+        BatchFold with merged increments, buffered events and IDs to acknowledge
+    """
+    batch = batch if batch is not None else BatchFold()
+    messages = []
+    for message in stream_data:
+        if not message:
+            continue
+        if message[1] is None:
+            # Trimmed from the stream: XAUTOCLAIM (Redis < 7) returns the ID without fields and
+            # leaves it pending, so acknowledge it without folding
+            batch.ack_ids.append(message[0])
+            batch.skipped += 1
+            continue
+        messages.append(message)
+    binary = [i for i, (_, fields_raw) in enumerate(messages) if event_codec.is_encoded(fields_raw)]
+    decoded = {}
+    if binary:
+        records = event_codec.decode([messages[i][1][1] for i in binary])
+        decoded = dict(zip(binary, event_codec.rows(records)))
+    for i, (msg_id, fields_raw) in enumerate(messages):
+        if i in decoded:
+            batch.add_event(msg_id, decoded[i])
+        else:
+            batch.add(msg_id, parse_fields(fields_raw))
+    return batch
+
+
+def apply(redis, batch: BatchFold, stream_key: str = STREAM_KEY, group: str = GROUP_NAME) -> int:
+    """
+    Write a folded batch in one MULTI/EXEC request.
+
+    Args:
+        redis: utils.redis_client client
+        batch: Result of fold()
+        stream_key: Stream the messages were read from
+        group: Consumer group to acknowledge them in
+
+    Returns:
+        Round trips used (0 for an empty batch, otherwise 1)
+    """
+    if not batch.ack_ids:
+        return 0
+    chunk = None
+    if batch.buffer:
+        try:
+            chunk = training_buffer.encode_chunk(batch.buffer)
+        except (TypeError, ValueError) as e:
+            # Redelivery would fail the same way: keep the aggregates, drop only the training rows
+            print(f"  ⚠️ Training buffer chunk dropped ({len(batch.buffer)} rows): {e}")
+    tx = redis.multi()
+    for (key, field), amount in batch.increments.items():
+        tx.hincrbyfloat(key, field, amount)
+    for key, expiry in batch.expiry.items():
+        tx.expireat(key, expiry)
+    batch.cube.queue(tx)
+    if chunk is not None:
+        # One chunk per micro-batch, named after its first message
+        training_buffer.queue_chunk(tx, batch.ack_ids[0], chunk, len(batch.buffer))
+    tx.xack(stream_key, group, *batch.ack_ids)
+    tx.exec()
+    return 1
+
+
+def stream_lag_ms(msg_ids: List[str], now: Optional[float] = None) -> List[float]:
+    """Milliseconds since each message was added (auto-generated IDs start with the XADD time in ms)."""
+    now_ms = (time.time() if now is None else now) * 1000
+    return [now_ms - int(msg_id.split("-")[0]) for msg_id in msg_ids]
+
+
+class BatchStats:
+    """Per-batch and running throughput / round-trip counters, plus latency samples for telemetry."""
+
+    COUNTERS = ("batches", "messages", "round_trips", "seconds")
+
+    def __init__(self, consumer: Optional[str] = None):
+        self.consumer = consumer
+        self.batches = 0
+        self.messages = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+        # Batch latency and per-message ingest-to-visible lag (ms) since the last take_window()
+        self.batch_ms: List[float] = []
+        self.lag_ms: List[float] = []
+        self._window_base = {name: 0 for name in self.COUNTERS}
+
+    def record(self, batch: BatchFold, round_trips: int, seconds: float, label: Optional[str] = None,
+               lag_ms: Optional[List[float]] = None):
+        """Add one batch and print its line (with ingest-to-visible lag when given)."""
+        self.batches += 1
+        self.messages += len(batch.ack_ids)
+        self.round_trips += round_trips
+        self.seconds += seconds
+        self.batch_ms.append(seconds * 1000)
+        self.lag_ms.extend(lag_ms or [])
+        rate = len(batch.ack_ids) / seconds if seconds > 0 else 0.0
+        prefix = f"[{self.consumer}] " if self.consumer else ""
+        print(f"  📦 {prefix}{label or f'Batch {self.batches}'}: {len(batch.ack_ids)} msgs "
+              f"({batch.processed} saved, {batch.skipped} skipped) → {len(batch.increments)} fields, "
+              f"{round_trips} round trips (unbatched: {1 + 5 * batch.processed + batch.skipped}) | {rate:,.0f} msg/s"
+              + (f" | lag p50 {statistics.median(lag_ms):,.0f}ms max {max(lag_ms):,.0f}ms" if lag_ms else ""))
+
+    def as_dict(self) -> Dict:
+        """Counters and latency samples as a plain dict (picklable across worker processes)."""
+        out = {name: getattr(self, name) for name in self.COUNTERS}
+        out.update(batch_ms=self.batch_ms, lag_ms=self.lag_ms)
+        return out
+
+    def merge(self, counters: Dict):
+        """Add another consumer's as_dict() counters (seconds add up as busy time, samples are pooled)."""
+        for name, value in counters.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def take_window(self) -> Dict:
+        """as_dict() for the batches since the previous call; the latency samples are handed over and reset."""
+        current = self.as_dict()
+        window = {name: current[name] - self._window_base[name] for name in self.COUNTERS}
+        window.update(batch_ms=self.batch_ms, lag_ms=self.lag_ms)
+        self._window_base = {name: current[name] for name in self.COUNTERS}
+        self.batch_ms, self.lag_ms = [], []
+        return window
+
+    def summary(self, wall_seconds: Optional[float] = None) -> str:
+        """One-line total for the run (rate over `wall_seconds` when consumers ran concurrently)."""
+        seconds = self.seconds if wall_seconds is None else wall_seconds
+        rate = self.messages / seconds if seconds > 0 else 0.0
+        per_msg = self.round_trips / self.messages if self.messages else 0.0
+        return (f"{self.messages} messages in {self.batches} batches, {self.round_trips} round trips "
+                f"({per_msg:.3f}/msg), {rate:,.0f} msg/s")
+
+
+def process_batch(redis, consumer: str, count: int, stats: BatchStats,
+                  stream_key: str = STREAM_KEY, group: str = GROUP_NAME) -> int:
+    """
+    Read, fold and apply one batch for `consumer`.
+
+    Returns:
+        Number of messages handled (0 when the stream has nothing new)
+    """
+    start = time.perf_counter()
+    response = redis.execute([
+        "XREADGROUP", "GROUP", group, consumer,
+        "COUNT", str(count),
+        "STREAMS", stream_key, ">"
+    ])
+    if not response:
+        return 0
+    batch = fold(response[0][1])
+    round_trips = 1 + apply(redis, batch, stream_key, group)
+    stats.record(batch, round_trips, time.perf_counter() - start, lag_ms=stream_lag_ms(batch.ack_ids))
+    return len(batch.ack_ids)
+
+
+def reclaim_pending(redis, consumer: str, count: int, stats: BatchStats, min_idle_ms: int = RECLAIM_IDLE_MS,
+                    stream_key: str = STREAM_KEY, group: str = GROUP_NAME) -> int:
+    """
+    Take over entries left pending by other consumers and process them.
+
+    Walks the pending-entries list with XAUTOCLAIM until the cursor wraps,
+    folding and applying each claimed page like a normal batch.
+
+    Returns:
+        Number of reclaimed messages handled
+    """
+    handled, cursor = 0, "0-0"
+    while True:
+        start = time.perf_counter()
+        response = redis.execute([
+            "XAUTOCLAIM", stream_key, group, consumer, str(min_idle_ms), cursor, "COUNT", str(count)
+        ])
+        cursor, claimed = response[0], response[1]
+        batch = fold(claimed)
+        if batch.ack_ids:
+            round_trips = 1 + apply(redis, batch, stream_key, group)
+            stats.record(batch, round_trips, time.perf_counter() - start, label="Reclaimed")
+            handled += len(batch.ack_ids)
+        if cursor == "0-0":
+            return handled
+
+
+def still_pending(redis, consumer: str, msg_ids: List[str], stream_key: str = STREAM_KEY,
+                  group: str = GROUP_NAME) -> bool:
+    """
+    Whether `consumer` still owns the batch's entries, i.e. its transaction did not land.
+
+    apply() acknowledges the whole batch in its transaction, so checking the
+    first ID is enough. False also when another consumer has reclaimed them.
+    """
+    if not msg_ids:
+        return False
+    pending = redis.execute(["XPENDING", stream_key, group, msg_ids[0], msg_ids[0], "1", consumer])
+    return bool(pending)
+
+
+def retire_consumer(redis, consumer: str, stream_key: str = STREAM_KEY, group: str = GROUP_NAME) -> bool:
+    """
+    Remove a finished consumer from the group, but only if it owns no pending entries.
+
+    DELCONSUMER discards the consumer's pending list, so a consumer that still
+    owns messages is left in place for XAUTOCLAIM to drain.
+
+    Returns:
+        True if the consumer was deleted
+    """
+    pending = redis.execute(["XPENDING", stream_key, group, "-", "+", "1", consumer])
+    if pending:
+        return False
+    redis.execute(["XGROUP", "DELCONSUMER", stream_key, group, consumer])
+    return True
@@ -0,0 +1,256 @@
+"""
+Synthetic Favorita Data
+Generates the Kaggle files (train, test, oil, stores, holidays_events,
+transactions) at any scale with the competition's cardinalities, so the
+training pipeline can be benchmarked without downloading the dataset.
+
+    stores          54 stores in 22 cities / 16 states, types A-E, 17 clusters
+    train           one row per date × store × family (33 families), dated up
+                    to END_DATE; more rows mean a longer history (the real
+                    file is 3M rows = 1,684 days), --stores widens it instead
+    test            the 16 days after END_DATE, ids continuing train's
+    oil             business days only, a random walk with gaps
+    holidays_events national / regional / local holidays per year, with
+                    transfers, bridges, work days and additional days
+    transactions    per store and day, tracking that store's sales
+
+Sales are a per store × family level (some pairs never sell) times weekly
+and yearly seasonality, trend, holiday and promotion lifts and log-normal
+noise; low-volume series are zero-inflated. Everything is vectorized and
+train.csv is written in day chunks, so 30M rows stay within a few hundred MB.
+"""
+
+import math
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+
+from utils.event_codec import FAMILIES
+
+# Every scale ends where the real train.csv does (2017-08-15); more rows extend the history back
+END_DATE = date(2017, 8, 15)
+TEST_DAYS = 16
+# Named scales (rows of train.csv)
+SCALES = {"1m": 1_000_000, "3m": 3_000_888, "30m": 30_000_000}
+DEFAULT_STORES = 54
+# store_nbr is an int8 in the data lake
+MAX_STORES = 127
+CLUSTERS = 17
+PROMO_START = np.datetime64("2014-04-01")
+# Rows per CSV write
+CHUNK_ROWS = 1_000_000
+
+# The 22 cities of the competition and their provinces (16 distinct)
+CITIES = (
+    ("Quito", "Pichincha"), ("Guayaquil", "Guayas"), ("Cuenca", "Azuay"),
+    ("Santo Domingo", "Santo Domingo de los Tsachilas"), ("Manta", "Manabi"), ("Ambato", "Tungurahua"),
+    ("Machala", "El Oro"), ("Latacunga", "Cotopaxi"), ("Daule", "Guayas"), ("Loja", "Loja"),
+    ("Riobamba", "Chimborazo"), ("Babahoyo", "Los Rios"), ("Quevedo", "Los Rios"), ("Libertad", "Guayas"),
+    ("Esmeraldas", "Esmeraldas"), ("Salinas", "Santa Elena"), ("Ibarra", "Imbabura"), ("Cayambe", "Pichincha"),
+    ("El Carmen", "Manabi"), ("Puyo", "Pastaza"), ("Playas", "Guayas"), ("Guaranda", "Bolivar"),
+)
+STORE_TYPES = ("A", "B", "C", "D", "E")
+# Sold by weight: sales keep three decimals
+WEIGHED_FAMILIES = {"DELI", "MEATS", "POULTRY", "PRODUCE", "SEAFOOD", "FROZEN FOODS", "PREPARED FOODS"}
+NATIONAL_HOLIDAYS = (
+    ((1, 1), "Primer dia del ano"), ((5, 1), "Dia del Trabajo"), ((5, 24), "Batalla de Pichincha"),
+    ((8, 10), "Primer Grito de Independencia"), ((10, 9), "Independencia de Guayaquil"),
+    ((11, 2), "Dia de Difuntos"), ((11, 3), "Independencia de Cuenca"), ((12, 25), "Navidad"),
+)
+
+
+def train_days(rows: int, stores: int = DEFAULT_STORES) -> int:
+    """Days of history needed for at least `rows` train rows."""
+    return max(math.ceil(rows / (stores * len(FAMILIES))), TEST_DAYS)
+
+
+def make_stores(n_stores: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Every city gets a store first; the rest go mostly to the big cities, as in the real chain."""
+    weights = np.array([12, 8, 3, 3, 2, 2, 2, 2] + [1] * (len(CITIES) - 8), dtype=float)
+    extra = rng.choice(len(CITIES), size=max(n_stores - len(CITIES), 0), p=weights / weights.sum())
+    cities = np.concatenate([np.arange(min(n_stores, len(CITIES))), extra])
+    return pd.DataFrame({
+        "store_nbr": np.arange(1, n_stores + 1),
+        "city": [CITIES[i][0] for i in cities],
+        "state": [CITIES[i][1] for i in cities],
+        "type": rng.choice(STORE_TYPES, size=n_stores, p=[0.17, 0.15, 0.28, 0.33, 0.07]),
+        "cluster": rng.integers(1, CLUSTERS + 1, size=n_stores),
+    })
+
+
+def make_holidays(start: date, end: date, stores: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """Holiday events for every year touching [start, end]."""
+    rows = []
+    for year in range(start.year, end.year + 1):
+        for (month, day), name in NATIONAL_HOLIDAYS:
+            moment = date(year, month, day)
+            if moment.weekday() in (1, 3) and rng.random() < 0.4:
+                # Moved to the nearest Friday / Monday: the original is flagged, the new day is a Transfer
+                rows.append((moment, "Holiday", "National", "Ecuador", name, True))
+                shifted = moment + timedelta(days=1 if moment.weekday() == 3 else -1)
+                rows.append((shifted, "Transfer", "National", "Ecuador", f"Traslado {name}", False))
+            else:
+                rows.append((moment, "Holiday", "National", "Ecuador", name, False))
+        carnaval = date(year, 2, 10) + timedelta(days=int(rng.integers(0, 28)))
+        carnaval -= timedelta(days=carnaval.weekday())
+        rows += [(carnaval, "Holiday", "National", "Ecuador", "Carnaval", False),
+                 (carnaval + timedelta(days=1), "Holiday", "National", "Ecuador", "Carnaval", False)]
+        rows += [(date(year, 12, d), "Additional", "National", "Ecuador", f"Navidad{d - 25:+d}", False)
+                 for d in (21, 22, 23, 24, 26)]
+        if rng.random() < 0.5:
+            bridge = date(year, 11, 4) if date(year, 11, 3).weekday() == 3 else date(year, 12, 24)
+            rows += [(bridge, "Bridge", "National", "Ecuador", "Puente", False),
+                     (bridge + timedelta(days=int(rng.integers(20, 40))), "Work Day", "National", "Ecuador",
+                      "Recupero puente", False)]
+        for city in sorted(set(stores["city"])):
+            rows.append((date(year, 1, 1) + timedelta(days=int(rng.integers(0, 365))),
+                         "Holiday", "Local", city, f"Fundacion de {city}", False))
+        for state in sorted(set(stores["state"])):
+            rows.append((date(year, 1, 1) + timedelta(days=int(rng.integers(0, 365))),
+                         "Holiday", "Regional", state, f"Provincializacion de {state}", False))
+    out = pd.DataFrame(rows, columns=["date", "type", "locale", "locale_name", "description", "transferred"])
+    out = out[(out["date"] >= start) & (out["date"] <= end)]
+    return out.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def make_oil(start: date, end: date, rng: np.random.Generator) -> pd.DataFrame:
+    """WTI on business days: a random walk in log space, with a few missing quotes."""
+    days = pd.bdate_range(start, end)
+    price = 93.0 * np.exp(np.cumsum(rng.normal(0, 0.018, size=len(days))))
+    price[rng.random(len(days)) < 0.035] = np.nan
+    price[0] = np.nan
+    return pd.DataFrame({"date": days.date, "dcoilwtico": np.round(price, 2)})
+
+
+class SalesModel:
+    """Per store × family sales levels plus the calendar effects, sampled one chunk of days at a time."""
+
+    def __init__(self, stores: pd.DataFrame, national_days: np.ndarray, rng: np.random.Generator):
+        n_stores, n_families = len(stores), len(FAMILIES)
+        family_level = np.exp(rng.normal(2.5, 1.6, size=n_families))
+        family_level[FAMILIES.index("GROCERY I")] = 3500.0
+        family_level[FAMILIES.index("BEVERAGES")] = 2300.0
+        family_level[FAMILIES.index("PRODUCE")] = 1300.0
+        family_level[FAMILIES.index("CLEANING")] = 1000.0
+        store_size = np.exp(rng.normal(0, 0.55, size=n_stores))
+        self.level = store_size[:, None] * family_level[None, :]
+        # Some stores never carry some families (the real data has whole zero series)
+        self.level[rng.random((n_stores, n_families)) < 0.04] = 0.0
+        self.weekly = 1 + rng.uniform(0.05, 0.35, size=n_families)
+        self.promo_lift = rng.uniform(0.01, 0.06, size=n_families)
+        self.promo_rate = rng.uniform(0.0, 1.0, size=n_families) ** 3 * 12
+        self.weighed = np.array([family in WEIGHED_FAMILIES for family in FAMILIES])
+        self.store_traffic = store_size * rng.uniform(800, 2500, size=n_stores)
+        self.national_days = national_days
+        self.rng = rng
+
+    def sample(self, days: np.ndarray, origin: np.datetime64) -> Dict[str, np.ndarray]:
+        """
+        Sales, promotions and transactions for `days` (datetime64[D]).
+
+        Returns:
+            sales / onpromotion shaped (days, stores, families), transactions (days, stores)
+        """
+        rng = self.rng
+        years = (days - origin).astype(np.int64) / 365.25
+        weekday = (days.astype(np.int64) + 3) % 7
+        doy = (days - days.astype('datetime64[Y]')).astype(np.int64)
+        month = days.astype('datetime64[M]').astype(np.int64) % 12
+        season = (1 + 0.08 * np.sin(2 * np.pi * doy / 365.25) + 0.25 * (month == 11) * (doy >= 340)) \
+            * (1.05 ** years) * np.where(np.isin(days, self.national_days), 1.25, 1.0)
+        weekend = (weekday >= 5)[:, None] * (self.weekly - 1)[None, :] + 1
+        # Promotions are phased in over PROMO_START's year, as in the real data
+        promo_ramp = np.clip((days - PROMO_START).astype(np.int64) / 365, 0, 1)[:, None, None]
+        shape = (len(days),) + self.level.shape
+        onpromotion = rng.poisson(self.promo_rate[None, None, :] * promo_ramp, size=shape)
+        onpromotion[:, self.level == 0] = 0
+        mean = self.level[None] * season[:, None, None] * weekend[:, None, :] \
+            * (1 + self.promo_lift[None, None, :] * np.minimum(onpromotion, 30))
+        sales = mean * rng.lognormal(-0.045, 0.3, size=shape)
+        # Low-volume series sell nothing on many days
+        sales[rng.random(shape) < np.exp(-mean / 3)] = 0.0
+        sales = np.where(self.weighed[None, None, :], np.round(sales, 3), np.round(sales))
+        totals = sales.sum(axis=2) / np.maximum(self.level.sum(axis=1), 1)[None, :]
+        transactions = np.round(self.store_traffic[None, :] * totals * rng.lognormal(0, 0.05, size=totals.shape))
+        return {"sales": sales, "onpromotion": onpromotion, "transactions": transactions.astype(np.int64)}
+
+
+def _frame(days: np.ndarray, n_stores: int, first_id: int, columns: Dict[str, np.ndarray]) -> pa.Table:
+    """date × store × family rows in Kaggle order (date, then store, then family)."""
+    n_families = len(FAMILIES)
+    n = len(days) * n_stores * n_families
+    family_names = pa.array(FAMILIES)
+    table = {
+        "id": pa.array(np.arange(first_id, first_id + n, dtype=np.int64)),
+        "date": pa.array(np.repeat(days, n_stores * n_families)),
+        "store_nbr": pa.array(np.tile(np.repeat(np.arange(1, n_stores + 1), n_families), len(days))),
+        "family": family_names.take(pa.array(np.tile(np.arange(n_families), len(days) * n_stores))),
+    }
+    table.update({name: pa.array(values.reshape(-1)) for name, values in columns.items()})
+    return pa.table(table)
+
+
+def generate(out_dir: Path, rows: int, stores: int = DEFAULT_STORES, seed: int = 0) -> Dict:
+    """
+    Write the six Kaggle CSVs to `out_dir`.
+
+    Args:
+        out_dir: Target directory (a DATA_DIR for the data lake and train.py)
+        rows: Minimum train.csv rows (rounded up to whole days)
+        stores: Number of stores (at most MAX_STORES)
+        seed: Random seed
+
+    Returns:
+        Row counts per file plus the date range
+    """
+    if not 1 <= stores <= MAX_STORES:
+        raise ValueError(f"stores must be between 1 and {MAX_STORES}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_days = train_days(rows, stores)
+    end = np.datetime64(END_DATE, 'D')
+    start = end - np.timedelta64(n_days - 1, 'D')
+    test_end = end + np.timedelta64(TEST_DAYS, 'D')
+
+    df_stores = make_stores(stores, rng)
+    df_stores.to_csv(out_dir / "stores.csv", index=False)
+    df_holidays = make_holidays(start.item(), test_end.item(), df_stores, rng)
+    df_holidays.to_csv(out_dir / "holidays_events.csv", index=False)
+    df_oil = make_oil(start.item(), test_end.item(), rng)
+    df_oil.to_csv(out_dir / "oil.csv", index=False)
+
+    events = df_holidays[(df_holidays["locale"] == "National") & ~df_holidays["transferred"]]
+    model = SalesModel(df_stores, np.asarray(events["date"], dtype='datetime64[D]'), rng)
+    days_per_chunk = max(CHUNK_ROWS // (stores * len(FAMILIES)), 1)
+    train_rows = 0
+    with pv.CSVWriter(out_dir / "train.csv", pa.schema([
+        ("id", pa.int64()), ("date", pa.date32()), ("store_nbr", pa.int64()), ("family", pa.string()),
+        ("sales", pa.float64()), ("onpromotion", pa.int64())])) as train, \
+            pv.CSVWriter(out_dir / "transactions.csv", pa.schema([
+                ("date", pa.date32()), ("store_nbr", pa.int64()), ("transactions", pa.int64())])) as transactions:
+        for offset in range(0, n_days, days_per_chunk):
+            days = start + np.arange(offset, min(offset + days_per_chunk, n_days))
+            sample = model.sample(days, start)
+            train.write_table(_frame(days, stores, train_rows, {
+                "sales": sample["sales"], "onpromotion": sample["onpromotion"]}))
+            train_rows += sample["sales"].size
+            transactions.write_table(pa.table({
+                "date": pa.array(np.repeat(days, stores)),
+                "store_nbr": pa.array(np.tile(np.arange(1, stores + 1), len(days))),
+                "transactions": pa.array(sample["transactions"].reshape(-1)),
+            }))
+
+    test_days = end + np.arange(1, TEST_DAYS + 1)
+    test = model.sample(test_days, start)
+    test_table = _frame(test_days, stores, train_rows, {"onpromotion": test["onpromotion"]})
+    pv.write_csv(test_table, out_dir / "test.csv")
+
+    return {"train": train_rows, "test": test_table.num_rows, "stores": stores, "oil": len(df_oil),
+            "holidays_events": len(df_holidays), "transactions": n_days * stores,
+            "start": str(start), "end": str(end)}
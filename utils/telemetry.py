@@ -0,0 +1,222 @@
+"""
+Pipeline Telemetry
+Throughput, latency and lag of the live path, published to a small Redis
+namespace for the dashboard's System Health panel:
+
+    metrics:producer     hash   last producer run: events/s, XADD latency, sent / failed
+    metrics:processor    hash   last processor run (or daemon window): events/s, batch
+                                latency and ingest-to-visible lag percentiles
+    metrics:pipeline     hash   stream state when last sampled: XLEN, group lag and
+                                pending entries (XINFO GROUPS / XPENDING), age of the
+                                oldest undelivered entry, Redis memory (INFO memory)
+    metrics:history      list   newest-first JSON pipeline samples (HISTORY_LEN)
+
+Each publish is one MULTI/EXEC request and the dashboard reads everything
+back with one pipelined request. Keys expire after TTL_DAYS so a dead
+pipeline shows up as missing telemetry instead of stale numbers.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+METRICS_PREFIX = "metrics"
+HISTORY_KEY = f"{METRICS_PREFIX}:history"
+# Pipeline samples kept (two days of 10-minute runs)
+HISTORY_LEN = int(os.getenv("TELEMETRY_HISTORY_LEN", "288"))
+TTL_DAYS = int(os.getenv("TELEMETRY_TTL_DAYS", "7"))
+# A role that has not reported for this long is flagged on the dashboard
+STALE_S = int(os.getenv("TELEMETRY_STALE_S", "1800"))
+# Daemon publish interval
+PUBLISH_EVERY_S = float(os.getenv("TELEMETRY_EVERY_S", "10"))
+
+ROLES = ("producer", "processor", "pipeline")
+QUANTILES = (50, 95, 99)
+
+
+def metrics_key(role: str) -> str:
+    return f"{METRICS_PREFIX}:{role}"
+
+
+def _pairs(raw) -> Dict[str, str]:
+    """HGETALL / XINFO reply (flat list or dict) → dict."""
+    if isinstance(raw, list):
+        return dict(zip(raw[0::2], raw[1::2]))
+    return raw or {}
+
+
+def _id_ms(msg_id: Optional[str]) -> Optional[int]:
+    try:
+        return int(str(msg_id).split("-")[0])
+    except ValueError:
+        return None
+
+
+def percentiles(name: str, values: List[float]) -> Dict[str, float]:
+    """{name_p50, name_p95, name_p99, name_max} in ms (empty when there are no samples)."""
+    if not values:
+        return {}
+    out = {f"{name}_p{q}": round(float(v), 2) for q, v in zip(QUANTILES, np.percentile(values, QUANTILES))}
+    out[f"{name}_max"] = round(float(max(values)), 2)
+    return out
+
+
+def processor_fields(counters: Dict, wall_seconds: float, consumers: int = 1) -> Dict:
+    """
+    Processor metrics from BatchStats counters.
+
+    Args:
+        counters: BatchStats.as_dict() / take_window() (messages, batches, batch_ms, lag_ms)
+        wall_seconds: Elapsed time the counters cover
+        consumers: Consumers that contributed
+    """
+    out = {"events_per_s": round(counters["messages"] / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+           "messages": counters["messages"], "batches": counters["batches"], "consumers": consumers,
+           "seconds": round(wall_seconds, 2)}
+    out.update(percentiles("batch_ms", counters.get("batch_ms", [])))
+    out.update(percentiles("lag_ms", counters.get("lag_ms", [])))
+    return out
+
+
+def producer_fields(sent: int, failed: int, seconds: float, request_ms: List[float], mode: str) -> Dict:
+    """Producer metrics for one run (request_ms: per-request XADD latencies)."""
+    out = {"events_per_s": round(sent / seconds, 1) if seconds > 0 else 0.0, "sent": sent, "failed": failed,
+           "seconds": round(seconds, 2), "mode": mode}
+    out.update(percentiles("request_ms", request_ms))
+    return out
+
+
+def memory_info(text: str) -> Dict[str, int]:
+    """used / peak / max memory in bytes from an INFO memory reply."""
+    info = dict(line.split(":", 1) for line in str(text).splitlines() if ":" in line)
+    out = {}
+    for field, name in (("used_memory", "redis_used_bytes"), ("used_memory_peak", "redis_peak_bytes"),
+                        ("maxmemory", "redis_max_bytes")):
+        try:
+            out[name] = int(info[field])
+        except (KeyError, ValueError):
+            continue
+    return out
+
+
+def sample_stream(redis, stream_key: str, group: str) -> Dict:
+    """
+    Current stream / group / memory state (fields the server cannot answer are left out).
+
+    The age of the oldest entry not yet delivered to the group is how far
+    ingestion is behind in time; lag counts the same entries.
+    """
+    out: Dict = {}
+    now_ms = time.time() * 1000
+    try:
+        out["stream_length"] = int(redis.execute(["XLEN", stream_key]))
+    except Exception:
+        pass
+    last_delivered = None
+    try:
+        for raw in redis.execute(["XINFO", "GROUPS", stream_key]) or []:
+            info = _pairs(raw)
+            if info.get("name") == group:
+                last_delivered = info.get("last-delivered-id")
+                out["consumers"] = int(info.get("consumers", 0))
+                if info.get("lag") is not None:
+                    out["group_lag"] = int(info["lag"])
+    except Exception:
+        pass
+    try:
+        pending = redis.execute(["XPENDING", stream_key, group])
+        out["pending"] = int(pending[0] or 0)
+        oldest = _id_ms(pending[1]) if pending[0] else None
+        out["oldest_pending_s"] = round((now_ms - oldest) / 1000, 1) if oldest else 0.0
+    except Exception:
+        pass
+    if last_delivered is not None:
+        try:
+            undelivered = redis.execute(["XRANGE", stream_key, f"({last_delivered}", "+", "COUNT", "1"])
+            first = _id_ms(undelivered[0][0]) if undelivered else None
+            out["behind_s"] = round(max(now_ms - first, 0) / 1000, 1) if first else 0.0
+        except Exception:
+            pass
+    try:
+        out.update(memory_info(redis.execute(["INFO", "memory"])))
+    except Exception:
+        pass
+    return out
+
+
+def commands(role: str, fields: Dict, sample: Optional[Dict] = None) -> List[List[str]]:
+    """The writes for one publish: the role's hash, plus the pipeline hash and history when `sample` is given."""
+    now = time.time()
+    ttl = str(TTL_DAYS * 86400)
+    out = []
+    for key, values in ((metrics_key(role), fields), (metrics_key("pipeline"), sample)):
+        if values is None:
+            continue
+        flat = [str(v) for name, value in values.items() for v in (name, value)]
+        # Replace, not merge: fields missing from this publish (e.g. percentiles of an idle window) must go
+        out += [["DEL", key], ["HSET", key, "updated_at", repr(now)] + flat, ["EXPIRE", key, ttl]]
+    if sample is not None:
+        out += [["LPUSH", HISTORY_KEY, json.dumps({"t": round(now, 1), **sample})],
+                ["LTRIM", HISTORY_KEY, "0", str(HISTORY_LEN - 1)],
+                ["EXPIRE", HISTORY_KEY, ttl]]
+    return out
+
+
+def publish(redis, role: str, fields: Dict, sample: Optional[Dict] = None) -> bool:
+    """Send commands() in one MULTI/EXEC request; telemetry failures are reported, never raised."""
+    try:
+        pipe = redis.multi()
+        for command in commands(role, fields, sample):
+            pipe.execute(command)
+        pipe.exec()
+        return True
+    except Exception as e:
+        print(f"  ⚠️ Telemetry not published: {e}")
+        return False
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def read(redis) -> Dict:
+    """
+    Every role's hash plus the sample history in one pipelined request.
+
+    Returns:
+        {"producer": {...}, "processor": {...}, "pipeline": {...}, "history": [newest first]}
+        with numeric values as floats (empty dicts for roles that never reported)
+    """
+    pipe = redis.pipeline()
+    for role in ROLES:
+        pipe.execute(["HGETALL", metrics_key(role)])
+    pipe.execute(["LRANGE", HISTORY_KEY, "0", str(HISTORY_LEN - 1)])
+    *hashes, history = pipe.exec()
+    out = {role: {name: _number(value) for name, value in _pairs(raw).items()} for role, raw in zip(ROLES, hashes)}
+    out["history"] = [json.loads(entry) for entry in history or []]
+    return out
+
+
+def warnings(snapshot: Dict, now: Optional[float] = None) -> List[str]:
+    """Reasons to think ingestion is falling behind, for the dashboard."""
+    now = time.time() if now is None else now
+    out = []
+    for role in ("producer", "processor"):
+        updated = snapshot[role].get("updated_at")
+        if updated is None:
+            out.append(f"No {role} telemetry yet")
+        elif now - updated > STALE_S:
+            out.append(f"The {role} last reported {(now - updated) / 60:,.0f} min ago")
+    pipeline = snapshot["pipeline"]
+    if pipeline.get("behind_s", 0) > STALE_S:
+        out.append(f"Oldest unprocessed event is {pipeline['behind_s'] / 60:,.0f} min old")
+    lags = [sample["group_lag"] for sample in snapshot["history"][:3] if sample.get("group_lag") is not None]
+    if len(lags) == 3 and lags[0] > lags[1] > lags[2]:
+        out.append(f"Consumer lag rising: {lags[2]:,} → {lags[1]:,} → {lags[0]:,} entries")
+    return out
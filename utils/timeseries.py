@@ -0,0 +1,195 @@
+"""
+Sales Time Series
+Per-family sales in hourly buckets, laid out for range reads:
+
+    feature:ts:{family}:{YYYY-MM}    field = hours since the epoch (UTC)
+
+One hash per family per month, filled with HINCRBYFLOAT from the same batch
+transaction as utils/aggregates.py. The braces make {family} a hash tag, so a
+family's months share a cluster slot and one script can read all of them.
+
+range_query() is a single EVAL: it reads the months the requested windows
+touch and sums the hourly buckets into hourly / daily / weekly (or one
+whole-window) buckets on the server. A 90-day sparkline plus the two windows
+of a period-over-period delta come back in one round trip.
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Days a month's hash is kept after the month ends (sparkline + last month's delta)
+RETENTION_DAYS = int(os.getenv("TS_RETENTION_DAYS", "120"))
+
+# Bucket width in hours; weeks start on Sunday like the %U aggregate weeks
+RESOLUTIONS = {"hourly": 1, "daily": 24, "weekly": 168}
+# 1970-01-01 was a Thursday, the first Sunday starts 72 hours later
+WEEK_OFFSET_HOURS = 72
+
+EPOCH = datetime(1970, 1, 1)
+ONE_HOUR = timedelta(hours=1)
+
+Window = Tuple[datetime, datetime, Optional[str]]
+
+# KEYS = month hashes; ARGV[1] = window count, then (start, end, width, offset)
+# hours per window. Returns one flat [bucket, total, ...] list per window.
+RANGE_SCRIPT = """
+local windows = {}
+for w = 1, tonumber(ARGV[1]) do
+  local base = 2 + (w - 1) * 4
+  windows[w] = {tonumber(ARGV[base]), tonumber(ARGV[base + 1]),
+                tonumber(ARGV[base + 2]), tonumber(ARGV[base + 3]), {}}
+end
+for _, key in ipairs(KEYS) do
+  local flat = redis.call('HGETALL', key)
+  for i = 1, #flat, 2 do
+    local hour = tonumber(flat[i])
+    local value = tonumber(flat[i + 1])
+    for _, win in ipairs(windows) do
+      if hour >= win[1] and hour < win[2] then
+        local bucket = win[4] + win[3] * math.floor((hour - win[4]) / win[3])
+        win[5][bucket] = (win[5][bucket] or 0) + value
+      end
+    end
+  end
+end
+local out = {}
+for w, win in ipairs(windows) do
+  local flat = {}
+  for bucket, total in pairs(win[5]) do
+    flat[#flat + 1] = tostring(bucket)
+    flat[#flat + 1] = tostring(total)
+  end
+  out[w] = flat
+end
+return out
+"""
+
+
+def _utc(moment: datetime) -> datetime:
+    """Naive UTC datetime (aware ones are converted; naive ones are already taken as UTC)."""
+    return moment if moment.tzinfo is None else moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def hour_number(moment: datetime) -> int:
+    """Hours since the epoch (naive datetimes are taken as UTC, like the aggregate dates)."""
+    return int((_utc(moment) - EPOCH) // ONE_HOUR)
+
+
+def from_hour(hour: int) -> datetime:
+    return EPOCH + hour * ONE_HOUR
+
+
+def series_key(family: str, month: str) -> str:
+    """Hash holding one family's hourly buckets for a month (YYYY-MM)."""
+    return f"feature:ts:{{{family}}}:{month}"
+
+
+def expire_at(moment: datetime) -> int:
+    """Unix time the month's hash expires: end of month plus the retention."""
+    next_month = (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+    end = next_month.date() + timedelta(days=RETENTION_DAYS)
+    return int(datetime(end.year, end.month, end.day, tzinfo=timezone.utc).timestamp())
+
+
+def event_time(event_day: date, msg_id: Optional[str]) -> datetime:
+    """
+    Hour an event is bucketed in.
+
+    Events only carry a date, so the time of day comes from the stream ID
+    (XADD time in ms) when it falls on that date; replayed or late events
+    land at midnight of their date.
+    """
+    midnight = datetime(event_day.year, event_day.month, event_day.day)
+    try:
+        added = EPOCH + timedelta(milliseconds=int(msg_id.split("-")[0]))
+    except (AttributeError, ValueError):
+        return midnight
+    return added if added.date() == event_day else midnight
+
+
+def target(family: str, moment: datetime) -> Tuple[str, str, int]:
+    """(hash key, field, expire-at) an event at `moment` adds its sales to."""
+    return series_key(family, moment.strftime('%Y-%m')), str(hour_number(moment)), expire_at(moment)
+
+
+def _months(start: datetime, end: datetime) -> List[str]:
+    months, cursor = [], start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while cursor < end:
+        months.append(cursor.strftime('%Y-%m'))
+        cursor = (cursor + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def _bucket_args(start: int, end: int, resolution: Optional[str]) -> List[int]:
+    if resolution is None:
+        return [start, end, max(end - start, 1), start]
+    width = RESOLUTIONS[resolution]
+    return [start, end, width, WEEK_OFFSET_HOURS if resolution == "weekly" else 0]
+
+
+def range_query(redis, family: str, windows: Sequence[Window]) -> List[List[Tuple[datetime, float]]]:
+    """
+    Downsampled sales for several [start, end) windows of one family in one EVAL.
+
+    Args:
+        redis: utils.redis_client client
+        family: Product family
+        windows: (start, end, resolution) tuples; resolution is "hourly" /
+            "daily" / "weekly", or None for a single whole-window total
+
+    Returns:
+        One list per window of (bucket start, sales), every bucket present
+        (zero-filled) and in time order
+
+    Example:
+        spark, = range_query(redis, "BEVERAGES", [(today - timedelta(days=89), today + timedelta(days=1), "daily")])
+    """
+    spans = [(hour_number(start), hour_number(end), resolution) for start, end, resolution in windows]
+    if not spans:
+        return []
+    keys = sorted({series_key(family, month) for start, end, _ in windows for month in _months(start, end)})
+    args = [str(len(spans))] + [str(v) for span in spans for v in _bucket_args(*span)]
+    raw = redis.execute(["EVAL", RANGE_SCRIPT, str(len(keys))] + keys + args)
+
+    out = []
+    for (start, end, resolution), flat in zip(spans, raw):
+        totals: Dict[int, float] = {int(float(b)): float(v) for b, v in zip(flat[0::2], flat[1::2])}
+        _, _, width, offset = _bucket_args(start, end, resolution)
+        first = offset + width * ((start - offset) // width)
+        out.append([(from_hour(b), totals.get(b, 0.0)) for b in range(first, end, width)])
+    return out
+
+
+def period_windows(period: str, now: datetime) -> Tuple[Tuple[datetime, datetime], Tuple[datetime, datetime]]:
+    """
+    Current period to date and the same stretch of the previous period.
+
+    "Today" until the current hour is compared with yesterday until the same
+    hour (likewise for weeks and months), so partial periods compare fairly.
+
+    Returns:
+        ((start, end), (previous start, previous end))
+    """
+    # Buckets are UTC hours, so day / week / month boundaries are UTC too
+    now = _utc(now)
+    end = from_hour(hour_number(now) + 1)
+    day = datetime(now.year, now.month, now.day)
+    if period == "daily":
+        start, previous_start = day, day - timedelta(days=1)
+    elif period == "weekly":
+        start = day - timedelta(days=(now.weekday() + 1) % 7)
+        previous_start = start - timedelta(days=7)
+    elif period == "monthly":
+        start = day.replace(day=1)
+        previous_start = (start - timedelta(days=1)).replace(day=1)
+    else:
+        raise ValueError(f"unknown period {period!r}")
+    # A long month's tail is compared with the whole (shorter) previous month
+    previous_end = min(previous_start + (end - start), start)
+    return (start, end), (previous_start, previous_end)
+
+
+def pct_change(current: float, previous: float) -> Optional[float]:
+    """Percent change, None when there is nothing to compare with."""
+    return (current - previous) / previous * 100 if previous else None
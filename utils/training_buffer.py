@@ -0,0 +1,207 @@
+"""
+Training Buffer
+Fresh stream events for the nightly retrain, stored as one compressed
+columnar chunk per micro-batch instead of one JSON string per event:
+
+    training_data_buffer:chunk:{first msg id}    base64(zlib(header + columns))
+    training_data_buffer:manifest                 field = chunk id, value = rows
+
+A chunk holds fixed-dtype columns (days since epoch, store, family code,
+sales, promo) behind a small JSON header with the row count and the family
+names, so decoding is a few np.frombuffer views per chunk. Values are base64
+text because the REST client only carries strings.
+
+train.py snapshots the manifest with an atomic RENAME, reads the chunks with
+paginated MGETs and deletes them only after a successful run. A failed run
+leaves the snapshot in place and the next run trains on it together with
+whatever arrived since.
+"""
+
+import base64
+import json
+import os
+import zlib
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+BUFFER_PREFIX = "training_data_buffer"
+MANIFEST_KEY = f"{BUFFER_PREFIX}:manifest"
+SNAPSHOT_KEY = f"{BUFFER_PREFIX}:snapshot"
+FORMAT_VERSION = 1
+
+# Newest rows kept by trim() (whole chunks, like the old LTRIM 0 100000)
+MAX_ROWS = int(os.getenv("TRAINING_BUFFER_MAX_ROWS", "100000"))
+# Leak guard for chunks whose manifest entry is gone
+CHUNK_TTL_DAYS = int(os.getenv("TRAINING_BUFFER_TTL_DAYS", "14"))
+# Chunks per MGET when reading a snapshot
+READ_PAGE = int(os.getenv("TRAINING_BUFFER_READ_PAGE", "200"))
+
+# Column order and dtypes inside a chunk
+COLUMNS = (
+    ("date", "<i4"),
+    ("store_nbr", "<i2"),
+    ("family", "<u2"),
+    ("sales", "<f8"),
+    ("onpromotion", "<i4"),
+)
+
+
+def chunk_key(chunk_id: str) -> str:
+    return f"{BUFFER_PREFIX}:chunk:{chunk_id}"
+
+
+def _id_order(chunk_id: str):
+    # Stream IDs: "{ms}-{seq}"
+    ms, _, seq = chunk_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _number(value, default, cast):
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _pairs(raw) -> Dict[str, str]:
+    """HGETALL reply (flat list or dict) → dict."""
+    if isinstance(raw, list):
+        return dict(zip(raw[0::2], raw[1::2]))
+    return raw or {}
+
+
+def encode_chunk(records: List[Dict[str, str]]) -> str:
+    """
+    Pack validated stream events into one chunk value.
+
+    Args:
+        records: Parsed stream fields with a YYYY-MM-DD 'date' and a 'family'
+
+    Returns:
+        Base64 text of the compressed chunk
+    """
+    families, codes = np.unique(np.array([r['family'] for r in records]), return_inverse=True)
+    columns = {
+        "date": np.array([r['date'] for r in records], dtype='datetime64[D]').astype(np.int64),
+        # Unknown stores become -1 and are dropped on read
+        "store_nbr": [_number(r.get('store_nbr'), -1, int) for r in records],
+        "family": codes,
+        "sales": [_number(r.get('sales'), 0.0, float) for r in records],
+        "onpromotion": [_number(r.get('onpromotion'), 0, int) for r in records],
+    }
+    header = json.dumps({"v": FORMAT_VERSION, "rows": len(records), "families": families.tolist()})
+    body = b"".join(np.asarray(columns[name], dtype=dtype).tobytes() for name, dtype in COLUMNS)
+    return base64.b64encode(zlib.compress(header.encode() + b"\n" + body)).decode()
+
+
+def decode_chunk(value: str) -> Dict:
+    """Chunk value → {"families": [...], column: array} (arrays are views of the decompressed bytes)."""
+    raw = zlib.decompress(base64.b64decode(value))
+    header, _, body = raw.partition(b"\n")
+    meta = json.loads(header)
+    if meta.get("v") != FORMAT_VERSION:
+        raise ValueError(f"unsupported training buffer chunk version {meta.get('v')!r}")
+    out, offset = {"families": meta["families"]}, 0
+    for name, dtype in COLUMNS:
+        out[name] = np.frombuffer(body, dtype=dtype, count=meta["rows"], offset=offset)
+        offset += np.dtype(dtype).itemsize * meta["rows"]
+    return out
+
+
+def decode_chunks(values: List[str]) -> pd.DataFrame:
+    """
+    Decode many chunks into one typed frame (date, store_nbr, family, sales, onpromotion).
+
+    Family codes of each chunk are remapped onto one shared table with an
+    array gather, so no per-row Python work is done.
+    """
+    parts = [decode_chunk(value) for value in values if value]
+    if not parts:
+        return pd.DataFrame(columns=[name for name, _ in COLUMNS])
+    families = pd.Index(sorted(set().union(*(part["families"] for part in parts))))
+    codes = np.concatenate([families.get_indexer(part["families"])[part["family"]] for part in parts])
+    df = pd.DataFrame({
+        "date": np.concatenate([part["date"] for part in parts]).astype('datetime64[D]').astype('datetime64[ns]'),
+        "store_nbr": np.concatenate([part["store_nbr"] for part in parts]).astype(np.int64),
+        "family": families.values.take(codes),
+        "sales": np.concatenate([part["sales"] for part in parts]),
+        "onpromotion": np.concatenate([part["onpromotion"] for part in parts]).astype(np.int64),
+    })
+    return df[df['store_nbr'] >= 0].reset_index(drop=True)
+
+
+def queue_chunk(tx, chunk_id: str, value: str, rows: int):
+    """Add a micro-batch's encode_chunk() value and its manifest entry to a pipeline / transaction."""
+    tx.execute(["SET", chunk_key(chunk_id), value, "EX", str(CHUNK_TTL_DAYS * 86400)])
+    tx.execute(["HSET", MANIFEST_KEY, chunk_id, str(rows)])
+
+
+def trim(redis, max_rows: int = MAX_ROWS) -> int:
+    """
+    Drop the oldest chunks beyond the newest `max_rows` rows (snapshotted chunks are untouched).
+
+    Returns:
+        Number of rows dropped
+    """
+    manifest = _pairs(redis.execute(["HGETALL", MANIFEST_KEY]))
+    kept, drop, dropped_rows = 0, [], 0
+    for chunk_id in sorted(manifest, key=_id_order, reverse=True):
+        rows = int(manifest[chunk_id])
+        if kept >= max_rows:
+            drop.append(chunk_id)
+            dropped_rows += rows
+        else:
+            kept += rows
+    if drop:
+        tx = redis.multi()
+        tx.execute(["HDEL", MANIFEST_KEY] + drop)
+        tx.execute(["DEL"] + [chunk_key(chunk_id) for chunk_id in drop])
+        tx.exec()
+    return dropped_rows
+
+
+def snapshot(redis) -> Dict[str, int]:
+    """
+    Take the buffered chunks for this run.
+
+    The live manifest is RENAMEd to the snapshot key, so processors keep
+    writing to a fresh manifest. If a failed run left a snapshot behind,
+    the live entries are moved into it instead (only the fields read, so
+    entries added meanwhile stay live).
+
+    Returns:
+        {chunk id: rows} in stream order
+    """
+    try:
+        moved = redis.execute(["RENAMENX", MANIFEST_KEY, SNAPSHOT_KEY])
+    except Exception as e:
+        # Nothing new since the last run
+        if "no such key" not in str(e).lower():
+            raise
+        moved = 1
+    if not moved:
+        live = _pairs(redis.execute(["HGETALL", MANIFEST_KEY]))
+        if live:
+            tx = redis.multi()
+            tx.execute(["HSET", SNAPSHOT_KEY] + [v for pair in live.items() for v in pair])
+            tx.execute(["HDEL", MANIFEST_KEY] + list(live))
+            tx.exec()
+    taken = _pairs(redis.execute(["HGETALL", SNAPSHOT_KEY]))
+    return {chunk_id: int(taken[chunk_id]) for chunk_id in sorted(taken, key=_id_order)}
+
+
+def read(redis, chunk_ids: List[str], page: int = READ_PAGE) -> pd.DataFrame:
+    """Fetch chunks with one MGET per `page` chunks and decode them into one frame."""
+    values = []
+    for i in range(0, len(chunk_ids), page):
+        values += redis.execute(["MGET"] + [chunk_key(chunk_id) for chunk_id in chunk_ids[i:i + page]])
+    return decode_chunks(values)
+
+
+def release(redis, chunk_ids: List[str], page: int = READ_PAGE):
+    """Delete a snapshot's chunks, then the snapshot itself (call only after a successful run)."""
+    for i in range(0, len(chunk_ids), page):
+        redis.execute(["DEL"] + [chunk_key(chunk_id) for chunk_id in chunk_ids[i:i + page]])
+    redis.execute(["DEL", SNAPSHOT_KEY])
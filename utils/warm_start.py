@@ -0,0 +1,176 @@
+"""
+Warm-Start Boosting
+Nightly runs continue boosting the committed best_model_v2.json on recent rows
+instead of rebuilding every tree from scratch. A full retrain still happens
+when there is no usable previous model, on a weekly schedule, or when the
+warm-started model's holdout MAE degrades past a tolerance.
+
+Splits roll with the data (rolling_split), ending at the newest row including
+training-buffer rows:
+
+    ... window (warm start boosts here) | early stopping | holdout (scored) | latest
+
+Bookkeeping lives in model_metrics.json next to the model (committed by CI):
+    {"mode": ..., "mae": ..., "baseline_mae": ..., "baseline_rounds": ..., "full_retrain_at": "YYYY-MM-DD",
+     "fingerprint": ...}
+
+Warm starts continue from the committed model cut at its best iteration
+(previous_model), so the trees early stopping rejected are never built on.
+They only append trees, so the first `baseline_rounds` trees of the
+committed model are the last full retrain. The degradation check re-scores
+them on the current holdout instead of reusing the MAE stored for an older one.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+
+from utils.features import FEATURES
+
+MODEL_FILE = "best_model_v2.json"
+METRICS_FILE = "model_metrics.json"
+
+# Knobs are read when used, so a .env loaded after import still applies:
+#   XGB_INCREMENTAL=0             always retrain from scratch
+#   XGB_INCREMENTAL_ROUNDS        trees added per warm-started run (early stopping may use fewer)
+#   XGB_INCREMENTAL_WINDOW_DAYS   days of recent rows (before the early-stopping days) warm starts train on
+#   XGB_HOLDOUT_DAYS              newest days, held out of training and early stopping, every fit is scored on
+#   XGB_EARLY_STOPPING_DAYS       days right before the holdout that drive early stopping
+#   XGB_MAE_TOLERANCE             allowed relative MAE increase over the last full retrain before falling back
+#   XGB_FULL_RETRAIN_DAYS         days between scheduled full retrains
+DEFAULTS = {
+    "XGB_INCREMENTAL": "1",
+    "XGB_INCREMENTAL_ROUNDS": "100",
+    "XGB_INCREMENTAL_WINDOW_DAYS": "56",
+    "XGB_HOLDOUT_DAYS": "14",
+    "XGB_EARLY_STOPPING_DAYS": "7",
+    "XGB_MAE_TOLERANCE": "0.05",
+    "XGB_FULL_RETRAIN_DAYS": "7",
+}
+
+
+def setting(name: str) -> str:
+    """Current value of one of the DEFAULTS knobs."""
+    return os.getenv(name, DEFAULTS[name])
+
+
+def incremental_rounds() -> int:
+    return int(setting("XGB_INCREMENTAL_ROUNDS"))
+
+
+def fingerprint(encoders: Dict[str, LabelEncoder]) -> str:
+    """Hash of the feature layout; a previous model is only reusable if it matches."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update("|".join(FEATURES).encode())
+    for col in sorted(encoders):
+        h.update(col.encode())
+        h.update("|".join(map(str, encoders[col].classes_)).encode())
+    return h.hexdigest()
+
+
+def load_state() -> Dict:
+    """Metrics written by the previous run ({} if there are none)."""
+    if not os.path.exists(METRICS_FILE):
+        return {}
+    try:
+        with open(METRICS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: Dict):
+    with open(METRICS_FILE, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def plan(state: Dict, encoders: Dict[str, LabelEncoder], today: Optional[date] = None) -> Tuple[str, str]:
+    """
+    Decide between continuing the previous model and a full retrain.
+
+    Args:
+        state: Output of load_state()
+        encoders: Encoders fitted for this run
+        today: Override for the schedule check (defaults to today)
+
+    Returns:
+        ("incremental" | "full", reason)
+    """
+    today = today or date.today()
+    if setting("XGB_INCREMENTAL") == "0":
+        return "full", "incremental mode disabled"
+    if not os.path.exists(MODEL_FILE) or not state.get("full_retrain_at"):
+        return "full", "no previous model"
+    try:
+        xgb.Booster(model_file=MODEL_FILE)
+    except (xgb.core.XGBoostError, OSError, ValueError) as e:
+        return "full", f"previous model unreadable ({str(e).splitlines()[0]})"
+    if state.get("fingerprint") != fingerprint(encoders):
+        return "full", "feature encoding changed"
+    if not state.get("baseline_rounds"):
+        return "full", "baseline trees not recorded"
+    age = (today - date.fromisoformat(state["full_retrain_at"])).days
+    if age >= int(setting("XGB_FULL_RETRAIN_DAYS")):
+        return "full", f"weekly schedule ({age} days since last full retrain)"
+    return "incremental", f"{age} days since last full retrain"
+
+
+def previous_model() -> xgb.Booster:
+    """The committed model cut to the trees it predicts with (the rejected early-stopping tail removed)."""
+    booster = xgb.Booster(model_file=MODEL_FILE)
+    best = getattr(booster, "best_iteration", None)
+    if best is None or best + 1 >= booster.num_boosted_rounds():
+        return booster
+    return booster[:best + 1]
+
+
+def degraded(mae: float, baseline_mae: float) -> bool:
+    """True when `mae` is worse than the last full retrain, on the same holdout, by more than XGB_MAE_TOLERANCE."""
+    return mae > baseline_mae * (1 + float(setting("XGB_MAE_TOLERANCE")))
+
+
+def rolling_split(dates) -> Tuple[str, str, str]:
+    """
+    Date boundaries for this run, counted back from the newest row.
+
+    Days are counted over the dates present, so a gap (e.g. live buffer rows
+    dated well past the history) never leaves a split empty.
+
+    Args:
+        dates: Dates of the training data (history plus buffer rows; duplicates are fine)
+
+    Returns:
+        (window_start, stop_start, holdout_start): warm start boosts on
+        [window_start, stop_start), early stopping watches [stop_start, holdout_start)
+        and the MAE is measured from holdout_start on
+    """
+    days = np.unique(np.asarray(dates, dtype='datetime64[D]'))
+    holdout = int(setting("XGB_HOLDOUT_DAYS"))
+    stopping = int(setting("XGB_EARLY_STOPPING_DAYS"))
+    window = int(setting("XGB_INCREMENTAL_WINDOW_DAYS"))
+
+    def back(n: int) -> str:
+        return str(days[max(len(days) - n, 0)])
+
+    return back(holdout + stopping + window), back(holdout + stopping), back(holdout)
+
+
+def next_state(state: Dict, mode: str, mae: float, encoders: Dict[str, LabelEncoder], rounds: Optional[int] = None,
+               today: Optional[date] = None) -> Dict:
+    """
+    State to persist after this run's model is saved.
+
+    Args:
+        rounds: Trees the model predicts with (recorded as baseline_rounds after a full retrain)
+    """
+    today = today or date.today()
+    new = dict(state, mode=mode, mae=float(mae), trained_at=today.isoformat(), fingerprint=fingerprint(encoders))
+    if mode == "full":
+        new.update(baseline_mae=float(mae), baseline_rounds=int(rounds), full_retrain_at=today.isoformat())
+    return new
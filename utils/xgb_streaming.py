@@ -0,0 +1,197 @@
+"""
+Out-of-Core XGBoost Training
+Streams featurized month partitions from the feature cache into XGBoost's
+iterator interface, so the full training matrix is never materialized.
+
+Modes (XGB_TRAIN_MODE):
+    in_memory  - pandas slices + XGBRegressor (default)
+    quantile   - batches are quantile-binned into a QuantileDMatrix as they stream in
+    external   - quantile-binned pages are spilled to disk (ExtMemQuantileDMatrix)
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import xgboost as xgb
+
+from utils import feature_cache
+from utils.features import FEATURES, TARGET
+
+STREAMING_MODES = ("quantile", "external")
+
+# Shared by the in-memory XGBRegressor and the streaming xgb.train() path
+NUM_BOOST_ROUND = 1000
+EARLY_STOPPING_ROUNDS = 50
+BOOSTER_PARAMS = {
+    "objective": "reg:squarederror",
+    "eta": 0.05,
+    "max_depth": 10,
+    "tree_method": "hist",
+    "seed": 42,
+}
+
+
+def train_mode() -> str:
+    """XGB_TRAIN_MODE, read when called so a .env loaded after import still applies."""
+    return os.getenv("XGB_TRAIN_MODE", "in_memory")
+
+
+def max_batch_rows() -> int:
+    """Largest batch handed to XGBoost at once (rows)."""
+    return int(os.getenv("XGB_MAX_BATCH_ROWS", "500000"))
+
+
+def streaming_enabled() -> bool:
+    """True when XGB_TRAIN_MODE selects an out-of-core mode and the feature cache is available."""
+    return train_mode() in STREAMING_MODES and feature_cache.enabled()
+
+
+def _split_days(val_date: str) -> int:
+    """val_date as days since epoch (the cache stores dates as int32 day numbers)."""
+    return int(np.datetime64(val_date, 'D').astype(np.int64))
+
+
+class MonthlyFeatureIter(xgb.DataIter):
+    """Feeds one side of the date split to XGBoost, one cached month batch at a time."""
+
+    def __init__(self, months: List[str], val_date: str, validation: bool, cache_prefix: Optional[str] = None,
+                 start_date: Optional[str] = None, end_date: Optional[str] = None):
+        """
+        Args:
+            months: Month keys from feature_cache.refresh()
+            val_date: Split date; rows before it train, the rest validate
+            validation: Yield the validation side instead of the training side
+            cache_prefix: On-disk page prefix (external-memory mode only)
+            start_date: Drop training rows before this date (warm-start window)
+            end_date: Drop validation rows from this date on (the scoring holdout)
+        """
+        start = _split_days(start_date) if start_date and not validation else None
+        end = _split_days(end_date) if end_date and validation else None
+        self.batches = list(self._plan(months, _split_days(val_date), validation, start, end))
+        self._it = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    @staticmethod
+    def _plan(months: List[str], split: int, validation: bool, start: Optional[int] = None,
+              end: Optional[int] = None):
+        """(month, row slice) pairs, skipping months entirely on the other side of the split."""
+        for month in months:
+            dates = feature_cache.month_arrays(month, ['date'])['date']
+            if len(dates) == 0:
+                continue
+            side = dates >= split if validation else dates < split
+            if start is not None:
+                side &= dates >= start
+            if end is not None:
+                side &= dates < end
+            rows = np.flatnonzero(side)
+            step = max_batch_rows()
+            for offset in range(0, len(rows), step):
+                yield month, rows[offset:offset + step]
+
+    @property
+    def rows(self) -> int:
+        return int(sum(len(rows) for _, rows in self.batches))
+
+    def batch(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense float32 (X, y) for batch `i`, read from the memory-mapped month files."""
+        month, rows = self.batches[i]
+        arrays = feature_cache.month_arrays(month, FEATURES + [TARGET])
+        X = np.empty((len(rows), len(FEATURES)), dtype=np.float32)
+        for j, col in enumerate(FEATURES):
+            X[:, j] = arrays[col][rows]
+        return X, np.asarray(arrays[TARGET][rows], dtype=np.float32)
+
+    def next(self, input_data) -> bool:
+        if self._it == len(self.batches):
+            return False
+        X, y = self.batch(self._it)
+        input_data(data=X, label=y, feature_names=FEATURES)
+        self._it += 1
+        return True
+
+    def reset(self):
+        self._it = 0
+
+
+def train_streaming(
+    months: List[str],
+    val_date: str,
+    mode: Optional[str] = None,
+    num_boost_round: int = NUM_BOOST_ROUND,
+    xgb_model: Union[str, xgb.Booster, None] = None,
+    start_date: Optional[str] = None,
+    nthread: Optional[int] = None,
+    end_date: Optional[str] = None,
+) -> Tuple[xgb.Booster, Dict]:
+    """
+    Train the sales booster without materializing the training matrix.
+
+    Args:
+        months: Month keys from feature_cache.refresh()
+        val_date: Split date (same as the in-memory path)
+        mode: 'quantile' or 'external' (default: XGB_TRAIN_MODE)
+        num_boost_round: Trees to add
+        xgb_model: Booster or saved model to continue boosting from (warm start)
+        start_date: Only train on rows from this date on (warm start)
+        nthread: Core budget (default: all cores)
+        end_date: Early-stop on validation rows before this date only (keeps the holdout unseen)
+
+    Returns:
+        (booster, info) where info holds row counts and the best iteration
+    """
+    mode = mode or train_mode()
+    cache_dir = None
+    if mode == "external":
+        cache_dir = tempfile.mkdtemp(prefix="xgb_pages_")
+        train_iter = MonthlyFeatureIter(months, val_date, validation=False, cache_prefix=os.path.join(cache_dir, "train"),
+                                        start_date=start_date)
+        val_iter = MonthlyFeatureIter(months, val_date, validation=True, cache_prefix=os.path.join(cache_dir, "val"),
+                                      end_date=end_date)
+        dtrain = xgb.ExtMemQuantileDMatrix(train_iter)
+        dval = xgb.ExtMemQuantileDMatrix(val_iter, ref=dtrain)
+    else:
+        train_iter = MonthlyFeatureIter(months, val_date, validation=False, start_date=start_date)
+        val_iter = MonthlyFeatureIter(months, val_date, validation=True, end_date=end_date)
+        dtrain = xgb.QuantileDMatrix(train_iter)
+        dval = xgb.QuantileDMatrix(val_iter, ref=dtrain)
+
+    try:
+        params = dict(BOOSTER_PARAMS, **({"nthread": nthread} if nthread else {}))
+        booster = xgb.train(
+            params, dtrain,
+            num_boost_round=num_boost_round,
+            evals=[(dval, "validation")],
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+            verbose_eval=False,
+            xgb_model=xgb_model,
+        )
+    finally:
+        del dtrain, dval
+        if cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    info = {"train_rows": train_iter.rows, "val_rows": val_iter.rows, "best_iteration": booster.best_iteration}
+    return booster, info
+
+
+def streaming_mae(booster: xgb.Booster, months: List[str], val_date: str,
+                  iteration_range: Optional[Tuple[int, int]] = None) -> float:
+    """Validation MAE (negative predictions clipped to 0), accumulated batch by batch.
+
+    Trees up to the best iteration are used unless `iteration_range` is given.
+    """
+    val_iter = MonthlyFeatureIter(months, val_date, validation=True)
+    abs_error, count = 0.0, 0
+    if iteration_range is None:
+        best = getattr(booster, "best_iteration", None)
+        iteration_range = (0, best + 1) if best is not None else (0, 0)
+    for i in range(len(val_iter.batches)):
+        X, y = val_iter.batch(i)
+        preds = booster.predict(xgb.DMatrix(X, feature_names=FEATURES), iteration_range=iteration_range)
+        preds[preds < 0] = 0
+        abs_error += float(np.abs(y.astype(np.float64) - preds).sum())
+        count += len(y)
+    return abs_error / max(count, 1)